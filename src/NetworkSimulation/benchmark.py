@@ -0,0 +1,170 @@
+"""
+Benchmarks for network generation and routing at several grid sizes.
+
+Usage:
+    python benchmark.py run results.json [--sizes 50,100,300,1000]
+    python benchmark.py compare baseline.json results.json [--tolerance 0.2]
+
+Every case runs in a fresh process so that its peak RSS is its own. compare exits with status 1 if any case got
+slower or bigger than the baseline by more than the tolerance.
+"""
+from instrumentation import Instrumentation, NullSink
+from lattice import Lattice
+from multiprocessing import Process, Queue, cpu_count
+from network_cache import NetworkCache
+from network_model import Dim, Network
+from rng import RandomSource
+from routing import BatchRouter
+import argparse
+import json
+import numpy
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+
+def run_case(case):
+    """
+    Run one benchmark case and return its measurements. Module level so that multiprocessing can pickle it.
+    @param case: tuple (name, size, seed)
+    """
+    name, size, seed = case
+    count = size * size
+    if name == "basic network":
+        # only the lattice, so neither the time nor the peak RSS includes the long-range links
+        timer = time.time()
+        lattice = Lattice(Dim((size, size)))
+        lattice.get_world(lattice.get_occupancy(Benchmark.density, RandomSource(seed).get_node_streams()))
+        seconds = time.time() - timer
+        return get_result(name, size, count, seconds)
+    instrumentation = Instrumentation(NullSink())
+    network_type = "yule" if name == "yule" else "kleinberg"
+    processes = Benchmark.processes if name == "parallel kleinberg" else 1
+    network = Network((size, size), density=Benchmark.density, network_type=network_type, cache_dir=None,
+                      storage="compact", seed=seed, instrumentation=instrumentation, processes=processes)
+    summary = instrumentation.summary()
+    if name in ("kleinberg", "yule", "parallel kleinberg"):
+        seconds = summary["long-range links"]["seconds"]
+    elif name == "cache load":
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache = NetworkCache(cache_dir)
+            cache.write(network.cache_key, network.world)
+            timer = time.time()
+            cache.read(network.cache_key, network.dim)
+            seconds = time.time() - timer
+        finally:
+            shutil.rmtree(cache_dir)
+    elif name == "routing":
+        router = BatchRouter(network.world, rng=network.rng.spawn("routing"))
+        count = Benchmark.num_messages
+        sources, targets = router.sample_pairs(count)
+        timer = time.time()
+        router.route(sources, targets)
+        seconds = time.time() - timer
+    return get_result(name, size, count, seconds)
+
+
+def get_result(name, size, count, seconds):
+    """
+    Return the measurements of a case that did count units of work in seconds, with the peak RSS of this process.
+    """
+    return {"case": name, "size": size, "nodes": size * size, "seconds": seconds,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+            "per_second": count / seconds if seconds > 0 else None}
+
+
+def run_case_into(case, queue):
+    queue.put(run_case(case))
+
+
+class Benchmark():
+    """
+    Times basic network, Kleinberg and Yule link generation, cache load and batch routing with fixed seeds.
+    """
+    cases = ["basic network", "kleinberg", "parallel kleinberg", "yule", "cache load", "routing"]
+    sizes = [50, 100, 300, 1000]
+    num_messages = 1000
+    density = 0.6
+    # pool size of the parallel kleinberg case
+    processes = max(cpu_count(), 2)
+
+    def __init__(self, sizes=None, seed=1):
+        self.sizes = sizes if sizes is not None else Benchmark.sizes
+        self.seed = seed
+
+    def run(self):
+        """
+        Return the results of every case at every size.
+        """
+        results = []
+        for size in self.sizes:
+            seconds = {}
+            for name in self.cases:
+                # a fresh process for every case, so each case starts with a fresh RSS. Not a Pool worker: those are
+                # daemonic and the parallel case starts a pool of its own.
+                queue = Queue()
+                process = Process(target=run_case_into, args=((name, size, self.seed), queue))
+                process.start()
+                result = queue.get()
+                process.join()
+                print("{0:>18} {1:>5}^2: {2:8.3f} sec {3:8.1f} MB".format(name, size, result["seconds"],
+                                                                         result["peak_rss_mb"]))
+                results.append(result)
+                seconds[name] = result["seconds"]
+            if seconds.get("parallel kleinberg"):
+                print("{0:>18} {1:>5}^2: {2:8.2f}x on {3} processes".format(
+                    "parallel speedup", size, seconds["kleinberg"] / seconds["parallel kleinberg"], Benchmark.processes))
+        return {"python": platform.python_version(), "numpy": numpy.__version__, "seed": self.seed,
+                "time": time.time(), "results": results}
+
+    @staticmethod
+    def compare(baseline, current, tolerance=0.2, min_seconds=0.05):
+        """
+        Return the list of regressions of current against baseline, as (case, size, measure, baseline, current).
+        A case regresses if its time or peak RSS grew by more than tolerance; times under min_seconds are noise.
+        """
+        baseline_results = dict([((result["case"], result["size"]), result) for result in baseline["results"]])
+        regressions = []
+        for result in current["results"]:
+            base = baseline_results.get((result["case"], result["size"]))
+            if base is None:
+                continue
+            if result["seconds"] > max(base["seconds"] * (1 + tolerance), min_seconds):
+                regressions.append((result["case"], result["size"], "seconds", base["seconds"], result["seconds"]))
+            if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+                regressions.append((result["case"], result["size"], "peak_rss_mb", base["peak_rss_mb"],
+                                    result["peak_rss_mb"]))
+        return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark NetworkSimulation.")
+    subparsers = parser.add_subparsers(dest="command")
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("results_file")
+    run_parser.add_argument("--sizes", default=",".join([str(size) for size in Benchmark.sizes]))
+    run_parser.add_argument("--seed", type=int, default=1)
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("baseline_file")
+    compare_parser.add_argument("results_file")
+    compare_parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    if args.command == "run":
+        results = Benchmark([int(size) for size in args.sizes.split(",")], args.seed).run()
+        with open(args.results_file, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        with open(args.baseline_file) as f:
+            baseline = json.load(f)
+        with open(args.results_file) as f:
+            current = json.load(f)
+        regressions = Benchmark.compare(baseline, current, args.tolerance)
+        for case, size, measure, before, after in regressions:
+            print("REGRESSION {0} {1}^2 {2}: {3:.3f} -> {4:.3f}".format(case, size, measure, before, after))
+        if not regressions:
+            print("No regressions.")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,216 @@
+from collections import defaultdict
+from compact_network import CompactWorld, NodeView
+from lattice import Lattice
+from samplers import CumulativeSampler
+from torus import get_torus_distances
+import numpy
+import random
+
+
+class DynamicWorld():
+    """
+    A Kleinberg network in which users join and leave one at a time.
+    The lattice links follow from the occupancy mask, so only the long-range links are stored: contacts[i] is the
+    long-range connection drawn by node i (-1 if it has none). The nodes that drew a node are found from a CSR index
+    built once, whose entries that no longer match contacts are skipped, plus sets of the contacts drawn since, which
+    follow every redraw so they do not grow over a long run. A leaving user loses all its links and the users that
+    had drawn it draw a new connection; a joining user gets its lattice links and draws its own connection. Each
+    event takes time proportional to the links it changes, and the ShellIndex does not depend on the occupancy, so it
+    is never rebuilt.
+    Connections are drawn with the ShellIndex from rng, like get_kleinberg_connection, so a run of events repeats
+    from the seed of the network.
+    """
+
+    def __init__(self, dim, occupancy, contacts, shell_index, neighborhood_radius=1, real_connection=True,
+                 max_rejections=1000, rng=random):
+        """
+        @param dim: Dim
+        @param occupancy: numpy.ndarray bool, copied
+        @param contacts: numpy.ndarray long-range connection of every node id, -1 for none, copied
+        @param shell_index: ShellIndex
+        @param real_connection: bool True if every long-range link also goes back
+        @param rng: random|RandomSource the new connections are drawn from
+        """
+        self.dim = dim
+        self.occupancy = numpy.array(occupancy, dtype=bool)
+        self.contacts = numpy.array(contacts, dtype=numpy.int64)
+        self.shell_index = shell_index
+        self.neighborhood_radius = neighborhood_radius
+        self.real_connection = real_connection
+        self.max_rejections = max_rejections
+        self.rng = rng
+        self.lattice = Lattice(dim, neighborhood_radius)
+        self.lattice_offsets = self.lattice.get_offsets()
+        drawn = numpy.flatnonzero(self.contacts >= 0)
+        order = drawn[numpy.argsort(self.contacts[drawn], kind="mergesort")]
+        self.drawn_by_offsets = numpy.zeros(len(self.occupancy) + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(self.contacts[drawn], minlength=len(self.occupancy)),
+                     out=self.drawn_by_offsets[1:])
+        self.drawn_by_nodes = order
+        # node id -> nodes that drew it after the index was built
+        self.added_drawn_by = defaultdict(set)
+
+    @staticmethod
+    def from_network(network):
+        """
+        Return the DynamicWorld of a compact Kleinberg Network with one long-range connection per user.
+        The connections are drawn again from the network's NodeStreams, which gives back the ones it was built with,
+        and the ones drawn during the churn come from network.rng.spawn("churn").
+        @param network: Network
+        """
+        occupied = network.world.get_occupied_ids()
+        contacts = numpy.full(len(network.world), -1, dtype=numpy.int64)
+        contacts[occupied] = network.get_kleinberg_targets(occupied, network.cluster_exponent)
+        return DynamicWorld(network.dim, network.world.occupancy, contacts,
+                            network.get_shell_index(network.cluster_exponent), network.neighborhood_radius,
+                            network.real_connection, rng=network.rng.spawn("churn"))
+
+    def get_drawn_by(self, node_id):
+        """
+        Return the nodes whose long-range connection is node_id.
+        """
+        indexed = self.drawn_by_nodes[self.drawn_by_offsets[node_id]:self.drawn_by_offsets[node_id + 1]].tolist()
+        return sorted(set([other for other in indexed + list(self.added_drawn_by.get(node_id, ()))
+                           if self.contacts[other] == node_id]))
+
+    def draw_contact(self, node_id):
+        """
+        Return a new long-range connection for node_id among the current users.
+        """
+        position = self.get_position(node_id)
+        if len(self.shell_index.shells):
+            for i in range(self.max_rejections):
+                candidate = self.get_node_id(self.shell_index.draw_position(position, self.rng))
+                if self.occupancy[candidate]:
+                    return candidate
+        occupied = self.get_occupied_ids()
+        distances = self.get_distances(occupied, node_id)
+        far = distances > self.neighborhood_radius
+        if not far.any():
+            return -1
+        sampler = CumulativeSampler(distances[far] ** -float(self.shell_index.cluster_exponent))
+        return int(occupied[far][sampler.sample(self.rng)])
+
+    def set_contact(self, node_id, contact):
+        """
+        Make contact the long-range connection of node_id, -1 for none, and keep added_drawn_by to the current
+        contacts: node_id leaves the set of its old contact, and a set that gets empty is dropped.
+        """
+        old_contact = self.contacts[node_id]
+        drawn_by = self.added_drawn_by.get(old_contact)
+        if drawn_by is not None:
+            drawn_by.discard(node_id)
+            if not drawn_by:
+                del self.added_drawn_by[old_contact]
+        self.contacts[node_id] = contact
+        if contact >= 0:
+            self.added_drawn_by[contact].add(node_id)
+
+    def add_user(self, node_id):
+        """
+        Give node_id a user with its lattice links and a new long-range connection.
+        Returns False if it already had one.
+        """
+        if self.occupancy[node_id]:
+            return False
+        self.occupancy[node_id] = True
+        self.set_contact(node_id, self.draw_contact(node_id))
+        return True
+
+    def remove_user(self, node_id):
+        """
+        Remove the user of node_id with all of its links, and draw a new connection for every user that had drawn it.
+        Returns the list of those users, or None if node_id had no user.
+        """
+        if not self.occupancy[node_id]:
+            return None
+        rewired = self.get_drawn_by(node_id)
+        self.occupancy[node_id] = False
+        self.set_contact(node_id, -1)
+        self.added_drawn_by.pop(node_id, None)
+        for other in rewired:
+            self.set_contact(other, self.draw_contact(other))
+        return rewired
+
+    def get_position(self, node_id):
+        return tuple([int(coordinate) for coordinate in numpy.unravel_index(node_id, self.dim.dimensions)])
+
+    def get_node_id(self, position):
+        return int(numpy.ravel_multi_index(position, self.dim.dimensions))
+
+    def get_distances(self, node_ids1, node_ids2, metric="l1"):
+        return get_torus_distances(self.dim.dimensions, node_ids1, node_ids2, metric)
+
+    def is_occupied(self, node_ids):
+        return self.occupancy[node_ids]
+
+    def get_occupied_ids(self):
+        return numpy.flatnonzero(self.occupancy)
+
+    def sample_occupied_ids(self, num_samples, rng=numpy.random):
+        occupied = self.get_occupied_ids()
+        return occupied[rng.randint(len(occupied), size=num_samples)]
+
+    def get_out_links(self, node_id):
+        """
+        Return the sorted out-links of node_id: its lattice neighbors with a user, its connection and, with
+        real_connection, the users that drew it.
+        """
+        if not self.occupancy[node_id]:
+            return numpy.zeros(0, dtype=numpy.int64)
+        neighbors = self.lattice.get_neighbors(numpy.array([node_id]), self.lattice_offsets)[0]
+        links = neighbors[self.occupancy[neighbors]].tolist()
+        if self.contacts[node_id] >= 0:
+            links.append(self.contacts[node_id])
+        if self.real_connection:
+            links.extend(self.get_drawn_by(node_id))
+        return numpy.unique(numpy.array(links, dtype=numpy.int64))
+
+    def get_in_links(self, node_id):
+        """
+        Return the sorted in-links of node_id, the out-links taken the other way.
+        """
+        if not self.occupancy[node_id]:
+            return numpy.zeros(0, dtype=numpy.int64)
+        neighbors = self.lattice.get_neighbors(numpy.array([node_id]), self.lattice_offsets)[0]
+        links = neighbors[self.occupancy[neighbors]].tolist() + self.get_drawn_by(node_id)
+        if self.real_connection and self.contacts[node_id] >= 0:
+            links.append(self.contacts[node_id])
+        return numpy.unique(numpy.array(links, dtype=numpy.int64))
+
+    def gather_out_links(self, node_ids):
+        """
+        Return (counts, neighbors) as CompactWorld.gather_out_links, so a BatchRouter can route over the current state.
+        """
+        links = [self.get_out_links(node_id) for node_id in numpy.asarray(node_ids).tolist()]
+        counts = numpy.array([len(node_links) for node_links in links], dtype=numpy.int64)
+        return counts, numpy.concatenate(links + [numpy.zeros(0, dtype=numpy.int64)])
+
+    def to_compact(self):
+        """
+        Return the current network as a CompactWorld.
+        """
+        sources, targets = self.lattice.get_links(self.occupancy)
+        drawn = numpy.flatnonzero(self.contacts >= 0)
+        sources, targets = [sources, drawn], [targets, self.contacts[drawn]]
+        if self.real_connection:
+            sources, targets = sources + [self.contacts[drawn]], targets + [drawn]
+        return CompactWorld.from_links(self.dim, self.occupancy.copy(), numpy.concatenate(sources),
+                                       numpy.concatenate(targets))
+
+    def keys(self):
+        return range(len(self.occupancy))
+
+    def __getitem__(self, node_id):
+        if not 0 <= node_id < len(self.occupancy):
+            raise KeyError(node_id)
+        return NodeView(self, node_id)
+
+    def __contains__(self, node_id):
+        return 0 <= node_id < len(self.occupancy)
+
+    def __iter__(self):
+        return iter(xrange(len(self.occupancy)))
+
+    def __len__(self):
+        return len(self.occupancy)
@@ -0,0 +1,175 @@
+from torus import get_torus_distances
+import numpy
+
+
+class NodeView():
+    """
+    A read-only stand-in for a Node that reads its fields from a CompactWorld.
+    """
+
+    def __init__(self, world, node_id):
+        """
+        @param world: CompactWorld
+        @param node_id: int
+        """
+        self.world = world
+        self.id = node_id
+
+    @property
+    def position(self):
+        return self.world.get_position(self.id)
+
+    @property
+    def has_user(self):
+        return bool(self.world.is_occupied(self.id))
+
+    @property
+    def out_links(self):
+        return set(self.world.get_out_links(self.id).tolist())
+
+    @property
+    def in_links(self):
+        return set(self.world.get_in_links(self.id).tolist())
+
+
+class CompactWorld():
+    """
+    Array-backed storage for a network, used in place of the dict of Node objects.
+    A node id is the row-major index of its position, has_user is kept in a boolean occupancy mask, and the links
+    are kept in CSR form: the out-links of node i are out_neighbors[out_offsets[i]:out_offsets[i + 1]].
+    world[node_id] returns a NodeView so code written against the dict of Node objects keeps working.
+    """
+
+    def __init__(self, dim, occupancy, out_offsets, out_neighbors, in_offsets, in_neighbors):
+        """
+        @param dim: Dim
+        @param occupancy: numpy.ndarray bool, one entry per node id
+        """
+        self.dim = dim
+        self.occupancy = occupancy
+        self.out_offsets = out_offsets
+        self.out_neighbors = out_neighbors
+        self.in_offsets = in_offsets
+        self.in_neighbors = in_neighbors
+
+    @staticmethod
+    def to_csr(num_nodes, sources, targets):
+        """
+        Return (offsets, neighbors) for the links sources[i] -> targets[i]. Duplicated links are dropped.
+        """
+        keys = numpy.unique(sources.astype(numpy.int64) * num_nodes + targets)
+        sources = keys // num_nodes
+        neighbors = (keys % num_nodes).astype(numpy.int32)
+        offsets = numpy.zeros(num_nodes + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(sources, minlength=num_nodes), out=offsets[1:])
+        return offsets, neighbors
+
+    @staticmethod
+    def from_links(dim, occupancy, sources, targets):
+        """
+        Build a CompactWorld from the out-links sources[i] -> targets[i]. The in-links are their transpose.
+        @param sources: numpy.ndarray of node ids
+        @param targets: numpy.ndarray of node ids
+        """
+        num_nodes = len(occupancy)
+        out_offsets, out_neighbors = CompactWorld.to_csr(num_nodes, sources, targets)
+        in_offsets, in_neighbors = CompactWorld.to_csr(num_nodes, targets, sources)
+        return CompactWorld(dim, occupancy, out_offsets, out_neighbors, in_offsets, in_neighbors)
+
+    @staticmethod
+    def from_world(world, dim):
+        """
+        Convert a dict of Node objects keyed by hash(position) into a CompactWorld.
+        @param world: dict
+        @param dim: Dim
+        """
+        occupancy = numpy.zeros(len(world), dtype=bool)
+        node_ids = {}
+        for node_hash, node in world.iteritems():
+            node_ids[node_hash] = int(numpy.ravel_multi_index(node.position, dim.dimensions))
+            occupancy[node_ids[node_hash]] = node.has_user
+        sources = []
+        targets = []
+        for node_hash, node in world.iteritems():
+            for out_link in node.out_links:
+                sources.append(node_ids[node_hash])
+                targets.append(node_ids[out_link])
+        return CompactWorld.from_links(dim, occupancy, numpy.array(sources, dtype=numpy.int64),
+                                       numpy.array(targets, dtype=numpy.int64))
+
+    def get_node_id(self, position):
+        return int(numpy.ravel_multi_index(position, self.dim.dimensions))
+
+    def get_position(self, node_id):
+        return tuple([int(coordinate) for coordinate in numpy.unravel_index(node_id, self.dim.dimensions)])
+
+    def get_distances(self, node_ids1, node_ids2, metric="l1"):
+        """
+        Return the torus distances between node_ids1[i] and node_ids2[i], the vectorized Network.getDistance.
+        @param node_ids1: numpy.ndarray
+        @param node_ids2: numpy.ndarray
+        @param metric: str "l1" or "linf"
+        """
+        return get_torus_distances(self.dim.dimensions, node_ids1, node_ids2, metric)
+
+    def get_links(self):
+        """
+        Return (sources, targets) of all out-links, the inverse of from_links.
+        """
+        sources = numpy.repeat(numpy.arange(len(self.occupancy), dtype=numpy.int64), numpy.diff(self.out_offsets))
+        return sources, self.out_neighbors.astype(numpy.int64)
+
+    def gather_out_links(self, node_ids):
+        """
+        Return (counts, neighbors): the number of out-links of every node in node_ids and all those out-links
+        concatenated in the same order.
+        @param node_ids: numpy.ndarray
+        """
+        starts = self.out_offsets[node_ids]
+        counts = self.out_offsets[node_ids + 1] - starts
+        segments = numpy.zeros(len(counts), dtype=numpy.int64)
+        numpy.cumsum(counts[:-1], out=segments[1:])
+        # flat index of every (node, out-link) pair
+        flat = numpy.arange(counts.sum()) - numpy.repeat(segments - starts, counts)
+        return counts, self.out_neighbors[flat].astype(numpy.int64)
+
+    def get_out_links(self, node_id):
+        return self.out_neighbors[self.out_offsets[node_id]:self.out_offsets[node_id + 1]]
+
+    def get_in_links(self, node_id):
+        return self.in_neighbors[self.in_offsets[node_id]:self.in_offsets[node_id + 1]]
+
+    def get_occupied_ids(self):
+        return numpy.flatnonzero(self.occupancy)
+
+    def is_occupied(self, node_ids):
+        return self.occupancy[node_ids]
+
+    def sample_occupied_ids(self, num_samples, rng=numpy.random):
+        """
+        Return num_samples node ids drawn uniformly from the nodes with a user.
+        @param rng: numpy.random|RandomSource
+        """
+        occupied = self.get_occupied_ids()
+        return occupied[rng.randint(len(occupied), size=num_samples)]
+
+    def keys(self):
+        return range(len(self.occupancy))
+
+    def iteritems(self):
+        for node_id in xrange(len(self.occupancy)):
+            yield node_id, self[node_id]
+
+    def __getitem__(self, node_id):
+        if not 0 <= node_id < len(self.occupancy):
+            raise KeyError(node_id)
+        return NodeView(self, node_id)
+
+    def __contains__(self, node_id):
+        return 0 <= node_id < len(self.occupancy)
+
+    def __iter__(self):
+        return iter(xrange(len(self.occupancy)))
+
+    def __len__(self):
+        return len(self.occupancy)
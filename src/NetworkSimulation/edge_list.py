@@ -0,0 +1,153 @@
+from compact_network import CompactWorld
+from network_model import Dim
+import base64
+import gzip
+import itertools
+import json
+import numpy
+import struct
+
+
+class EdgeListWriter():
+    """
+    Streams the links of a network to a gzip-compressed edge list, chunk by chunk, so a network can be shared
+    without pickling Node objects.
+    Binary layout: the magic string, the format version and the header length (little-endian uint32), a json header
+    with the dimensions and the id dtype, the occupancy mask as packed bits, then chunks of a uint32 link count
+    followed by that many sources and that many targets. The text layout has the header and the packed occupancy
+    (base64) on '#' lines and one "source target" line per link.
+    """
+    magic = "NSEL"
+    version = 1
+    compress_level = 6
+
+    def __init__(self, file_name, dim, occupancy, text=False):
+        """
+        @param file_name: str
+        @param dim: Dim
+        @param occupancy: numpy.ndarray bool
+        @param text: bool write text lines instead of binary chunks
+        """
+        self.f = gzip.open(file_name, 'wb', self.compress_level)
+        self.text = text
+        self.dtype = numpy.dtype("<i4" if len(occupancy) < 2 ** 31 else "<i8")
+        self.num_links = 0
+        header = json.dumps({"dimensions": list(dim.dimensions), "dtype": self.dtype.str})
+        packed_occupancy = numpy.packbits(occupancy.astype(bool)).tobytes()
+        if text:
+            self.f.write("# {0} {1} {2}\n".format(self.magic, self.version, header))
+            self.f.write("# {0}\n".format(base64.b64encode(packed_occupancy)))
+        else:
+            self.f.write(struct.pack("<4sII", self.magic, self.version, len(header)))
+            self.f.write(header)
+            self.f.write(packed_occupancy)
+
+    def write(self, sources, targets):
+        """
+        Append the links sources[i] -> targets[i].
+        @param sources: numpy.ndarray
+        @param targets: numpy.ndarray
+        """
+        if not len(sources):
+            return
+        if self.text:
+            self.f.write("".join(["{0} {1}\n".format(source, target)
+                                  for source, target in itertools.izip(sources.tolist(), targets.tolist())]))
+        else:
+            self.f.write(struct.pack("<I", len(sources)))
+            self.f.write(numpy.asarray(sources).astype(self.dtype).tobytes())
+            self.f.write(numpy.asarray(targets).astype(self.dtype).tobytes())
+        self.num_links += len(sources)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    @staticmethod
+    def write_world(world, file_name, text=False, chunk_nodes=2 ** 16):
+        """
+        Write all out-links of a CompactWorld, reading the CSR arrays one block of chunk_nodes nodes at a time.
+        Returns the number of links written.
+        @param world: CompactWorld
+        """
+        with EdgeListWriter(file_name, world.dim, world.occupancy, text) as writer:
+            for start in range(0, len(world), chunk_nodes):
+                stop = min(start + chunk_nodes, len(world))
+                offsets = world.out_offsets[start:stop + 1]
+                sources = numpy.repeat(numpy.arange(start, stop), numpy.diff(offsets))
+                writer.write(sources, world.out_neighbors[offsets[0]:offsets[-1]])
+        return writer.num_links
+
+
+class EdgeListReader():
+    """
+    Loads an edge list written by EdgeListWriter, binary or text, into a CompactWorld.
+    """
+
+    @staticmethod
+    def read(file_name, chunk_bytes=2 ** 22):
+        """
+        Return the CompactWorld stored in file_name.
+        @param chunk_bytes: int size of the blocks of text parsed at once
+        """
+        with gzip.open(file_name, 'rb') as f:
+            first = f.read(4)
+            if first == EdgeListWriter.magic:
+                dim, occupancy, sources, targets = EdgeListReader.read_binary(f)
+            else:
+                dim, occupancy, sources, targets = EdgeListReader.read_text(first + f.readline(), f, chunk_bytes)
+        return CompactWorld.from_links(dim, occupancy, sources, targets)
+
+    @staticmethod
+    def read_binary(f):
+        version, header_length = struct.unpack("<II", f.read(8))
+        if version != EdgeListWriter.version:
+            raise ValueError("unsupported edge list version {0}".format(version))
+        header = json.loads(f.read(header_length))
+        dtype = numpy.dtype(str(header["dtype"]))
+        num_nodes = int(numpy.prod(header["dimensions"]))
+        occupancy = numpy.unpackbits(numpy.frombuffer(f.read((num_nodes + 7) // 8), dtype=numpy.uint8))
+        sources = []
+        targets = []
+        count_bytes = f.read(4)
+        while count_bytes:
+            count = struct.unpack("<I", count_bytes)[0]
+            sources.append(numpy.frombuffer(f.read(count * dtype.itemsize), dtype=dtype))
+            targets.append(numpy.frombuffer(f.read(count * dtype.itemsize), dtype=dtype))
+            count_bytes = f.read(4)
+        return (Dim(tuple(header["dimensions"])), occupancy[:num_nodes].astype(bool),
+                EdgeListReader.concatenate(sources), EdgeListReader.concatenate(targets))
+
+    @staticmethod
+    def read_text(header_line, f, chunk_bytes):
+        magic, version, header = header_line[2:].split(" ", 2)
+        if magic != EdgeListWriter.magic or int(version) != EdgeListWriter.version:
+            raise ValueError("not a NetworkSimulation edge list")
+        header = json.loads(header)
+        num_nodes = int(numpy.prod(header["dimensions"]))
+        packed_occupancy = numpy.frombuffer(base64.b64decode(f.readline()[2:].strip()), dtype=numpy.uint8)
+        occupancy = numpy.unpackbits(packed_occupancy)[:num_nodes].astype(bool)
+        links = []
+        remainder = ""
+        block = f.read(chunk_bytes)
+        while block:
+            # parse up to the last complete line and carry the rest over to the next block
+            block = remainder + block
+            end = block.rfind("\n") + 1
+            links.append(numpy.fromstring(block[:end], dtype=numpy.int64, sep=" "))
+            remainder = block[end:]
+            block = f.read(chunk_bytes)
+        if remainder.strip():
+            links.append(numpy.fromstring(remainder, dtype=numpy.int64, sep=" "))
+        links = EdgeListReader.concatenate(links)
+        return Dim(tuple(header["dimensions"])), occupancy, links[0::2], links[1::2]
+
+    @staticmethod
+    def concatenate(arrays):
+        return numpy.concatenate(arrays).astype(numpy.int64) if arrays else numpy.zeros(0, dtype=numpy.int64)
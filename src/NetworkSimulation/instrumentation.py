@@ -0,0 +1,154 @@
+import datetime
+import json
+import sys
+import time
+
+
+class NullSink():
+    """
+    Drops every event, for batch runs that only want the summary.
+    """
+
+    def emit(self, event):
+        pass
+
+
+class ConsoleSink():
+    """
+    Shows a progress line per phase on a stream, rewritten in place with '\\r', and a final line when it ends.
+    """
+
+    def __init__(self, stream=sys.stdout):
+        self.stream = stream
+
+    def emit(self, event):
+        if event["event"] == "progress":
+            if event["total"]:
+                remaining = (event["total"] - event["count"]) / event["rate"] if event["rate"] else None
+                self.stream.write("{0}: {1:3d} % completed ({2:.1f} /sec) Estimated time to finish: {3}\r".format(
+                    event["phase"], int(100.0 * event["count"] / event["total"]), event["rate"],
+                    str(datetime.timedelta(seconds=int(remaining))) if remaining is not None else "???"))
+            else:
+                self.stream.write("{0}: {1} done ({2:.1f} /sec)\r".format(event["phase"], event["count"],
+                                                                         event["rate"]))
+        elif event["event"] == "end":
+            self.stream.write("{0} done! {1} in {2:.2f} sec ({3:.1f} /sec){4}\n".format(
+                event["phase"], event["count"], event["seconds"], event["rate"],
+                "".join([" {0}={1}".format(name, value) for name, value in sorted(event["counters"].items())])))
+        self.stream.flush()
+
+
+class JsonLinesSink():
+    """
+    Writes every event as one json object per line.
+    """
+
+    def __init__(self, file_name):
+        self.f = open(file_name, 'a')
+
+    def emit(self, event):
+        self.f.write(json.dumps(event) + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class Phase():
+    """
+    One named, timed stage of a run. count is its main unit of work (nodes, links, messages), counters hold any other
+    totals. Used as a context manager so that it ends even if the stage raises.
+    """
+
+    def __init__(self, instrumentation, name, total=None):
+        """
+        @param instrumentation: Instrumentation
+        @param name: str
+        @param total: int expected count, if known, to show the percentage and the time left
+        """
+        self.instrumentation = instrumentation
+        self.name = name
+        self.total = total
+        self.count = 0
+        self.counters = {}
+        self.increment = max(1, int(1.0 * total / instrumentation.checkpoint)) if total else 1000
+        self.next_report = self.increment
+        self.start = time.time()
+        self.seconds = None
+
+    def __enter__(self):
+        self.instrumentation.emit(self, "start")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end()
+        return False
+
+    def update(self, count=1):
+        """
+        Add count units of work; reports progress every total / checkpoint units.
+        """
+        self.count += count
+        if self.count >= self.next_report:
+            self.next_report = self.count + self.increment
+            self.instrumentation.emit(self, "progress")
+
+    def add(self, name, value=1):
+        """
+        Add value to the counter name.
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def get_seconds(self):
+        return self.seconds if self.seconds is not None else time.time() - self.start
+
+    def get_rate(self):
+        seconds = self.get_seconds()
+        return self.count / seconds if seconds > 0 else 0.0
+
+    def end(self):
+        if self.seconds is None:
+            self.seconds = time.time() - self.start
+            self.instrumentation.emit(self, "end")
+
+
+class Instrumentation():
+    """
+    Times the named phases of network generation and routing and sends their progress to a sink.
+    Every finished phase is kept in phases, so a run can report its throughput per stage with summary.
+    """
+
+    def __init__(self, sink=None, checkpoint=1000):
+        """
+        @param sink: NullSink|ConsoleSink|JsonLinesSink or anything with an emit(event) method, ConsoleSink if None
+        @param checkpoint: int number of progress events per phase with a known total
+        """
+        self.sink = sink if sink is not None else ConsoleSink()
+        self.checkpoint = checkpoint
+        self.phases = []
+
+    def phase(self, name, total=None):
+        """
+        Return a new Phase, to be used in a with statement.
+        """
+        phase = Phase(self, name, total)
+        self.phases.append(phase)
+        return phase
+
+    def emit(self, phase, event):
+        self.sink.emit({"event": event, "phase": phase.name, "count": phase.count, "total": phase.total,
+                        "seconds": phase.get_seconds(), "rate": phase.get_rate(), "counters": dict(phase.counters),
+                        "time": time.time()})
+
+    def summary(self):
+        """
+        Return a dict that maps a phase name to its total seconds, count and rate, summed over repeated phases.
+        """
+        summary = {}
+        for phase in self.phases:
+            totals = summary.setdefault(phase.name, {"seconds": 0.0, "count": 0})
+            totals["seconds"] += phase.get_seconds()
+            totals["count"] += phase.count
+        for totals in summary.values():
+            totals["rate"] = totals["count"] / totals["seconds"] if totals["seconds"] > 0 else 0.0
+        return summary
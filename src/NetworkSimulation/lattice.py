@@ -0,0 +1,77 @@
+from compact_network import CompactWorld
+from torus import get_movements
+import numpy
+
+
+class Lattice():
+    """
+    The basic network in array form: a torus of any number of dimensions where every node with a user is linked to
+    the nodes with a user within l1 distance neighborhood_radius. Node ids are row-major positions, as in CompactWorld.
+    """
+
+    def __init__(self, dim, neighborhood_radius=1):
+        """
+        @param dim: Dim
+        @param neighborhood_radius: int
+        """
+        self.dim = dim
+        self.neighborhood_radius = neighborhood_radius
+        self.num_nodes = int(numpy.prod(dim.dimensions))
+
+    def get_offsets(self):
+        """
+        Return the distinct neighbor offsets as an array of shape (number of offsets, number of dimensions).
+        As in Node.getNeighborByDistance, a movement longer than the diameter of its dimension is left out, and
+        movements that wrap onto the same node on a small torus are counted once.
+        """
+        offsets = set()
+        for distance in range(1, self.neighborhood_radius + 1):
+            for movement in get_movements(self.dim.dimensions, distance):
+                wrapped = tuple([int(movement[i]) % self.dim.dimensions[i] for i in range(len(movement))])
+                if any(wrapped):
+                    offsets.add(wrapped)
+        return numpy.array(sorted(offsets), dtype=numpy.int64).reshape(len(offsets), len(self.dim.dimensions))
+
+    def get_neighbors(self, node_ids, offsets=None):
+        """
+        Return the neighbor of every node id at every offset, an array of shape (len(node_ids), number of offsets).
+        @param node_ids: numpy.ndarray
+        @param offsets: numpy.ndarray returned by get_offsets, computed if None
+        """
+        offsets = offsets if offsets is not None else self.get_offsets()
+        coordinates = numpy.unravel_index(node_ids, self.dim.dimensions)
+        return numpy.ravel_multi_index([(coordinates[i][:, numpy.newaxis] + offsets[:, i]) % self.dim.dimensions[i]
+                                        for i in range(len(coordinates))], self.dim.dimensions)
+
+    def get_occupancy(self, density, streams):
+        """
+        Return the random occupancy mask: node i has a user if its occupancy draw is at most density.
+        @param streams: NodeStreams
+        """
+        return streams.uniforms(numpy.arange(self.num_nodes), streams.occupancy, 0) <= density
+
+    def get_links(self, occupancy):
+        """
+        Return (sources, targets) of the links between neighboring nodes that both have a user.
+        @param occupancy: numpy.ndarray bool
+        """
+        occupied = numpy.flatnonzero(occupancy)
+        coordinates = numpy.unravel_index(occupied, self.dim.dimensions)
+        sources = []
+        targets = []
+        for offset in self.get_offsets():
+            neighbors = numpy.ravel_multi_index([(coordinates[i] + offset[i]) % self.dim.dimensions[i]
+                                                 for i in range(len(offset))], self.dim.dimensions)
+            linked = occupancy[neighbors]
+            sources.append(occupied[linked])
+            targets.append(neighbors[linked])
+        if not sources:
+            return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+        return numpy.concatenate(sources), numpy.concatenate(targets)
+
+    def get_world(self, occupancy):
+        """
+        Return the basic network as a CompactWorld.
+        """
+        sources, targets = self.get_links(occupancy)
+        return CompactWorld.from_links(self.dim, occupancy, sources, targets)
@@ -0,0 +1,131 @@
+from compact_network import NodeView
+from lattice import Lattice
+from node_streams import NodeStreams
+from torus import get_torus_distances
+import numpy
+
+
+class LazyWorld():
+    """
+    A Kleinberg network that is never built: whether a node has a user and its lattice links are computed from its
+    position when asked, and its long-range connections are drawn the first time a router reaches it and then kept.
+    Every draw reads the node's own NodeStreams numbers, so the links are the ones the eager compact network with the
+    same seed has, whatever order the nodes are visited in, and memory grows only with the nodes visited: the
+    ShellIndex of a lazy network decodes offsets on demand instead of listing all of them.
+    Reciprocal links (real_connection) would need the draws of every node, so a LazyWorld has only out-links.
+    """
+
+    def __init__(self, dim, density, streams, draw_connections, neighborhood_radius=1, far_connection=1):
+        """
+        @param dim: Dim
+        @param density: float
+        @param streams: NodeStreams
+        @param draw_connections: function (node_ids, connection) that returns the connection-th long-range connection
+        of every node id, Network.get_kleinberg_targets
+        @param far_connection: int number of long-range connections of every node with a user
+        """
+        self.dim = dim
+        self.density = density
+        self.streams = streams
+        self.draw_connections = draw_connections
+        self.far_connection = far_connection
+        self.num_nodes = int(numpy.prod(dim.dimensions))
+        self.lattice = Lattice(dim, neighborhood_radius)
+        self.lattice_offsets = self.lattice.get_offsets()
+        # node id -> list of its long-range connections, for the nodes visited so far
+        self.connections = {}
+
+    def get_node_id(self, position):
+        return int(numpy.ravel_multi_index(position, self.dim.dimensions))
+
+    def get_position(self, node_id):
+        return tuple([int(coordinate) for coordinate in numpy.unravel_index(node_id, self.dim.dimensions)])
+
+    def get_distances(self, node_ids1, node_ids2, metric="l1"):
+        return get_torus_distances(self.dim.dimensions, node_ids1, node_ids2, metric)
+
+    def is_occupied(self, node_ids):
+        return self.streams.uniforms(node_ids, NodeStreams.occupancy, 0) <= self.density
+
+    def get_occupied_ids(self):
+        """
+        Return the ids of all nodes with a user. Goes through the whole lattice, so routing code should prefer
+        sample_occupied_ids.
+        """
+        node_ids = numpy.arange(self.num_nodes)
+        return node_ids[self.is_occupied(node_ids)]
+
+    def sample_occupied_ids(self, num_samples, rng=numpy.random, max_rejections=1000):
+        """
+        Return num_samples node ids drawn uniformly from the nodes with a user, by rejecting the empty nodes.
+        @param rng: numpy.random|RandomSource
+        """
+        samples = numpy.full(num_samples, -1, dtype=numpy.int64)
+        pending = numpy.arange(num_samples)
+        for i in range(max_rejections):
+            if not len(pending):
+                return samples
+            candidates = rng.randint(self.num_nodes, size=len(pending))
+            accepted = self.is_occupied(candidates)
+            samples[pending[accepted]] = candidates[accepted]
+            pending = pending[~accepted]
+        occupied = self.get_occupied_ids()
+        samples[pending] = occupied[rng.randint(len(occupied), size=len(pending))]
+        return samples
+
+    def get_lattice_neighbors(self, node_ids):
+        """
+        Return the lattice neighbors of every node id, an array of shape (len(node_ids), number of offsets).
+        """
+        return self.lattice.get_neighbors(node_ids, self.lattice_offsets)
+
+    def get_connections(self, node_ids):
+        """
+        Return the long-range connections of every node id, drawing those of the nodes not visited before, as an
+        array of shape (len(node_ids), far_connection). The node ids must have a user.
+        """
+        node_id_list = node_ids.tolist()
+        missing = numpy.array(sorted(set([node_id for node_id in node_id_list if node_id not in self.connections])),
+                              dtype=numpy.int64)
+        if len(missing):
+            drawn = numpy.column_stack([self.draw_connections(missing, i) for i in range(self.far_connection)])
+            self.connections.update(zip(missing.tolist(), drawn.tolist()))
+        return numpy.array([self.connections[node_id] for node_id in node_id_list],
+                           dtype=numpy.int64).reshape(len(node_id_list), self.far_connection)
+
+    def gather_out_links(self, node_ids):
+        """
+        Return (counts, neighbors): the number of out-links of every node in node_ids and all those out-links
+        concatenated in the same order, as CompactWorld.gather_out_links.
+        @param node_ids: numpy.ndarray
+        """
+        node_ids = numpy.asarray(node_ids, dtype=numpy.int64)
+        occupied = self.is_occupied(node_ids)
+        lattice_neighbors = self.get_lattice_neighbors(node_ids)
+        connections = numpy.full((len(node_ids), self.far_connection), -1, dtype=numpy.int64)
+        connections[occupied] = self.get_connections(node_ids[occupied])
+        neighbors = numpy.hstack([lattice_neighbors, connections])
+        linked = numpy.hstack([occupied[:, numpy.newaxis] & self.is_occupied(lattice_neighbors),
+                               numpy.repeat(occupied[:, numpy.newaxis], self.far_connection, axis=1)])
+        return linked.sum(axis=1), neighbors[linked]
+
+    def get_out_links(self, node_id):
+        counts, neighbors = self.gather_out_links(numpy.array([node_id]))
+        return numpy.unique(neighbors)
+
+    def keys(self):
+        return xrange(self.num_nodes)
+
+    def __getitem__(self, node_id):
+        if not 0 <= node_id < self.num_nodes:
+            raise KeyError(node_id)
+        return NodeView(self, node_id)
+
+    def __contains__(self, node_id):
+        return 0 <= node_id < self.num_nodes
+
+    def __iter__(self):
+        return iter(xrange(self.num_nodes))
+
+    def __len__(self):
+        return self.num_nodes
@@ -1,6 +1,30 @@
+import collections
+import itertools
+import os
+import json
+import numpy
+import random
+import shutil
+import tempfile
 import unittest
 
-from network_model import Node, Network, Dim
+from network_model import Node, Network, Dim, ShellIndex
+from benchmark import Benchmark, run_case
+from churn import DynamicWorld
+from compact_network import CompactWorld
+from edge_list import EdgeListReader, EdgeListWriter
+from instrumentation import Instrumentation, JsonLinesSink, NullSink
+from lattice import Lattice
+from network_cache import NetworkCache
+from network_stats import NetworkStats
+from node_streams import NodeStreams
+from rng import RandomSource
+from routing import BatchRouter, LookaheadStrategy, TwoHopIndex, gather_two_hops, get_strategy
+from samplers import AliasSampler, CumulativeSampler, FenwickSampler
+from shortest_paths import ShortestPaths
+from sweep import Sweep
+from torus import get_pairwise_distances, get_position_distances, get_torus_distances
+from traces import TraceRecorder
 
 
 class TestNode(unittest.TestCase):
@@ -27,6 +51,677 @@ class TestNode(unittest.TestCase):
             # print([nw.get_position(in_link) for in_link in nw.world[nodeId].in_links])
 
 
+class TestTorus(unittest.TestCase):
+    def setUp(self):
+        self.dimensions = (5, 4, 7)
+        self.nw = Network(self.dimensions, storage="compact", seed=1, cache_dir=None)
+        self.positions = [self.nw.world.get_position(node_id) for node_id in range(len(self.nw.world))]
+
+    def test_distances(self):
+        node_ids = numpy.arange(len(self.positions))
+        pairwise = get_pairwise_distances(self.dimensions, node_ids, node_ids)
+        for i in range(0, len(self.positions), 7):
+            expected = [self.nw.getDistance(self.positions[i], position) for position in self.positions]
+            self.assertEqual(list(pairwise[i]), expected)
+            self.assertEqual(list(get_torus_distances(self.dimensions, i, node_ids)), expected)
+            self.assertEqual(list(self.nw.get_distances(self.positions[i], self.positions)), expected)
+        linf = get_position_distances(self.dimensions, (0, 0, 0), [(4, 2, 3), (1, 1, 1), (0, 0, 0)], metric="linf")
+        self.assertEqual(list(linf), [3, 1, 0])
+
+    def test_neighbors(self):
+        node = Node((0, 0, 0), Dim(self.dimensions))
+        self.assertEqual(len(node.getNeighborByDistance(1)), 6)
+        self.assertEqual(len(node.getNeighborByDistance(2)), 17)
+        for position in node.getNeighborByDistance(2):
+            self.assertEqual(self.nw.getDistance((0, 0, 0), position), 2)
+        for node_id in self.nw.world.get_occupied_ids():
+            lattice_links = [ol for ol in self.nw.world.get_out_links(node_id)
+                             if self.nw.world.get_distances(node_id, ol) == 1]
+            self.assertEqual(len(lattice_links), sum([self.nw.world.occupancy[self.nw.world.get_node_id(position)]
+                                                      for position in Node(self.positions[node_id], Dim(
+                                                          self.dimensions)).getNeighborByDistance(1)]))
+
+
+class TestShellIndex(unittest.TestCase):
+    def setUp(self):
+        self.dim = Dim((5, 5))
+        self.shell_index = ShellIndex(self.dim)
+
+    def test_shells(self):
+        # on a 5 x 5 torus every node has 4 nodes at distance 1, 8 at distance 2 and 3, and 4 at distance 4
+        self.assertEqual(list(self.shell_index.shells), [2, 3, 4])
+        self.assertEqual(list(self.shell_index.shell_counts), [8, 8, 4])
+
+    def test_draw_offsets(self):
+        offsets = self.shell_index.draw_offsets(100)
+        distances = sum(numpy.minimum(coordinates, 5 - coordinates) for coordinates in offsets)
+        self.assertTrue(numpy.all(distances > 1))
+
+    def test_decode_offsets(self):
+        for dimensions, exclude_distance in [((5, 5), 1), ((6, 4), 1), ((4, 3, 5), 2), ((7, ), 1), ((2, 5), 0),
+                                             ((1, 6), 1)]:
+            materialized = ShellIndex(Dim(dimensions), exclude_distance)
+            decoded = ShellIndex(Dim(dimensions), exclude_distance, materialize=False)
+            self.assertIsNone(decoded.offsets)
+            self.assertEqual(list(decoded.shell_counts), list(materialized.shell_counts))
+            shells = numpy.repeat(numpy.arange(len(materialized.shells)), materialized.shell_counts)
+            in_shell = numpy.arange(len(shells)) - materialized.shell_starts[shells]
+            expected = numpy.unravel_index(materialized.offsets, dimensions)
+            for coordinates, expected_coordinates in zip(decoded.get_offsets(shells, in_shell), expected):
+                self.assertEqual(list(coordinates), list(expected_coordinates))
+
+    def test_draw_position(self):
+        nw = Network([5, 5], density=1.0)
+        for i in range(100):
+            position = self.shell_index.draw_position((3, 3))
+            self.assertGreater(nw.getDistance((3, 3), position), 1)
+
+
+class TestCompactWorld(unittest.TestCase):
+    def assert_same_world(self, world, compact_world):
+        self.assertEqual(len(compact_world), len(world))
+        for node in world.values():
+            view = compact_world[compact_world.get_node_id(node.position)]
+            self.assertEqual(view.position, node.position)
+            self.assertEqual(view.has_user, node.has_user)
+            self.assertEqual(set(compact_world[ol].position for ol in view.out_links),
+                             set(world[ol].position for ol in node.out_links))
+            self.assertEqual(set(compact_world[il].position for il in view.in_links),
+                             set(world[il].position for il in node.in_links))
+
+    def test_from_world(self):
+        nw = Network([6, 6], network_type="kleinberg")
+        self.assert_same_world(nw.world, CompactWorld.from_world(nw.world, nw.dim))
+
+    def test_same_basic_network(self):
+        for dimensions in [(6, 6), (2, 5), (4, 3, 3)]:
+            nw = Network(dimensions, network_type="kleinberg", seed=7, cache_dir=None)
+            compact = Network(dimensions, network_type="kleinberg", storage="compact", seed=7, cache_dir=None)
+            for node in nw.world.values():
+                view = compact.world[compact.world.get_node_id(node.position)]
+                self.assertEqual(view.has_user, node.has_user)
+                self.assertEqual(set(compact.world[ol].position for ol in view.out_links
+                                     if compact.getDistance(view.position, compact.get_position(ol)) <= 1),
+                                 set(nw.world[ol].position for ol in node.out_links
+                                     if nw.getDistance(node.position, nw.get_position(ol)) <= 1))
+
+    def test_same_network(self):
+        for network_type in ["kleinberg", "yule"]:
+            for real_connection in [True, False]:
+                for dimensions in [(30, 30), (4, 3, 3)]:
+                    nw = Network(dimensions, network_type=network_type, real_connection=real_connection, seed=7,
+                                 cache_dir=None)
+                    compact = Network(dimensions, network_type=network_type, real_connection=real_connection,
+                                      storage="compact", seed=7, cache_dir=None)
+                    self.assert_same_world(nw.world, compact.world)
+
+    def test_lattice(self):
+        lattice = Lattice(Dim((5, 5, 5)), neighborhood_radius=2)
+        self.assertEqual(len(lattice.get_offsets()), 6 + 18)
+        world = lattice.get_world(numpy.ones(125, dtype=bool))
+        self.assertEqual(set(numpy.diff(world.out_offsets)), set([24]))
+        self.assertEqual(set(world.get_distances(*world.get_links())), set([1, 2]))
+
+    def test_yule(self):
+        compact = Network([8, 8], network_type="yule", storage="compact", seed=4, cache_dir=None)
+        for node_id in compact.world.get_occupied_ids():
+            out_links = compact.world.get_out_links(node_id)
+            self.assertNotIn(node_id, out_links)
+            self.assertGreater(compact.world.get_distances(out_links, node_id).max(), 1)
+
+
+class TestLazyWorld(unittest.TestCase):
+    def setUp(self):
+        self.eager = Network([12, 9], storage="compact", real_connection=False, seed=6, cache_dir=None)
+        self.lazy = Network([12, 9], storage="lazy", real_connection=False, seed=6)
+
+    def test_same_links_as_eager(self):
+        node_ids = numpy.arange(len(self.eager.world))
+        self.assertEqual(list(self.lazy.world.is_occupied(node_ids)), list(self.eager.world.occupancy))
+        # visit the nodes in reverse order, the links must not depend on it
+        for node_id in node_ids[::-1]:
+            self.assertEqual(list(self.lazy.world.get_out_links(node_id)),
+                             list(self.eager.world.get_out_links(node_id)))
+
+    def test_same_routes_as_eager(self):
+        numpy.random.seed(2)
+        sources, targets = BatchRouter(self.eager.world).sample_pairs(100)
+        self.assertEqual(list(BatchRouter(self.lazy.world).route(sources, targets)),
+                         list(BatchRouter(self.eager.world).route(sources, targets)))
+        self.assertLess(len(self.lazy.world.connections), len(self.eager.world.get_occupied_ids()) + 1)
+
+    def test_large_lattice(self):
+        # 10^7 nodes: nothing the size of the lattice may be built
+        lazy = Network([3200, 3200], storage="lazy", real_connection=False, seed=6,
+                       instrumentation=Instrumentation(NullSink()))
+        router = BatchRouter(lazy.world, 2000, Instrumentation(NullSink()), rng=lazy.rng.spawn("routing"))
+        lengths = router.route(*router.sample_pairs(5))
+        self.assertIsNone(lazy.get_shell_index(lazy.cluster_exponent).offsets)
+        self.assertLessEqual(len(lazy.world.connections), 5 * 2001)
+        self.assertEqual(len(lengths), 5)
+
+    def test_real_connection(self):
+        self.assertRaises(ValueError, Network, [12, 9], storage="lazy", real_connection=True)
+
+    def test_needs_compact_world(self):
+        self.assertRaises(TypeError, ShortestPaths, self.lazy.world)
+        self.assertRaises(TypeError, NetworkStats, self.lazy.world)
+        self.assertRaises(ValueError, self.lazy.get_stats)
+
+    def test_parallel_same_as_serial(self):
+        parallel = Network([12, 9], storage="compact", real_connection=False, seed=6, cache_dir=None, processes=2)
+        self.assertEqual(list(parallel.world.out_neighbors), list(self.eager.world.out_neighbors))
+        self.assertEqual(list(parallel.world.in_offsets), list(self.eager.world.in_offsets))
+        self.assertEqual(parallel.instrumentation.summary()["long-range links"]["count"],
+                         len(self.eager.world.get_occupied_ids()))
+
+    def test_node_streams(self):
+        streams = NodeStreams(6)
+        uniforms = streams.uniforms(numpy.arange(1000), NodeStreams.links, 3)
+        self.assertEqual(list(streams.uniforms(numpy.arange(999, -1, -1), NodeStreams.links, 3)), list(uniforms[::-1]))
+        self.assertEqual(streams.uniforms(7, NodeStreams.links, 3), uniforms[7])
+        self.assertTrue(numpy.all((uniforms >= 0) & (uniforms < 1)))
+        self.assertNotEqual(list(streams.uniforms(numpy.arange(1000), NodeStreams.links, 4)), list(uniforms))
+
+
+class TestDynamicWorld(unittest.TestCase):
+    def setUp(self):
+        self.nw = Network([20, 17], storage="compact", seed=2, cache_dir=None)
+        self.world = DynamicWorld.from_network(self.nw)
+
+    def assert_same_links(self, compact_world):
+        for node_id in self.world:
+            self.assertEqual(list(self.world.get_out_links(node_id)), list(compact_world.get_out_links(node_id)))
+            self.assertEqual(list(self.world.get_in_links(node_id)), list(compact_world.get_in_links(node_id)))
+
+    def test_from_network(self):
+        self.assert_same_links(self.nw.world)
+
+    def churn(self, world, num_events):
+        """
+        Add or remove the user of num_events nodes picked from a fixed seed.
+        """
+        rng = RandomSource(1)
+        for i in range(num_events):
+            node_id = int(rng.randint(len(world)))
+            if world.occupancy[node_id]:
+                world.remove_user(node_id)
+            else:
+                world.add_user(node_id)
+
+    def test_churn(self):
+        rng = RandomSource(1)
+        for i in range(500):
+            node_id = int(rng.randint(len(self.world)))
+            if self.world.occupancy[node_id]:
+                for other in self.world.remove_user(node_id):
+                    self.assertNotEqual(self.world.contacts[other], node_id)
+                self.assertEqual(len(self.world.get_out_links(node_id)), 0)
+            else:
+                self.assertTrue(self.world.add_user(node_id))
+        for node_id in self.world.get_occupied_ids():
+            self.assertTrue(self.world.occupancy[self.world.contacts[node_id]])
+        # the contacts drawn during the churn are indexed exactly, without stale or empty entries
+        for contact, drawn_by in self.world.added_drawn_by.items():
+            self.assertTrue(drawn_by)
+            for node_id in drawn_by:
+                self.assertEqual(self.world.contacts[node_id], contact)
+        self.assert_same_links(self.world.to_compact())
+        router = BatchRouter(self.world)
+        sources, targets = router.sample_pairs(20)
+        self.assertEqual(list(router.route(sources, targets)),
+                         list(BatchRouter(self.world.to_compact()).route(sources, targets)))
+
+    def test_reproducible(self):
+        self.churn(self.world, 300)
+        other = DynamicWorld.from_network(Network([20, 17], storage="compact", seed=2, cache_dir=None))
+        self.churn(other, 300)
+        self.assertTrue(numpy.array_equal(other.contacts, self.world.contacts))
+
+
+class TestBatchRouter(unittest.TestCase):
+    def setUp(self):
+        random.seed(3)
+        self.nw = Network([8, 8], density=0.8, storage="compact")
+        self.router = BatchRouter(self.nw.world, max_attempts=20)
+
+    def greedy_length(self, source, target):
+        current = source
+        for i in range(1, self.router.max_attempts + 1):
+            out_links = sorted(self.nw.world[current].out_links)
+            distances = [self.nw.getDistance(self.nw.get_position(ol), self.nw.get_position(target))
+                         for ol in out_links]
+            if not distances:
+                return -1
+            current = out_links[distances.index(min(distances))]
+            if min(distances) == 0:
+                return i
+        return -1
+
+    def test_route_matches_greedy(self):
+        sources, targets = self.router.sample_pairs(200)
+        lengths = self.router.route(sources, targets)
+        self.assertEqual(list(lengths), [self.greedy_length(s, t) for s, t in zip(sources, targets)])
+        mean, median, success_rate = BatchRouter.summarize(lengths)
+        self.assertEqual(success_rate, 1.0 * (lengths >= 0).sum() / len(lengths))
+
+    def lookahead_step(self, current, target):
+        candidates = []
+        for via in sorted(self.nw.world[current].out_links):
+            reach = [via] + list(self.nw.world[via].out_links)
+            candidates.append((min([self.nw.world.get_distances(r, target) for r in reach]),
+                               self.nw.world.get_distances(via, target), via))
+        return min(candidates)[2] if candidates else -1
+
+    def test_lookahead(self):
+        index = TwoHopIndex(self.nw.world, block_nodes=5)
+        counts, via, reach = gather_two_hops(self.nw.world, numpy.arange(len(self.nw.world)))
+        self.assertTrue(numpy.array_equal(index.via, via))
+        self.assertTrue(numpy.array_equal(index.reach, reach))
+        sources, targets = self.router.sample_pairs(200)
+        for strategy in [LookaheadStrategy(self.nw.world), LookaheadStrategy(self.nw.world, index),
+                         get_strategy("lookahead", self.nw.world)]:
+            next_nodes, next_distances = strategy.step(sources, targets)
+            self.assertEqual(list(next_nodes), [self.lookahead_step(s, t) for s, t in zip(sources, targets)])
+        # a LookaheadStrategy without an index gathers the pairs at every step
+        strategy = LookaheadStrategy(self.nw.world)
+        strategy.index = None
+        self.assertTrue(numpy.array_equal(strategy.step(sources, targets)[0], next_nodes))
+
+    def test_random_walk(self):
+        numpy.random.seed(3)
+        strategy = get_strategy("greedy", self.nw.world, random_walk=True)
+        sources, targets = self.router.sample_pairs(200)
+        next_nodes, next_distances = strategy.step(sources, targets)
+        greedy_nodes, greedy_distances = self.router.step(sources, targets)
+        closer = greedy_distances < self.nw.world.get_distances(sources, targets)
+        self.assertTrue(numpy.array_equal(next_nodes[closer], greedy_nodes[closer]))
+        for source, next_node in zip(sources, next_nodes):
+            self.assertIn(next_node, self.nw.world[source].out_links)
+        self.assertTrue(numpy.array_equal(next_distances, self.nw.world.get_distances(next_nodes, targets)))
+        self.assertRaises(ValueError, get_strategy, "flooding", self.nw.world)
+
+
+class TestShortestPaths(unittest.TestCase):
+    def setUp(self):
+        self.nw = Network([15, 13], density=0.7, storage="compact", seed=1, cache_dir=None)
+        self.shortest_paths = ShortestPaths(self.nw.world)
+
+    def bfs(self, source, world=None):
+        world = world if world is not None else self.nw.world
+        distances = {source: 0}
+        queue = collections.deque([source])
+        while queue:
+            node_id = queue.popleft()
+            for out_link in world.get_out_links(node_id):
+                if out_link not in distances:
+                    distances[out_link] = distances[node_id] + 1
+                    queue.append(out_link)
+        return distances
+
+    def test_lengths(self):
+        numpy.random.seed(5)
+        sources = numpy.random.choice(self.nw.world.get_occupied_ids(), 150)
+        targets = numpy.random.randint(len(self.nw.world), size=150)
+        self.assertEqual(list(self.shortest_paths.get_lengths(sources, targets)),
+                         [self.bfs(source).get(target, -1) for source, target in zip(sources, targets)])
+
+    def test_last_node_unoccupied(self):
+        # the in-links of the last nodes end the in-link array, so their segment must not be cut short
+        num_tested = 0
+        for seed in range(40):
+            world = Network([7, 6], density=0.7, storage="compact", seed=seed, cache_dir=None,
+                            instrumentation=Instrumentation(NullSink())).world
+            if world.occupancy[-1]:
+                continue
+            num_tested += 1
+            sources = world.get_occupied_ids()
+            targets = numpy.arange(len(world))
+            lengths = ShortestPaths(world).get_lengths(numpy.repeat(sources, len(targets)),
+                                                       numpy.tile(targets, len(sources)))
+            self.assertEqual(list(lengths), [self.bfs(source, world).get(target, -1)
+                                             for source in sources for target in targets])
+        self.assertGreater(num_tested, 5)
+
+    def test_eccentricities(self):
+        sources = self.nw.world.get_occupied_ids()[:64]
+        eccentricities, farthest = self.shortest_paths.get_eccentricities(sources)
+        for source, eccentricity, node_id in zip(sources, eccentricities, farthest):
+            distances = self.bfs(source)
+            self.assertEqual(eccentricity, max(distances.values()))
+            self.assertEqual(distances[node_id], eccentricity)
+        self.assertGreaterEqual(self.shortest_paths.estimate_diameter(8), eccentricities.min())
+        self.assertEqual(self.shortest_paths.estimate_diameter(4, RandomSource(3)),
+                         self.shortest_paths.estimate_diameter(4, RandomSource(3)))
+
+    def test_stretch(self):
+        router = BatchRouter(self.nw.world)
+        sources, targets = router.sample_pairs(100)
+        stretch = ShortestPaths.get_stretch(router.route(sources, targets),
+                                            self.shortest_paths.get_lengths(sources, targets))
+        self.assertTrue(numpy.all(stretch[~numpy.isnan(stretch)] >= 1))
+
+
+class TestSweep(unittest.TestCase):
+    def test_resume(self):
+        results_file = tempfile.mktemp(suffix=".jsonl")
+        grid = Sweep.get_grid(dimensions=((6, 6), ), density=(0.8, 1.0))
+        try:
+            self.assertEqual(Sweep(grid[:1], results_file, num_messages=50, trials=2, processes=1).run(), 2)
+            self.assertEqual(Sweep(grid, results_file, num_messages=50, trials=2, processes=1).run(), 2)
+            self.assertEqual(Sweep(grid, results_file, num_messages=50, trials=2, processes=1).run(), 0)
+        finally:
+            os.remove(results_file)
+
+    def test_resume_after_partial_row(self):
+        results_file = tempfile.mktemp(suffix=".jsonl")
+        grid = Sweep.get_grid(dimensions=((6, 6), ), density=(0.8, 1.0))
+        try:
+            self.assertEqual(Sweep(grid, results_file, num_messages=50, trials=2, processes=1).run(), 4)
+            with open(results_file, 'r') as f:
+                lines = f.readlines()
+            # a crash in the middle of writing the last row
+            with open(results_file, 'w') as f:
+                f.write("".join(lines[:-1]) + lines[-1][:len(lines[-1]) // 2])
+            self.assertEqual(len(Sweep(grid, results_file).read_finished()), 3)
+            self.assertEqual(Sweep(grid, results_file, num_messages=50, trials=2, processes=1).run(), 1)
+            with open(results_file, 'r') as f:
+                self.assertEqual(len([json.loads(line) for line in f]), 4)
+        finally:
+            os.remove(results_file)
+
+
+class TestNetworkCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_round_trip(self):
+        built = Network([6, 6], storage="compact", cache_dir=self.cache_dir, seed=5)
+        loaded = Network([6, 6], storage="compact", cache_dir=self.cache_dir, seed=5)
+        self.assertIsInstance(loaded.world.out_neighbors, numpy.memmap)
+        for name in NetworkCache.array_names:
+            self.assertTrue(numpy.array_equal(getattr(built.world, name), getattr(loaded.world, name)))
+        thawed = Network([6, 6], cache_dir=self.cache_dir, seed=5)
+        for node_id in built.world:
+            node = thawed.world[hash(built.world.get_position(node_id))]
+            self.assertEqual(set(thawed.get_position(ol) for ol in node.out_links),
+                             set(built.get_position(ol) for ol in built.world[node_id].out_links))
+
+    def test_key_covers_parameters(self):
+        Network([6, 6], cache_dir=self.cache_dir, seed=5)
+        Network([6, 6], cache_dir=self.cache_dir, seed=5, real_connection=False)
+        Network([6, 6], cache_dir=self.cache_dir, seed=6)
+        Network([6, 6], cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+
+    def test_evict(self):
+        cache = NetworkCache(self.cache_dir, max_bytes=0)
+        world = Network([6, 6], storage="compact", cache_dir=None).world
+        cache.write("a", world)
+        cache.write("b", world)
+        # the entry just written stays even when it alone is over max_bytes
+        self.assertEqual(os.listdir(self.cache_dir), ["b" + NetworkCache.extension])
+
+    def test_evict_counts_stats(self):
+        world = Network([6, 6], storage="compact", cache_dir=None).world
+        NetworkCache(self.cache_dir).write("a", world)
+        NetworkCache(self.cache_dir).write_stats("a", {"num_components": 1})
+        entry_bytes = os.path.getsize(os.path.join(self.cache_dir, "a" + NetworkCache.extension))
+        stats_bytes = os.path.getsize(os.path.join(self.cache_dir, "a" + NetworkCache.stats_extension))
+        # statistics whose entry is gone
+        NetworkCache(self.cache_dir).write_stats("orphan", {"num_components": 1})
+        os.utime(os.path.join(self.cache_dir, "a" + NetworkCache.extension), (1, 1))
+        cache = NetworkCache(self.cache_dir, max_bytes=2 * entry_bytes + stats_bytes)
+        cache.write("b", world)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)),
+                         ["a" + NetworkCache.extension, "a" + NetworkCache.stats_extension, "b" + NetworkCache.extension])
+        cache.write_stats("b", {"num_components": 1})
+        cache.write("c", world)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)),
+                         ["b" + NetworkCache.extension, "b" + NetworkCache.stats_extension, "c" + NetworkCache.extension])
+        self.assertLessEqual(sum([os.path.getsize(os.path.join(self.cache_dir, file_name))
+                                  for file_name in os.listdir(self.cache_dir)]), cache.max_bytes)
+
+    def test_stats(self):
+        nw = Network([6, 6], storage="compact", cache_dir=self.cache_dir, seed=5)
+        stats = nw.get_stats()
+        self.assertEqual(NetworkCache(self.cache_dir).read_stats(nw.cache_key), stats)
+        loaded = Network([6, 6], storage="compact", cache_dir=self.cache_dir, seed=5)
+        self.assertEqual(loaded.get_stats(), stats)
+        self.assertNotIn("stats", loaded.instrumentation.summary())
+
+
+class TestNetworkStats(unittest.TestCase):
+    def setUp(self):
+        self.nw = Network([14, 11], density=0.5, storage="compact", seed=2, cache_dir=None)
+        self.stats = NetworkStats(self.nw.world)
+        self.stats.wedge_block = 7
+        self.neighbors = collections.defaultdict(set)
+        for source, target in zip(*self.nw.world.get_links()):
+            self.neighbors[source].add(target)
+            self.neighbors[target].add(source)
+
+    def test_clustering(self):
+        coefficients = self.stats.get_clustering_coefficients()
+        for node_id in self.nw.world:
+            neighbors = self.neighbors[node_id]
+            if len(neighbors) < 2:
+                self.assertTrue(numpy.isnan(coefficients[node_id]))
+            else:
+                linked = [pair for pair in itertools.combinations(neighbors, 2) if pair[1] in self.neighbors[pair[0]]]
+                self.assertAlmostEqual(coefficients[node_id], 2.0 * len(linked) / len(neighbors) / (len(neighbors) - 1))
+
+    def test_components(self):
+        labels = self.stats.get_components()
+        for node_id in self.nw.world:
+            component = set([node_id])
+            queue = [node_id]
+            while queue:
+                for neighbor in self.neighbors[queue.pop()] - component:
+                    component.add(neighbor)
+                    queue.append(neighbor)
+            self.assertEqual(labels[node_id], min(component))
+        self.assertEqual(sum(self.stats.get_component_sizes()), len(self.nw.world.get_occupied_ids()))
+
+    def test_histograms(self):
+        out_degrees, in_degrees = self.stats.get_degree_histograms()
+        self.assertEqual(out_degrees.sum(), len(self.nw.world.get_occupied_ids()))
+        self.assertEqual((out_degrees * numpy.arange(len(out_degrees))).sum(), len(self.nw.world.out_neighbors))
+        # a pair of nodes that drew each other shares its two links
+        self.assertLessEqual(self.stats.get_link_length_histogram().sum(), 2 * len(self.nw.world.get_occupied_ids()))
+
+
+class TestEdgeList(unittest.TestCase):
+    def test_round_trip(self):
+        nw = Network([7, 5], storage="compact", seed=1, cache_dir=None)
+        for text in [False, True]:
+            file_name = tempfile.mktemp(suffix=".gz")
+            try:
+                num_links = EdgeListWriter.write_world(nw.world, file_name, text, chunk_nodes=4)
+                self.assertEqual(num_links, len(nw.world.out_neighbors))
+                world = EdgeListReader.read(file_name, chunk_bytes=16)
+                self.assertEqual(world.dim.dimensions, (7, 5))
+                for name in NetworkCache.array_names:
+                    self.assertTrue(numpy.array_equal(getattr(world, name), getattr(nw.world, name)))
+            finally:
+                os.remove(file_name)
+
+
+class TestTraceRecorder(unittest.TestCase):
+    def setUp(self):
+        random.seed(3)
+        numpy.random.seed(3)
+        self.nw = Network([8, 8], density=0.8, storage="compact")
+        self.router = BatchRouter(self.nw.world, max_attempts=20)
+        self.sources, self.targets = self.router.sample_pairs(100)
+
+    def test_batch_route(self):
+        recorder = TraceRecorder(capacity=16)
+        lengths = self.router.route(self.sources, self.targets, recorder)
+        self.assertEqual(recorder.summarize(), BatchRouter.summarize(lengths))
+        messages, recorded_lengths = recorder.get_lengths()
+        self.assertEqual(list(recorded_lengths), list(lengths))
+        trace = recorder.get_trace(0)
+        self.assertEqual(trace[0][1], self.sources[0])
+        self.assertEqual([row[0] for row in trace], range(len(trace)))
+        if lengths[0] >= 0:
+            self.assertEqual(trace[-1][1:], (self.targets[0], 0))
+        decay = recorder.get_decay_curve()
+        self.assertLessEqual(len(decay), self.router.max_attempts + 1)
+        self.assertAlmostEqual(decay[0], self.nw.world.get_distances(self.sources, self.targets).mean())
+
+    def test_spill(self):
+        spill_prefix = tempfile.mktemp()
+        in_memory = TraceRecorder()
+        spilled = TraceRecorder(capacity=16, spill_prefix=spill_prefix)
+        try:
+            self.router.route(self.sources, self.targets, in_memory)
+            self.router.route(self.sources, self.targets, spilled)
+            self.assertEqual(len(spilled.hops.buffers["hop"]), 16)
+            self.assertGreater(spilled.hops.spilled, 0)
+            for name, dtype in TraceRecorder.hop_columns:
+                self.assertTrue(numpy.array_equal(spilled.hops.get_column(name), in_memory.hops.get_column(name)))
+            spilled.flush()
+            self.assertEqual(spilled.summarize(), in_memory.summarize())
+            self.assertTrue(numpy.array_equal(spilled.get_decay_curve(), in_memory.get_decay_curve()))
+        finally:
+            spilled.remove_files()
+
+
+class TestRandomSource(unittest.TestCase):
+    def test_spawn(self):
+        source = RandomSource(5)
+        self.assertEqual(source.spawn("worker", 2).random_sample(4).tolist(),
+                         RandomSource(5).spawn("worker", 2).random_sample(4).tolist())
+        self.assertNotEqual(source.spawn("worker", 2).random_sample(4).tolist(),
+                            source.spawn("worker", 3).random_sample(4).tolist())
+        self.assertEqual(source.spawn("worker").spawn(2).key, source.spawn("worker", 2).key)
+        self.assertEqual(source.get_node_streams().key, NodeStreams(5).key)
+        self.assertNotEqual(source.spawn(0).get_node_streams().key, NodeStreams(5).key)
+
+    def test_sample(self):
+        source = RandomSource(5)
+        for population in [range(100), tuple(range(3)), set(range(10))]:
+            for k in [0, 2, 3]:
+                picked = source.sample(population, k)
+                self.assertEqual(len(set(picked)), k)
+                self.assertTrue(set(picked) <= set(population))
+        self.assertRaises(ValueError, source.sample, range(2), 3)
+
+    def test_network(self):
+        state = random.getstate()
+        worlds = []
+        for other_seed in [1, 2]:
+            random.seed(other_seed)
+            numpy.random.seed(other_seed)
+            nw = Network([8, 8], network_type="yule", storage="compact", seed=4, cache_dir=None)
+            worlds.append(nw.world)
+        self.assertTrue(numpy.array_equal(worlds[0].out_neighbors, worlds[1].out_neighbors))
+        random.setstate(state)
+        numpy.random.seed(0)
+        numpy_state = numpy.random.get_state()[1].tolist()
+        Network([8, 8], storage="dict", seed=4, cache_dir=None)
+        self.assertEqual(random.getstate(), state)
+        self.assertEqual(numpy.random.get_state()[1].tolist(), numpy_state)
+
+
+class TestSamplers(unittest.TestCase):
+    def setUp(self):
+        random.seed(11)
+        numpy.random.seed(11)
+
+    def assert_frequencies(self, samples, weights):
+        counts = numpy.bincount(samples, minlength=len(weights))
+        expected = len(samples) * numpy.array(weights, dtype=float) / sum(weights)
+        self.assertTrue(numpy.all(numpy.abs(counts - expected) < 4 * numpy.sqrt(expected) + 1))
+
+    def test_alias(self):
+        weights = [1, 0, 3, 6, 0.5]
+        sampler = AliasSampler(weights)
+        self.assert_frequencies(sampler.sample_many(20000), weights)
+        self.assert_frequencies([sampler.sample() for i in range(20000)], weights)
+
+    def test_cumulative(self):
+        weights = [1, 0, 3, 6, 0.5]
+        sampler = CumulativeSampler(weights)
+        self.assert_frequencies(sampler.sample_many(20000), weights)
+        sampler.update(1, 5)
+        self.assert_frequencies([sampler.sample() for i in range(20000)], [1, 5, 3, 6, 0.5])
+
+
+class TestFenwickSampler(unittest.TestCase):
+    def test_update(self):
+        sampler = FenwickSampler([0, 4, 0, 1, 9])
+        self.assertEqual(sampler.total(), 14)
+        sampler.update(4, 0)
+        sampler.update(2, 16)
+        self.assertEqual(sampler.total(), 21)
+        samples = [sampler.sample() for i in range(2000)]
+        self.assertEqual(set(samples), set([1, 2, 3]))
+        self.assertGreater(samples.count(2), samples.count(1))
+
+    def test_no_weight(self):
+        sampler = FenwickSampler([0, 4, 0])
+        sampler.update(1, 0)
+        self.assertRaises(ValueError, sampler.sample)
+
+    def test_sample_excluding(self):
+        sampler = FenwickSampler([1000, 1000, 1, 0])
+        # almost all of the weight is excluded, so the draw falls back to a scan
+        self.assertEqual(set([sampler.sample_excluding(lambda index: index < 2) for i in range(50)]), set([2]))
+        self.assertRaises(ValueError, sampler.sample_excluding, lambda index: index != 3)
+
+    def test_yule_network(self):
+        random.seed(2)
+        nw = Network([8, 8], network_type="yule")
+        for node_id, node in nw.world.iteritems():
+            if node.has_user:
+                self.assertNotIn(node_id, node.out_links)
+                for out_link in node.out_links:
+                    self.assertIn(node_id, nw.world[out_link].in_links)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_phases(self):
+        log_file = tempfile.mktemp(suffix=".jsonl")
+        try:
+            sink = JsonLinesSink(log_file)
+            instrumentation = Instrumentation(sink, checkpoint=10)
+            nw = Network([8, 8], storage="compact", cache_dir=None, instrumentation=instrumentation)
+            BatchRouter(nw.world, instrumentation=instrumentation).route(*BatchRouter(nw.world).sample_pairs(50))
+            sink.close()
+            summary = instrumentation.summary()
+            self.assertEqual(summary["basic network"]["count"], 64)
+            self.assertEqual(summary["long-range links"]["count"], len(nw.world.get_occupied_ids()))
+            self.assertEqual(summary["routing"]["count"], 50)
+            with open(log_file) as f:
+                events = [json.loads(line) for line in f]
+            self.assertEqual([event["phase"] for event in events if event["event"] == "end"],
+                             ["basic network", "long-range links", "routing"])
+        finally:
+            os.remove(log_file)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_case(self):
+        for name in Benchmark.cases:
+            result = run_case((name, 10, 1))
+            self.assertEqual(result["nodes"], 100)
+            self.assertGreaterEqual(result["seconds"], 0)
+
+    def test_compare(self):
+        baseline = {"results": [{"case": "yule", "size": 100, "seconds": 1.0, "peak_rss_mb": 50.0},
+                                {"case": "routing", "size": 100, "seconds": 0.01, "peak_rss_mb": 50.0}]}
+        current = {"results": [{"case": "yule", "size": 100, "seconds": 1.5, "peak_rss_mb": 55.0},
+                               {"case": "routing", "size": 100, "seconds": 0.03, "peak_rss_mb": 80.0},
+                               {"case": "kleinberg", "size": 100, "seconds": 9.0, "peak_rss_mb": 50.0}]}
+        self.assertEqual(Benchmark.compare(baseline, current),
+                         [("yule", 100, "seconds", 1.0, 1.5), ("routing", 100, "peak_rss_mb", 50.0, 80.0)])
+        self.assertEqual(Benchmark.compare(baseline, baseline), [])
+
+
 if __name__ == '__main__':
-    pickles_dir = "pickles/"
     unittest.main()
\ No newline at end of file
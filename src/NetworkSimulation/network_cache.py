@@ -0,0 +1,153 @@
+from collections import defaultdict
+from compact_network import CompactWorld
+import hashlib
+import json
+import numpy
+import os
+import struct
+import tempfile
+
+
+class NetworkCache():
+    """
+    A directory of generated networks stored as raw numpy arrays that are memory-mapped on load.
+    File layout: the magic string, the format version and the header length (little-endian uint32), a json header
+    with the dimensions and the dtype, shape and byte offset of every array, then the arrays, each 64-byte aligned.
+    Entries are keyed by a hash of every generation parameter plus the format version, so networks generated with
+    different parameters never load each other and files of an older format are ignored and removed. When the
+    directory grows over max_bytes the least recently used entries are deleted, except the one just written.
+    The statistics of a network are kept as json next to its entry and deleted with it.
+    """
+    magic = "NSNC"
+    version = 4
+    extension = ".network"
+    stats_extension = ".stats.json"
+    alignment = 64
+    array_names = ["occupancy", "out_offsets", "out_neighbors", "in_offsets", "in_neighbors"]
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        """
+        @param cache_dir: str
+        @param max_bytes: int size cap of the cache directory
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def get_key(params):
+        """
+        Return the content hash of the generation parameters.
+        @param params: dict
+        """
+        params = dict(params, cache_version=NetworkCache.version)
+        return hashlib.sha1(json.dumps(params, sort_keys=True)).hexdigest()
+
+    def get_file_name(self, key):
+        return os.path.join(self.cache_dir, key + self.extension)
+
+    def has(self, key):
+        return os.path.isfile(self.get_file_name(key))
+
+    def read(self, key, dim):
+        """
+        Return the memory-mapped CompactWorld stored under key, or None if there is no usable entry.
+        @param dim: Dim of the network
+        """
+        file_name = self.get_file_name(key)
+        if not os.path.isfile(file_name):
+            return None
+        with open(file_name, 'rb') as f:
+            magic, version, header_length = struct.unpack("<4sII", f.read(12))
+            header = json.loads(f.read(header_length)) if magic == self.magic and version == self.version else None
+        if header is None or header["dimensions"] != list(dim.dimensions):
+            os.remove(file_name)
+            return None
+        arrays = {}
+        for name in self.array_names:
+            dtype, shape, offset = header["arrays"][name]
+            if numpy.prod(shape):
+                arrays[name] = numpy.memmap(file_name, dtype=str(dtype), mode='r', offset=offset, shape=tuple(shape))
+            else:
+                arrays[name] = numpy.zeros(shape, dtype=str(dtype))
+        os.utime(file_name, None)
+        return CompactWorld(dim, arrays["occupancy"], arrays["out_offsets"], arrays["out_neighbors"],
+                            arrays["in_offsets"], arrays["in_neighbors"])
+
+    def write(self, key, world):
+        """
+        Store world under key, then evict old entries if the directory is over its size cap.
+        @param world: CompactWorld
+        """
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        arrays = [(name, numpy.ascontiguousarray(getattr(world, name))) for name in self.array_names]
+        header = {"dimensions": list(world.dim.dimensions), "arrays": {}}
+        # the header length changes the data offsets, so lay out the arrays against a generous upper bound first
+        data_start = self.align(12 + len(json.dumps(header)) + 128 * len(arrays))
+        offset = data_start
+        for name, array in arrays:
+            header["arrays"][name] = (array.dtype.str, list(array.shape), offset)
+            offset = self.align(offset + array.nbytes)
+        header_bytes = json.dumps(header)
+        # write to a temporary file and rename it so a crash never leaves a truncated entry behind
+        handle, temp_file_name = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(handle, 'wb') as f:
+            f.write(struct.pack("<4sII", self.magic, self.version, len(header_bytes)))
+            f.write(header_bytes)
+            for name, array in arrays:
+                f.seek(header["arrays"][name][2])
+                array.tofile(f)
+        os.rename(temp_file_name, self.get_file_name(key))
+        self.evict(keep=key)
+
+    def read_stats(self, key):
+        """
+        Return the statistics stored next to the entry key, or None if there are none.
+        """
+        stats_file_name = os.path.join(self.cache_dir, key + self.stats_extension)
+        if not (self.has(key) and os.path.isfile(stats_file_name)):
+            return None
+        with open(stats_file_name, 'r') as f:
+            return json.load(f)
+
+    def write_stats(self, key, stats):
+        """
+        Store the statistics of the entry key.
+        @param stats: dict
+        """
+        handle, temp_file_name = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(handle, 'w') as f:
+            json.dump(stats, f)
+        os.rename(temp_file_name, os.path.join(self.cache_dir, key + self.stats_extension))
+
+    def align(self, offset):
+        return (offset + self.alignment - 1) // self.alignment * self.alignment
+
+    def evict(self, keep=None):
+        """
+        Delete the least recently used entries, each with its statistics, until all the files of the cache directory
+        fit in max_bytes. Statistics left without their entry go first.
+        @param keep: str key of an entry that is never evicted, the one just written, so an entry bigger than max_bytes
+        stays on its own
+        """
+        # key -> [mtime of the entry, 0 if it has none, bytes of the entry and its statistics]
+        entries = defaultdict(lambda: [0, 0])
+        total = 0
+        for file_name in os.listdir(self.cache_dir):
+            stat = os.stat(os.path.join(self.cache_dir, file_name))
+            total += stat.st_size
+            for extension in [self.extension, self.stats_extension]:
+                if file_name.endswith(extension):
+                    entry = entries[file_name[:-len(extension)]]
+                    entry[1] += stat.st_size
+                    if extension == self.extension:
+                        entry[0] = stat.st_mtime
+        for mtime, size, key in sorted([(mtime, size, key) for key, (mtime, size) in entries.iteritems()]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            for file_name in [key + self.extension, key + self.stats_extension]:
+                if os.path.isfile(os.path.join(self.cache_dir, file_name)):
+                    os.remove(os.path.join(self.cache_dir, file_name))
+            total -= size
@@ -1,12 +1,20 @@
 from collections import defaultdict
+from compact_network import CompactWorld
 from copy import deepcopy
-import cPickle
-import datetime
+from instrumentation import Instrumentation
+from lattice import Lattice
+from lazy_network import LazyWorld
+from network_cache import NetworkCache
+from network_stats import NetworkStats
+from node_streams import NodeStreams
+from parallel_links import get_parallel_kleinberg_targets
+from rng import RandomSource
+from samplers import AliasSampler, CumulativeSampler, FenwickSampler
+from torus import get_movements, get_position_distances
+import numpy
 import operator
 import os
 import random
-import sys
-import time
 
 
 class Dim():
@@ -29,18 +37,21 @@ class Node():
     A node is the basic unit of the network.
     """
 
-    def __init__(self, position, dim, exclude_distance=1):
+    def __init__(self, position, dim, exclude_distance=1, out_links=None):
         """
         @param position: tuple
         @param dim: Dim
+        @param out_links: set ids of the neighbors, computed from the position if None
         """
         self.position = position
         self.dim = dim
         self.neighborhood_radius = exclude_distance
         self.id = hash(position)  # unique identifier of the node
         self.has_user = True
-        self.out_links = set(
-            [hash(tuple(neighbor)) for neighbor in self.getNeighborByDistance(self.neighborhood_radius)])
+        if out_links is None:
+            out_links = set(
+                [hash(tuple(neighbor)) for neighbor in self.getNeighborByDistance(self.neighborhood_radius)])
+        self.out_links = out_links
         self.in_links = deepcopy(self.out_links)  # nodes with l1 distance of 1 have mutual connection
 
     def move(self, position, moveOnDim, distance):
@@ -52,124 +63,407 @@ class Node():
 
     def getNeighborByDistance(self, n):
         """
-        Return the positions of the neighbors (l1 distance of n)
+        Return the positions of the neighbors (l1 distance of n), in any number of dimensions.
         """
         neighbors = set()
-        for i in range(n):
-            tempMovements = (i, n - i), (-i, n - i), (i, -(n - i)), (-i, -(n - i)), \
-                            (n - i, i), (n - i, -i), (-(n - i), i), (-(n - i), -i)
-            movements = set()
-            for tempMovement in tempMovements:
-                qualified = True
-                for i in range(len(self.dim.dimensions)):
-                    if abs(tempMovement[i]) > self.dim.diameters[i]:
-                        qualified = False
-                        break
-                if qualified:
-                    movements.add(tempMovement)
-            for movement in movements:
-                tempPosition = list(self.position)
-                for j in range(len(self.dim.dimensions)):
-                    self.move(tempPosition, j, movement[j])
-                neighbors.add(tuple(tempPosition))
+        for movement in get_movements(self.dim.dimensions, n):
+            tempPosition = list(self.position)
+            for j in range(len(self.dim.dimensions)):
+                self.move(tempPosition, j, int(movement[j]))
+            neighbors.add(tuple(tempPosition))
         return neighbors
 
 
+class ShellIndex():
+    """
+    Index of the torus offsets grouped by their l1 distance (shell), built once per lattice.
+    Because the torus has no boundary, every node sees the same shells, so a Kleinberg connection can be drawn by
+    picking a shell with probability count / d ** cluster_exponent, picking an offset uniformly in that shell, and
+    rejecting the draw if the node at the offset has no user. Accepted draws follow exactly the 1 / d ** r
+    distribution over the occupied nodes.
+    The number of offsets in every shell is the convolution of the distance counts of the dimensions, so it takes
+    memory in the diameter only. The offsets of a shell are ordered by their row-major code. With materialize they
+    are all listed once, O(N) memory and O(1) lookups; without, the kth offset of a shell is decoded on demand one
+    dimension at a time by binary search over prefix sums of the counts, which is what a LazyWorld needs.
+    """
+
+    def __init__(self, dim, exclude_distance=1, cluster_exponent=1, materialize=True):
+        """
+        @param dim: Dim
+        @param exclude_distance: int offsets within this l1 distance are never drawn
+        @param cluster_exponent: int|float
+        @param materialize: bool list all offsets, or decode them when drawn
+        """
+        self.dim = dim
+        self.exclude_distance = exclude_distance
+        self.cluster_exponent = cluster_exponent
+        # suffix_counts[i][d]: the number of offsets of the dimensions i, i + 1, ... at l1 distance d
+        self.suffix_counts = [numpy.ones(1, dtype=numpy.int64)]
+        for size in reversed(dim.dimensions):
+            self.suffix_counts.insert(0, numpy.convolve(ShellIndex.get_distance_counts(size), self.suffix_counts[0]))
+        # prefix sums of the counts of the dimensions after i, used to decode coordinate i
+        self.suffix_prefixes = [numpy.cumsum(counts) for counts in self.suffix_counts[1:]]
+        distances = numpy.arange(len(self.suffix_counts[0]))
+        drawn = (distances > exclude_distance) & (self.suffix_counts[0] > 0)
+        self.shells = distances[drawn]
+        self.shell_counts = self.suffix_counts[0][drawn]
+        self.shell_starts = numpy.concatenate([[0], numpy.cumsum(self.shell_counts)[:-1]]).astype(numpy.int64)
+        # row-major offset codes sorted by shell, shell k is offsets[shell_starts[k]:shell_starts[k] + shell_counts[k]]
+        self.offsets = self.get_all_offsets() if materialize else None
+        if len(self.shells):
+            self.shell_sampler = AliasSampler(self.shell_counts / self.shells.astype(float) ** cluster_exponent)
+
+    @staticmethod
+    def get_distance_counts(size):
+        """
+        Return the number of steps 0 <= t < size at every torus distance min(t, size - t).
+        """
+        counts = numpy.full(size // 2 + 1, 2, dtype=numpy.int64)
+        counts[0] = 1
+        if size % 2 == 0 and size > 0:
+            counts[-1] = 1
+        return counts
+
+    def get_all_offsets(self):
+        distances = numpy.zeros(self.dim.dimensions, dtype=numpy.int64)
+        for i, size in enumerate(self.dim.dimensions):
+            steps = numpy.arange(size)
+            shape = [1] * len(self.dim.dimensions)
+            shape[i] = size
+            distances += numpy.minimum(steps, size - steps).reshape(shape)
+        distances = distances.ravel()
+        codes = numpy.flatnonzero(distances > self.exclude_distance)
+        return codes[numpy.argsort(distances[codes], kind="mergesort")]
+
+    def count_before(self, i, distances, steps):
+        """
+        Return, for every pair, the number of offsets at l1 distance distances whose coordinate i is below steps.
+        """
+        size = self.dim.dimensions[i]
+        prefix = self.suffix_prefixes[i]
+        half = size // 2
+
+        def get_prefix(values):
+            return numpy.where(values < 0, 0, prefix[numpy.clip(values, 0, len(prefix) - 1)])
+
+        # coordinates 0..half are at distance t, coordinates half + 1.. at distance size - t
+        counts = get_prefix(distances) - get_prefix(distances - numpy.minimum(steps, half + 1))
+        return counts + numpy.where(steps > half + 1, get_prefix(distances - size + steps - 1) -
+                                    get_prefix(distances - size + half), 0)
+
+    def decode_offsets(self, shells, in_shell):
+        """
+        Return the in_shell-th offset, in row-major order, of every shell index, as a tuple of coordinate arrays.
+        """
+        distances = self.shells[shells].astype(numpy.int64)
+        remaining = numpy.asarray(in_shell, dtype=numpy.int64).copy()
+        coordinates = []
+        for i, size in enumerate(self.dim.dimensions):
+            # the largest step with fewer than remaining + 1 offsets before it
+            low = numpy.zeros(len(distances), dtype=numpy.int64)
+            high = numpy.full(len(distances), size - 1, dtype=numpy.int64)
+            while numpy.any(low < high):
+                middle = (low + high + 1) // 2
+                below = self.count_before(i, distances, middle) <= remaining
+                low = numpy.where(below, middle, low)
+                high = numpy.where(below, high, middle - 1)
+            remaining -= self.count_before(i, distances, low)
+            distances -= numpy.minimum(low, size - low)
+            coordinates.append(low)
+        return tuple(coordinates)
+
+    def get_offsets(self, shells, in_shell):
+        """
+        Return the in_shell-th offset of every shell index, as a tuple of coordinate arrays.
+        """
+        if self.offsets is None:
+            return self.decode_offsets(shells, in_shell)
+        return numpy.unravel_index(self.offsets[self.shell_starts[shells] + in_shell], self.dim.dimensions)
+
+    def draw_offset(self, rng=random):
+        """
+        Return an offset tuple drawn with probability 1 / d ** cluster_exponent over all lattice offsets.
+        @param rng: random|RandomSource
+        """
+        shell = self.shell_sampler.sample(rng)
+        offset = self.get_offsets(numpy.array([shell]), numpy.array([int(rng.random() * self.shell_counts[shell])]))
+        return tuple([coordinates[0] for coordinates in offset])
+
+    def draw_offsets(self, num_offsets, rng=numpy.random):
+        """
+        Return num_offsets offsets drawn like draw_offset, as a tuple of coordinate arrays.
+        @param rng: numpy.random|RandomSource
+        """
+        shells = self.shell_sampler.sample_many(num_offsets, rng)
+        in_shell = (rng.random_sample(num_offsets) * self.shell_counts[shells]).astype(numpy.int64)
+        return self.get_offsets(shells, in_shell)
+
+    def lookup_offsets(self, shell_uniforms, offset_uniforms):
+        """
+        Return the offsets given by two arrays of uniform numbers, one to pick the shell and one to pick the offset in
+        it, as a tuple of coordinate arrays. Same distribution as draw_offsets.
+        """
+        shells = self.shell_sampler.lookup(shell_uniforms)
+        in_shell = (offset_uniforms * self.shell_counts[shells]).astype(numpy.int64)
+        return self.get_offsets(shells, in_shell)
+
+    def draw_position(self, position, rng=random):
+        """
+        Return the position reached from position by a randomly drawn offset.
+        @param position: tuple
+        @param rng: random|RandomSource
+        """
+        offset = self.draw_offset(rng)
+        return tuple([(position[i] + int(offset[i])) % self.dim.dimensions[i] for i in range(len(position))])
+
+
 class Network():
     """
     Generate a network of Node objects.
     """
 
-    def __init__(self, worldDimension, density=0.6, network_type="kleinberg", num_out_links=1, pickles_dir="pickles/",
-                 neighborhood_radius=1, real_connection=True):
+    def __init__(self, worldDimension, density=0.6, network_type="kleinberg", num_out_links=1, cache_dir="pickles/",
+                 neighborhood_radius=1, real_connection=True, storage="dict", cluster_exponent=1, seed=None,
+                 instrumentation=None, processes=1):
         """
         Default network_type is kleinberg, which ignors preferential attachment.
-        Generated models of diameter greater than 25 are picked to pickles/*
+        Seeded networks are stored in the NetworkCache in cache_dir, pass cache_dir=None to skip the cache.
+        Unseeded networks are never cached since they are not reproducible.
         @param worldDimension: tuple
         @param real_connection: bool True if every out-link is also an in-link
+        @param storage: str "dict" keeps the Node objects, "compact" builds the world as a CompactWorld, "lazy" builds
+        nothing and returns a LazyWorld, only for kleinberg networks without real_connection
+        @param cluster_exponent: int|float r in the 1 / d ** r probability of a Kleinberg connection
+        @param seed: int seed of the RandomSource every random draw of the generation comes from, and of the
+        NodeStreams that give the occupancy and the Kleinberg connections. Drawn from numpy.random if None. The global
+        random modules are neither seeded nor read.
+        @param instrumentation: Instrumentation that times the generation phases, shown on the console if None
+        @param processes: int number of processes that draw the compact Kleinberg connections, all cpus if None.
+        The network does not depend on it.
         """
+        if storage == "lazy" and (network_type != "kleinberg" or real_connection):
+            raise ValueError("lazy storage only generates kleinberg networks without real_connection")
+        self.seed = seed
+        self.rng = RandomSource(seed)
+        self.streams = self.rng.get_node_streams()
         self.network_type = network_type
         self.dim = Dim(worldDimension)
         self.density = density
         self.num_out_links = num_out_links
         self.neighborhood_radius = neighborhood_radius
+        self.cluster_exponent = cluster_exponent
         self.num_nodes = reduce(operator.mul, self.dim.dimensions, 1)
-        self.basic_network = self.get_basic_network()
-        self.basic_network_nodes = self.basic_network.keys()
+        self.shell_indexes = {}
         self.real_connection = real_connection
-        self.pickle_file_name = pickles_dir + self.get_pickle_file_name(self.dim.dimensions,
-                                                                        [self.density, network_type, num_out_links]) + ".pickled"
-        if Utils.has_cached_file(self.pickle_file_name):
-            self.world = Utils.read_from_cache(self.pickle_file_name)
+        self.storage = storage
+        self.processes = processes
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.cache = NetworkCache(cache_dir) if cache_dir is not None and seed is not None and storage != "lazy" \
+            else None
+        self.cache_key = NetworkCache.get_key(self.get_parameters())
+        cached_world = None
+        if self.cache is not None:
+            with self.instrumentation.phase("cache read") as phase:
+                cached_world = self.cache.read(self.cache_key, self.dim)
+                phase.update(len(cached_world.out_neighbors) if cached_world is not None else 0)
+        if cached_world is not None:
+            self.world = cached_world if storage == "compact" else self.get_world_from_compact(cached_world)
+        elif storage == "lazy":
+            self.world = self.get_lazy_kleinberg_network()
         else:
-            self.world = getattr(self, "get_" + network_type + "_network")()
-            if self.dim.diam > 25:
-                Utils.write_to_cache(pickles_dir, self.pickle_file_name, self.world)
+            self.basic_network = self.get_basic_network()
+            self.basic_network_nodes = self.basic_network.keys()
+            self.world = getattr(self, "get_" + ("compact_" if storage == "compact" else "") + network_type +
+                                 "_network")()
+            if self.cache is not None:
+                with self.instrumentation.phase("cache write") as phase:
+                    compact_world = self.world
+                    if storage != "compact":
+                        compact_world = CompactWorld.from_world(self.world, self.dim)
+                    self.cache.write(self.cache_key, compact_world)
+                    phase.update(len(compact_world.out_neighbors))
+        self.basic_network = self.world
+        self.basic_network_nodes = self.world.keys()
 
-    def get_pickle_file_name(self, dimensions, *args):
+    def get_parameters(self):
         """
-        Helper method, get the name for the model for pickled file name
-        @param dimensions: list|tuple
+        Return every parameter that the generated network depends on, used as the cache key.
         """
-        file_name_helper = [str(dimension) for dimension in dimensions]
-        file_name_helper.extend(*args)
-        return "_".join([str(helper) for helper in file_name_helper])
+        return {"dimensions": list(self.dim.dimensions), "density": self.density, "network_type": self.network_type,
+                "num_out_links": self.num_out_links, "neighborhood_radius": self.neighborhood_radius,
+                "real_connection": self.real_connection, "cluster_exponent": self.cluster_exponent,
+                "seed": self.seed}
+
+    def get_stats(self):
+        """
+        Return the NetworkStats summary of the world. Seeded networks keep it in the cache next to their entry, so it
+        is computed once per network. A lazy network is never built, so it has none.
+        """
+        if self.storage == "lazy":
+            raise ValueError("a lazy network has no statistics")
+        stats = self.cache.read_stats(self.cache_key) if self.cache is not None else None
+        if stats is None:
+            with self.instrumentation.phase("stats", self.num_nodes) as phase:
+                world = self.world if self.storage == "compact" else CompactWorld.from_world(self.world, self.dim)
+                stats = NetworkStats(world, self.neighborhood_radius).summary()
+                phase.update(self.num_nodes)
+            if self.cache is not None and self.cache.has(self.cache_key):
+                self.cache.write_stats(self.cache_key, stats)
+        return stats
+
+    def get_world_from_compact(self, compact_world):
+        """
+        Return the dict of Node objects with the links stored in a CompactWorld.
+        @param compact_world: CompactWorld
+        """
+        hashes = [hash(compact_world.get_position(node_id)) for node_id in compact_world]
+        world = {}
+        for node_id in compact_world:
+            node = Node(compact_world.get_position(node_id), self.dim,
+                        out_links=set([hashes[out_link] for out_link in compact_world.get_out_links(node_id)]))
+            node.has_user = bool(compact_world.occupancy[node_id])
+            node.in_links = set([hashes[in_link] for in_link in compact_world.get_in_links(node_id)])
+            world[node.id] = node
+        return world
 
     def get_basic_network(self):
         """
-        Set up the basic network of the right size and each node is connected to nodes of l1 distance 1.
-        """
-        tempWorld = []
-        for i in range(self.dim.dimensions[0]):
-            tempWorld.append([i])
-        for i in range(len(self.dim.dimensions) - 1):
-            cWorld1 = []
-            for j in range(self.dim.dimensions[i + 1]):
-                cWorld = [list(world) for world in tempWorld]
-                for node in cWorld:
-                    node.append(j)
-                cWorld1.extend(cWorld)
-            tempWorld = [list(world) for world in cWorld1]
-        testWorld = {}
-        for position in tempWorld:
-            node = Node(tuple(position), self.dim)
-            testWorld[node.id] = node
-        for node_id in testWorld:
-            test = random.random()
-            if test > self.density:
-                testWorld[node_id].has_user = False
-                for out_link in testWorld[node_id].out_links:
-                    testWorld[out_link].in_links.remove(node_id)
-                    testWorld[out_link].out_links.remove(node_id)
-                testWorld[node_id].in_links = set()
-                testWorld[node_id].out_links = set()
-        print("Basic network done! ({0} = {1} nodes)".format(" x ".join([str(item) for item in self.dim.dimensions]),
-                                                             self.num_nodes))
-        return testWorld
+        Set up the basic network of the right size and each node is connected to nodes within l1 distance
+        neighborhood_radius. The lattice and the occupancy mask are built with array operations by Lattice; with dict
+        storage the Node objects are then created from those arrays, so both storages get the same basic network.
+        """
+        with self.instrumentation.phase("basic network", self.num_nodes) as phase:
+            lattice = Lattice(self.dim, self.neighborhood_radius)
+            basic_network = lattice.get_world(lattice.get_occupancy(self.density, self.streams))
+            phase.add("links", len(basic_network.out_neighbors))
+            if self.storage != "compact":
+                basic_network = self.get_world_from_compact(basic_network)
+            phase.update(self.num_nodes)
+        return basic_network
 
     def get_kleinberg_network(self, far_connection=1):
         """
         Return a network generated using the Kleinberg paper.
+        The connections are drawn by get_kleinberg_targets on the CompactWorld of the basic network, so the Node
+        objects get the links of get_compact_kleinberg_network with the same seed.
         """
         network = self.basic_network
-        progress_meter = Utils.ProgressMeter(self.num_nodes)
-        for i in range(far_connection):
-            for nodeId in network:
-                if network[nodeId].has_user:
-                    new_connection = self.get_kleinberg_connection(network[nodeId])
-                    connection_hash = hash(new_connection)
+        lattice_world = CompactWorld.from_world(network, self.dim)
+        occupied = lattice_world.get_occupied_ids()
+        hashes = [hash(lattice_world.get_position(node_id)) for node_id in range(len(lattice_world))]
+        with self.instrumentation.phase("long-range links", far_connection * len(occupied)) as phase:
+            for i in range(far_connection):
+                targets = self.get_kleinberg_targets(occupied, self.cluster_exponent, connection=i,
+                                                     world=lattice_world)
+                for source, target in zip(occupied.tolist(), targets.tolist()):
+                    nodeId = hashes[source]
+                    connection_hash = hashes[target]
                     network[nodeId].out_links.add(connection_hash)
                     network[connection_hash].in_links.add(nodeId)
                     if self.real_connection:
                         network[nodeId].in_links.add(connection_hash)
                         network[connection_hash].out_links.add(nodeId)
-                progress_meter.show_progress()
-        print("Finished building " + self.network_type + " network!")
+                phase.update(len(occupied))
         return network
 
-    def get_kleinberg_connection(self, node, cluster_exponent=1):
+    def get_compact_kleinberg_network(self, far_connection=1):
+        """
+        Return a CompactWorld generated using the Kleinberg paper, drawing the connections of all nodes at once.
+        """
+        network = self.basic_network
+        occupied = network.get_occupied_ids()
+        sources = numpy.tile(occupied, far_connection)
+        with self.instrumentation.phase("long-range links", len(sources)) as phase:
+            if self.processes == 1:
+                targets = []
+                for i in range(far_connection):
+                    targets.append(self.get_kleinberg_targets(occupied, self.cluster_exponent, connection=i))
+                    phase.update(len(occupied))
+                targets = numpy.concatenate(targets)
+            else:
+                targets = get_parallel_kleinberg_targets(self, occupied, far_connection, self.processes, phase).ravel()
+            if self.real_connection:
+                sources, targets = numpy.concatenate([sources, targets]), numpy.concatenate([targets, sources])
+            basic_sources, basic_targets = network.get_links()
+            world = CompactWorld.from_links(self.dim, network.occupancy, numpy.concatenate([basic_sources, sources]),
+                                            numpy.concatenate([basic_targets, targets]))
+        return world
+
+    def get_lazy_kleinberg_network(self, far_connection=1):
+        """
+        Return a LazyWorld that draws the Kleinberg connections of a node when it is first visited. Its links are the
+        links of get_compact_kleinberg_network with the same seed and real_connection off.
+        """
+        self.basic_network = LazyWorld(self.dim, self.density, self.streams,
+                                       lambda sources, connection: self.get_kleinberg_targets(
+                                           sources, self.cluster_exponent, connection=connection),
+                                       self.neighborhood_radius, far_connection)
+        return self.basic_network
+
+    def get_kleinberg_targets(self, sources, cluster_exponent=1, max_rejections=1000, connection=0, world=None):
+        """
+        Return a Kleinberg connection for every node id in sources, the vectorized get_kleinberg_connection.
+        Every round draws one offset for each source still without a connection and keeps the draws that land on a
+        node with a user. Round i reads draws 2 * i and 2 * i + 1 of the source's stream for this connection, so
+        the connection of a node does not depend on which other nodes are drawn with it.
+        @param sources: numpy.ndarray of node ids of a CompactWorld or a LazyWorld
+        @param connection: int index of the connection when every node has several
+        @param world: CompactWorld|LazyWorld the sources are in, basic_network if None
         """
-        Return the position of a generated Kleinberg connection.
+        network = world if world is not None else self.basic_network
+        shell_index = self.get_shell_index(cluster_exponent)
+        stream = NodeStreams.links + connection
+        targets = numpy.full(len(sources), -1, dtype=numpy.int64)
+        pending = numpy.arange(len(sources))
+        for i in range(max_rejections if len(shell_index.shells) else 0):
+            if not len(pending):
+                break
+            offsets = shell_index.lookup_offsets(self.streams.uniforms(sources[pending], stream, 2 * i),
+                                                 self.streams.uniforms(sources[pending], stream, 2 * i + 1))
+            coordinates = numpy.unravel_index(sources[pending], self.dim.dimensions)
+            candidates = numpy.ravel_multi_index([(coordinates[j] + offsets[j]) % self.dim.dimensions[j]
+                                                  for j in range(len(offsets))], self.dim.dimensions)
+            accepted = network.is_occupied(candidates)
+            targets[pending[accepted]] = candidates[accepted]
+            pending = pending[~accepted]
+        occupied = network.get_occupied_ids() if len(pending) else None
+        for j in pending:
+            distances = network.get_distances(occupied, sources[j])
+            far = distances > self.neighborhood_radius
+            sampler = CumulativeSampler(distances[far] ** -float(cluster_exponent))
+            targets[j] = occupied[far][sampler.lookup(self.streams.uniforms(sources[j], stream, 2 * max_rejections))]
+        return targets
+
+    def get_shell_index(self, cluster_exponent=1):
+        """
+        Return the ShellIndex of this lattice, built on first use for each cluster_exponent.
+        """
+        if cluster_exponent not in self.shell_indexes:
+            # a LazyWorld decodes offsets on demand, so its memory does not grow with the lattice
+            self.shell_indexes[cluster_exponent] = ShellIndex(self.dim, self.neighborhood_radius, cluster_exponent,
+                                                              materialize=self.storage != "lazy")
+        return self.shell_indexes[cluster_exponent]
+
+    def get_kleinberg_connection(self, node, cluster_exponent=1, max_rejections=1000):
+        """
+        Return the id of a new Kleinberg connection of node, drawn from rng. The connections of the network itself
+        come from get_kleinberg_targets.
+        Offsets are drawn from the shell index and rejected until they land on a node with a user, which takes
+        about 1 / density draws. If the lattice is so sparse that max_rejections draws all miss, fall back to
+        scanning the whole network.
+        @param node: Node
+        """
+        shell_index = self.get_shell_index(cluster_exponent)
+        if len(shell_index.shells):
+            for i in range(max_rejections):
+                candidate = hash(shell_index.draw_position(node.position, self.rng))
+                if self.basic_network[candidate].has_user:
+                    return candidate
+        return self.scan_kleinberg_connection(node, cluster_exponent)
+
+    def scan_kleinberg_connection(self, node, cluster_exponent=1):
+        """
+        Return the id of a generated Kleinberg connection by computing the distance to every node. O(N) per call.
         @param node: Node
         """
         helper = defaultdict(set)
@@ -180,57 +474,82 @@ class Network():
                     helper[temp_distance].add(node_id)
         bin_helper = [(distance, len(connections)) for distance, connections in helper.iteritems()]
         raw_bin = [1.0 * num_users / (distance ** cluster_exponent) for distance, num_users in bin_helper]
-        bin_num = Utils.select_bin(raw_bin)
+        bin_num = Utils.select_bin(raw_bin, self.rng)
         candidates = helper[bin_helper[bin_num][0]]
-        return random.sample(candidates, 1)[0]
+        return self.rng.sample(candidates, 1)[0]
 
     def get_yule_network(self):
         """
         Return a network that considers preferential attachment.
+        A node is picked as a connection with probability proportional to the square of its number of in-links,
+        kept in a FenwickSampler so each connection costs O(log N).
         """
         network = self.basic_network
-        helper = defaultdict(set)
-        for node_id in network:
-            if network[node_id].has_user:
-                helper[len(network[node_id].in_links)].add(node_id)
-        node_ids = [n_id for n_id in network if network[n_id].has_user]
+        # in the order of the node ids, as in get_compact_yule_network, so both storages draw the same network
+        node_ids = sorted([n_id for n_id in network if network[n_id].has_user], key=lambda n_id: network[n_id].position)
+        node_indexes = dict([(node_id, i) for i, node_id in enumerate(node_ids)])
+        sampler = FenwickSampler([len(network[node_id].in_links) ** 2 for node_id in node_ids])
         assignedNodes = set()
         for i in range(self.num_out_links):
-            progress_meter = Utils.ProgressMeter(self.num_nodes)
-            for node_id in node_ids:
-                if node_id not in assignedNodes:
-                    connection_id = self.get_yule_connection(network[node_id], helper)
-                    for key in helper:
-                        if connection_id in helper[key]:
-                            helper[key].remove(connection_id)
-                    network[node_id].out_links.add(connection_id)
-                    network[connection_id].in_links.add(node_id)
-                    if self.real_connection:
-                        network[node_id].in_links.add(connection_id)
-                        network[connection_id].out_links.add(node_id)
-                    assignedNodes.add(node_id)
-                    helper[len(network[connection_id].in_links)].add(connection_id)
-                    progress_meter.show_progress()
-            print("Finished building " + self.network_type + " network!")
+            with self.instrumentation.phase("long-range links", len(node_ids) - len(assignedNodes)) as phase:
+                for node_id in node_ids:
+                    if node_id not in assignedNodes:
+                        connection_id = self.get_yule_connection(network[node_id], sampler, node_ids)
+                        network[node_id].out_links.add(connection_id)
+                        network[connection_id].in_links.add(node_id)
+                        if self.real_connection:
+                            network[node_id].in_links.add(connection_id)
+                            network[connection_id].out_links.add(node_id)
+                        assignedNodes.add(node_id)
+                        sampler.update(node_indexes[connection_id], len(network[connection_id].in_links) ** 2)
+                        phase.update()
         return network
 
-    def get_yule_connection(self, node, helper):
+    def get_yule_connection(self, node, sampler, node_ids):
         """
         Return a connection that considers preferential attachment.
         @param node: Node
-        @param helper: dict
+        @param sampler: FenwickSampler weights of node_ids
+        @param node_ids: list
         """
-        exclude_list = [node.id]
-        exclude_list.extend(node.out_links)
-        count_in_links = sorted(helper.keys())
-        raw_bin = [len(helper[count_in_links[i]]) * (count_in_links[i] ** 2) for i in range(len(count_in_links))]
-        connection_id = node.id
-        while connection_id == node.id:
-            from_bin = Utils.select_bin(raw_bin)
-            candidate = random.sample(helper[count_in_links[from_bin]], 1)[0]
-            if candidate not in exclude_list:
-                connection_id = candidate
-        return connection_id
+        return node_ids[sampler.sample_excluding(
+            lambda index: node_ids[index] == node.id or node_ids[index] in node.out_links, self.rng)]
+
+    def get_compact_yule_network(self):
+        """
+        Return a CompactWorld that considers preferential attachment, drawn like get_yule_network.
+        As there, every node with a user gets one preferential-attachment link.
+        """
+        network = self.basic_network
+        node_ids = network.get_occupied_ids().tolist()
+        in_degrees = numpy.diff(network.in_offsets).tolist()
+        sampler = FenwickSampler([in_degrees[node_id] ** 2 for node_id in node_ids])
+        node_indexes = dict([(node_id, i) for i, node_id in enumerate(node_ids)])
+        # links added on top of the basic network, which a node must not pick again
+        added_out_links = defaultdict(set)
+        sources = []
+        targets = []
+        with self.instrumentation.phase("long-range links", len(node_ids)) as phase:
+            for node_id in node_ids:
+                basic_out_links = set(network.get_out_links(node_id).tolist())
+                connection_id = node_ids[sampler.sample_excluding(
+                    lambda index: node_ids[index] == node_id or node_ids[index] in added_out_links[node_id] or
+                    node_ids[index] in basic_out_links, self.rng)]
+                sources.append(node_id)
+                targets.append(connection_id)
+                added_out_links[node_id].add(connection_id)
+                in_degrees[connection_id] += 1
+                if self.real_connection:
+                    sources.append(connection_id)
+                    targets.append(node_id)
+                    added_out_links[connection_id].add(node_id)
+                    in_degrees[node_id] += 1
+                sampler.update(node_indexes[connection_id], in_degrees[connection_id] ** 2)
+                phase.update()
+        basic_sources, basic_targets = network.get_links()
+        return CompactWorld.from_links(self.dim, network.occupancy,
+                                       numpy.concatenate([basic_sources, numpy.array(sources, dtype=numpy.int64)]),
+                                       numpy.concatenate([basic_targets, numpy.array(targets, dtype=numpy.int64)]))
 
     def get_position(self, nodeId):
         return self.world[nodeId].position
@@ -242,13 +561,22 @@ class Network():
             total += diff if 2 * diff <= self.dim.dimensions[i] else self.dim.dimensions[i] - diff
         return total
 
+    def get_distances(self, position, positions, metric="l1"):
+        """
+        Return the torus distances from position to every position in positions, in one vectorized call.
+        @param position: tuple
+        @param positions: list of tuples|numpy.ndarray of shape (n, number of dimensions)
+        @param metric: str "l1" or "linf"
+        """
+        return get_position_distances(self.dim.dimensions, position, positions, metric)
+
     def get_random_connection(self, node):
         """
         Return the id of a random connection in the network.
         """
         exclude_list = [node.id]
         exclude_list.extend(node.out_links)
-        candidates = random.sample(self.basic_network_nodes, len(exclude_list) + 1)
+        candidates = self.rng.sample(self.basic_network_nodes, len(exclude_list) + 1)
         for candidate in candidates:
             if candidate not in exclude_list:
                 return candidate
@@ -268,64 +596,10 @@ class Utils():
         return sorts[length / 2]
 
     @staticmethod
-    def select_bin(raw_bin):
+    def select_bin(raw_bin, rng=random):
         """
         Randomly select a bin given a raw_bin with a list of bin width.
+        Builds a CumulativeSampler, so keep the sampler instead when drawing repeatedly from the same bins.
+        @param rng: random|RandomSource
         """
-        normalized_bin = [(1.0 * width) / sum(raw_bin) for width in raw_bin]
-        # print(normalized_bin)
-        tracker = normalized_bin[0]
-        select_helper = random.random()
-        for i in range(len(normalized_bin)):
-            if select_helper < tracker:
-                return i
-            elif i < len(normalized_bin) - 1:
-                tracker += normalized_bin[i + 1]
-            else:
-                return i
-
-    @staticmethod
-    def has_cached_file(pickle_file_name):
-        return os.path.isfile(pickle_file_name)
-
-    @staticmethod
-    def read_from_cache(pickle_file_name):
-        with open(pickle_file_name, 'r') as f:
-            obj = cPickle.load(f)
-        return obj
-
-    @staticmethod
-    def write_to_cache(pickles_dir, pickle_file_name, obj):
-        if not os.path.exists(pickles_dir):
-            os.makedirs(pickles_dir)
-        with open(pickle_file_name, 'w') as f:
-            cPickle.dump(obj, f)
-
-    class ProgressMeter():
-        """
-        Utility class to show the progress of the program.
-        """
-
-        def __init__(self, num_work, checkpoint=1000):
-            """
-            @param num_work: int size of the overall loop
-            """
-            self.num_work = num_work
-            self.checkpoint = checkpoint
-            self.increment = int(1.0 * self.num_work / checkpoint) if 1.0 * self.num_work / checkpoint > 1 else 1
-            self.counter = 0
-            self.timer = time.time()
-
-        def show_progress(self):
-            """
-            Updates progress when called.
-            """
-            if self.counter % self.increment == 0:
-                speed = self.counter / (time.time() - self.timer) if self.counter != 0 else 0
-                remaining_time_string = str(
-                    datetime.timedelta(
-                        seconds=int((self.num_work - self.counter) / speed))) if self.counter != 0 else "???"
-
-                sys.stdout.write("{0:3d} % completed ({1:.1f} nodes/sec) Estimated time to finish: {2}\r".format(
-                    int(100.0 * self.counter / self.num_work), speed, remaining_time_string))
-            self.counter += 1
\ No newline at end of file
+        return CumulativeSampler(raw_bin).sample(rng)
@@ -0,0 +1,148 @@
+from compact_network import CompactWorld
+import numpy
+
+
+class NetworkStats():
+    """
+    Structural statistics of a CompactWorld, each computed in a few vectorized passes over its CSR arrays.
+    Only the nodes with a user count, as the empty nodes have no links. The clustering coefficient and the components
+    treat every link as undirected.
+    """
+    # wedges checked per block of the clustering pass, which bounds its memory
+    wedge_block = 2 ** 22
+
+    def __init__(self, world, neighborhood_radius=1):
+        """
+        @param world: CompactWorld
+        @param neighborhood_radius: int links longer than this are long-range links
+        """
+        if not isinstance(world, CompactWorld):
+            # the statistics read the CSR arrays, which a LazyWorld or a DynamicWorld does not have
+            raise TypeError("NetworkStats needs a CompactWorld, not a " + type(world).__name__)
+        self.world = world
+        self.neighborhood_radius = neighborhood_radius
+        self.occupied = world.get_occupied_ids()
+        self.undirected = None
+
+    def get_occupancy_fraction(self):
+        return 1.0 * len(self.occupied) / len(self.world) if len(self.world) else 0.0
+
+    def get_degree_histograms(self):
+        """
+        Return (out-degree histogram, in-degree histogram): entry k is the number of nodes with a user of degree k.
+        """
+        out_degrees = numpy.diff(self.world.out_offsets)[self.occupied]
+        in_degrees = numpy.diff(self.world.in_offsets)[self.occupied]
+        return numpy.bincount(out_degrees), numpy.bincount(in_degrees)
+
+    def get_undirected_links(self):
+        """
+        Return (offsets, neighbors), the CSR arrays of the links taken both ways without duplicates or self-links.
+        """
+        if self.undirected is None:
+            sources, targets = self.world.get_links()
+            distinct = sources != targets
+            sources, targets = sources[distinct], targets[distinct]
+            num_nodes = len(self.world)
+            keys = numpy.unique(numpy.concatenate([sources * num_nodes + targets, targets * num_nodes + sources]))
+            offsets = numpy.zeros(num_nodes + 1, dtype=numpy.int64)
+            numpy.cumsum(numpy.bincount(keys // num_nodes, minlength=num_nodes), out=offsets[1:])
+            self.undirected = offsets, keys % num_nodes, keys
+        return self.undirected[0], self.undirected[1]
+
+    def get_clustering_coefficients(self):
+        """
+        Return the local clustering coefficient of every node: the fraction of pairs of its neighbors that are linked,
+        nan for nodes with fewer than 2 neighbors.
+        Every pair (wedge) of neighbors of a node is enumerated and looked up in the sorted link keys.
+        """
+        offsets, neighbors = self.get_undirected_links()
+        keys = self.undirected[2]
+        num_nodes = len(self.world)
+        degrees = numpy.diff(offsets)
+        # position p in neighbors pairs with the positions after it in the same node's segment
+        segment_ends = numpy.repeat(offsets[1:], degrees)
+        pairs_per_position = segment_ends - numpy.arange(len(neighbors)) - 1
+        triangles = numpy.zeros(num_nodes, dtype=numpy.int64)
+        centers = numpy.repeat(numpy.arange(num_nodes), degrees)
+        bounds = numpy.zeros(len(neighbors) + 1, dtype=numpy.int64)
+        numpy.cumsum(pairs_per_position, out=bounds[1:])
+        start = 0
+        while start < len(neighbors):
+            stop = max(int(numpy.searchsorted(bounds, bounds[start] + self.wedge_block, side="right")) - 1, start + 1)
+            counts = pairs_per_position[start:stop]
+            first = numpy.repeat(numpy.arange(start, stop), counts)
+            second = first + 1 + numpy.arange(len(first)) - numpy.repeat(bounds[start:stop] - bounds[start], counts)
+            wedge_keys = neighbors[first] * num_nodes + neighbors[second]
+            found = numpy.searchsorted(keys, wedge_keys)
+            closed = keys[numpy.minimum(found, len(keys) - 1)] == wedge_keys if len(keys) else numpy.zeros(0, bool)
+            triangles += numpy.bincount(centers[first[closed]], minlength=num_nodes)
+            start = stop
+        coefficients = numpy.full(num_nodes, numpy.nan)
+        enough = degrees >= 2
+        coefficients[enough] = 2.0 * triangles[enough] / (degrees[enough] * (degrees[enough] - 1))
+        return coefficients
+
+    def get_components(self):
+        """
+        Return the component label of every node, the smallest node id in its component.
+        Union-find over all links at once: every round hooks the larger root of each link under the smaller one, then
+        compresses the paths by pointer jumping, until every link joins nodes with the same root. A root linked to
+        several smaller roots is hooked under any one of them, as the links left over are joined in the next rounds.
+        """
+        offsets, neighbors = self.get_undirected_links()
+        sources = numpy.repeat(numpy.arange(len(self.world)), numpy.diff(offsets))
+        # every undirected link once
+        forward = sources < neighbors
+        sources, targets = sources[forward], neighbors[forward]
+        parents = numpy.arange(len(self.world))
+        while True:
+            source_roots, target_roots = parents[sources], parents[targets]
+            split = source_roots != target_roots
+            if not split.any():
+                return parents
+            sources, targets = sources[split], targets[split]
+            source_roots, target_roots = source_roots[split], target_roots[split]
+            parents[numpy.maximum(source_roots, target_roots)] = numpy.minimum(source_roots, target_roots)
+            while True:
+                grandparents = parents[parents]
+                if (grandparents == parents).all():
+                    break
+                parents = grandparents
+
+    def get_component_sizes(self):
+        """
+        Return the sizes of the components of the nodes with a user, largest first.
+        """
+        labels = self.get_components()[self.occupied]
+        return numpy.sort(numpy.bincount(labels)[numpy.unique(labels)])[::-1]
+
+    def get_link_length_histogram(self):
+        """
+        Return the histogram of the torus l1 length of the long-range links: entry d is the number of links of length
+        d, links within neighborhood_radius are left out.
+        """
+        sources, targets = self.world.get_links()
+        lengths = self.world.get_distances(sources, targets)
+        return numpy.bincount(lengths[lengths > self.neighborhood_radius])
+
+    def summary(self):
+        """
+        Return all statistics as a json-serializable dict, with the component sizes as [size, count] pairs.
+        """
+        out_degrees, in_degrees = self.get_degree_histograms()
+        coefficients = self.get_clustering_coefficients()[self.occupied]
+        coefficients = coefficients[~numpy.isnan(coefficients)]
+        component_sizes = self.get_component_sizes()
+        link_lengths = self.get_link_length_histogram()
+        num_long_links = int(link_lengths.sum())
+        return {"occupancy_fraction": self.get_occupancy_fraction(),
+                "out_degree_histogram": out_degrees.tolist(), "in_degree_histogram": in_degrees.tolist(),
+                "mean_clustering": float(coefficients.mean()) if len(coefficients) else None,
+                "num_components": len(component_sizes),
+                "largest_component": int(component_sizes[0]) if len(component_sizes) else 0,
+                "component_size_counts": [[int(size), int(count)] for size, count in
+                                          zip(*numpy.unique(component_sizes, return_counts=True))],
+                "link_length_histogram": link_lengths.tolist(),
+                "mean_link_length": 1.0 * (link_lengths * numpy.arange(len(link_lengths))).sum() / num_long_links
+                if num_long_links else None}
@@ -0,0 +1,46 @@
+import numpy
+
+GOLDEN_GAMMA = numpy.uint64(0x9e3779b97f4a7c15)
+MIX_MULTIPLIER1 = numpy.uint64(0xbf58476d1ce4e5b9)
+MIX_MULTIPLIER2 = numpy.uint64(0x94d049bb133111eb)
+
+
+def mix(values):
+    """
+    Return the splitmix64 finalizer of a uint64 array, a bijection that scrambles every input bit into every output bit.
+    """
+    values = (values ^ (values >> numpy.uint64(30))) * MIX_MULTIPLIER1
+    values = (values ^ (values >> numpy.uint64(27))) * MIX_MULTIPLIER2
+    return values ^ (values >> numpy.uint64(31))
+
+
+class NodeStreams():
+    """
+    Counter-based random numbers: the draw-th number of stream for a node is a pure function of (seed, stream, node id,
+    draw), so any node's numbers can be computed on their own, in any order, without a shared generator state.
+    The eager and lazy networks read the same numbers for a node and so generate the same links.
+    """
+    # stream of the occupancy draw, the long-range link streams come after it
+    occupancy = 0
+    links = 1
+
+    def __init__(self, seed):
+        """
+        @param seed: int
+        """
+        self.seed = seed
+        self.key = mix(numpy.array([seed % 2 ** 64], dtype=numpy.uint64))[0]
+
+    def uniforms(self, node_ids, stream, draw):
+        """
+        Return the draw-th uniform number in [0, 1) of stream for every node id.
+        @param node_ids: numpy.ndarray|int
+        @param stream: int
+        @param draw: int
+        """
+        node_ids = numpy.asarray(node_ids)
+        counter = numpy.uint64(stream * 2 ** 32 + draw)
+        with numpy.errstate(over="ignore"):
+            values = mix(numpy.atleast_1d(node_ids).astype(numpy.uint64) ^ self.key)
+            values = mix(values + counter * GOLDEN_GAMMA)
+        return ((values >> numpy.uint64(11)) * 2.0 ** -53).reshape(node_ids.shape)
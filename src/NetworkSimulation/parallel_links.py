@@ -0,0 +1,57 @@
+from multiprocessing import Pool, cpu_count, sharedctypes
+import numpy
+
+# set in every worker by init_worker: the network, the source node ids and the shared targets
+worker_state = {}
+
+
+def init_worker(network, sources, targets):
+    worker_state.update(network=network, sources=sources, targets=targets)
+
+
+def draw_chunk(chunk):
+    """
+    Draw the connection-th Kleinberg connections of sources[start:stop] and write them into the shared targets.
+    Module level so that multiprocessing can pickle it.
+    @param chunk: tuple (connection, start, stop)
+    """
+    connection, start, stop = chunk
+    network = worker_state["network"]
+    sources = worker_state["sources"]
+    targets = numpy.frombuffer(worker_state["targets"], dtype=numpy.int64).reshape(-1, len(sources))
+    targets[connection, start:stop] = network.get_kleinberg_targets(sources[start:stop], network.cluster_exponent,
+                                                                    connection=connection)
+    return stop - start
+
+
+def get_parallel_kleinberg_targets(network, sources, connections=1, processes=None, phase=None):
+    """
+    Return the network.get_kleinberg_targets(sources, connection=i) of every connection i, computed on a process pool,
+    as an array of shape (connections, len(sources)).
+    The sources are split into chunks, and every worker writes the targets of its chunks straight into one shared
+    array, so no result is pickled back. The ShellIndex is built and a single pool is forked after the basic network
+    is built, so the workers read both without copying or rebuilding them. The draws of a node come from its own
+    NodeStreams numbers, so the result is the serial result.
+    @param network: Network with a compact basic network
+    @param sources: numpy.ndarray of node ids
+    @param connections: int number of connections of every source
+    @param processes: int size of the pool, the number of cpus if None
+    @param phase: Phase updated as the chunks finish
+    """
+    sources = numpy.asarray(sources, dtype=numpy.int64)
+    network.get_shell_index(network.cluster_exponent)
+    shared_targets = sharedctypes.RawArray("b", connections * len(sources) * 8)
+    processes = processes if processes is not None else cpu_count()
+    num_chunks = 4 * processes
+    bounds = numpy.linspace(0, len(sources), num_chunks + 1).astype(numpy.int64).tolist()
+    chunks = [(connection, start, stop) for connection in range(connections)
+              for start, stop in zip(bounds[:-1], bounds[1:])]
+    pool = Pool(processes, init_worker, (network, sources, shared_targets))
+    try:
+        for count in pool.imap_unordered(draw_chunk, chunks):
+            if phase is not None:
+                phase.update(count)
+    finally:
+        pool.close()
+        pool.join()
+    return numpy.frombuffer(shared_targets, dtype=numpy.int64).copy().reshape(connections, len(sources))
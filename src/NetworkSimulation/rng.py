@@ -0,0 +1,89 @@
+from node_streams import GOLDEN_GAMMA, NodeStreams, mix
+import numpy
+import zlib
+
+
+class RandomSource():
+    """
+    Seeded random numbers for one part of a run, backed by a numpy RandomState (numpy 1.16 has no Generator).
+    A source splits into independent children by key, spawn("worker", 3) say: the state of a child is derived from
+    (seed, keys) alone, so workers, trials and phases each get their own reproducible numbers instead of sharing or
+    reseeding the global random modules. The numbers of a single node come from get_node_streams.
+    The draws follow the interfaces of random (random, sample) and numpy.random (random_sample, randint), so a source
+    can be passed wherever the samplers and the ShellIndex would read those modules.
+    """
+
+    def __init__(self, seed=None, keys=()):
+        """
+        @param seed: int, drawn from numpy.random if None
+        @param keys: tuple of ints and strs that derive this source from the seed, () for the root source
+        """
+        self.seed = seed if seed is not None else int(numpy.random.randint(2 ** 62))
+        self.keys = tuple(keys)
+        self.key = RandomSource.derive_key(self.seed, self.keys)
+        self.state = numpy.random.RandomState([self.key & 0xffffffff, self.key >> 32])
+
+    @staticmethod
+    def derive_key(seed, keys):
+        """
+        Return the uint64 key of the source derived from seed by keys, as an int.
+        """
+        value = mix(numpy.array([seed % 2 ** 64], dtype=numpy.uint64))
+        with numpy.errstate(over="ignore"):
+            for key in keys:
+                # crc32 rather than hash, so a str key gives the same source in every process
+                code = key % 2 ** 64 if isinstance(key, (int, long)) else zlib.crc32(str(key)) & 0xffffffff
+                value = mix(value ^ (numpy.uint64(code) + GOLDEN_GAMMA))
+        return int(value[0])
+
+    def spawn(self, *keys):
+        """
+        Return the child source for keys. The same keys always give the same child.
+        """
+        return RandomSource(self.seed, self.keys + keys)
+
+    def get_node_streams(self):
+        """
+        Return the NodeStreams of this source. The root source of a seed has NodeStreams(seed), the one networks
+        have always been generated with.
+        """
+        return NodeStreams(self.seed if not self.keys else self.key)
+
+    def random(self):
+        """
+        Return a float in [0, 1), as random.random.
+        """
+        return float(self.state.random_sample())
+
+    def random_sample(self, size=None):
+        """
+        Return floats in [0, 1), as numpy.random.random_sample.
+        """
+        return self.state.random_sample(size)
+
+    def randint(self, low, high=None, size=None):
+        """
+        Return ints in [low, high), or in [0, low) without high, as numpy.random.randint.
+        """
+        return self.state.randint(low, high, size)
+
+    def sample(self, population, k):
+        """
+        Return k distinct items of population, as random.sample. Takes O(k) draws on a sequence, so picking a few
+        items from a large tuple does not go through all of it.
+        @param population: sequence|set
+        """
+        if not isinstance(population, (list, tuple)):
+            population = sorted(population)
+        if not 0 <= k <= len(population):
+            raise ValueError("sample larger than population")
+        if 2 * k > len(population):
+            return [population[i] for i in self.state.permutation(len(population))[:k]]
+        picked = []
+        seen = set()
+        while len(picked) < k:
+            i = int(self.state.randint(len(population)))
+            if i not in seen:
+                seen.add(i)
+                picked.append(population[i])
+        return picked
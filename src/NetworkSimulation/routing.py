@@ -0,0 +1,278 @@
+from instrumentation import Instrumentation, NullSink
+import numpy
+
+
+def get_segments(counts):
+    """
+    Return the start of every segment of a flat array made of segments of the given lengths.
+    """
+    segments = numpy.zeros(len(counts), dtype=numpy.int64)
+    numpy.cumsum(counts[:-1], out=segments[1:])
+    return segments
+
+
+def gather_two_hops(world, node_ids):
+    """
+    Return (counts, via, reach): for every node in node_ids, all pairs (via, reach) where via is one of its out-links
+    and reach is via itself or one of the out-links of via, concatenated in the order of node_ids, and their number.
+    The pairs with the same via are contiguous and the first of them has reach == via.
+    @param world: CompactWorld|LazyWorld|DynamicWorld
+    @param node_ids: numpy.ndarray
+    """
+    node_ids = numpy.asarray(node_ids, dtype=numpy.int64)
+    counts, neighbors = world.gather_out_links(node_ids)
+    neighbor_counts, second_neighbors = world.gather_out_links(neighbors)
+    sizes = neighbor_counts + 1
+    reach = numpy.zeros(sizes.sum(), dtype=numpy.int64)
+    starts = get_segments(sizes)
+    is_start = numpy.zeros(len(reach), dtype=bool)
+    is_start[starts] = True
+    reach[is_start] = neighbors
+    reach[~is_start] = second_neighbors
+    owners = numpy.repeat(numpy.arange(len(node_ids)), counts)
+    return (numpy.bincount(owners, weights=sizes, minlength=len(node_ids)).astype(numpy.int64),
+            numpy.repeat(neighbors, sizes), reach)
+
+
+class TwoHopIndex():
+    """
+    The (via, reach) pairs of gather_two_hops for every node of a world, in CSR arrays built once, so a lookahead
+    step reads them like CompactWorld.gather_out_links instead of gathering the out-links twice.
+    """
+
+    def __init__(self, world, block_nodes=2 ** 16):
+        """
+        @param world: CompactWorld
+        @param block_nodes: int number of nodes gathered at once while building
+        """
+        self.offsets = numpy.zeros(len(world) + 1, dtype=numpy.int64)
+        via = []
+        reach = []
+        for start in range(0, len(world), block_nodes):
+            stop = min(start + block_nodes, len(world))
+            counts, block_via, block_reach = gather_two_hops(world, numpy.arange(start, stop))
+            numpy.cumsum(counts, out=self.offsets[start + 1:stop + 1])
+            self.offsets[start + 1:stop + 1] += self.offsets[start]
+            via.append(block_via)
+            reach.append(block_reach)
+        self.via = numpy.concatenate(via + [numpy.zeros(0, dtype=numpy.int64)])
+        self.reach = numpy.concatenate(reach + [numpy.zeros(0, dtype=numpy.int64)])
+
+    def gather(self, node_ids):
+        """
+        Return (counts, via, reach) as gather_two_hops.
+        """
+        starts = self.offsets[node_ids]
+        counts = self.offsets[node_ids + 1] - starts
+        flat = numpy.arange(counts.sum()) - numpy.repeat(get_segments(counts) - starts, counts)
+        return counts, self.via[flat], self.reach[flat]
+
+
+class GreedyStrategy():
+    """
+    Moves every message to its closest neighbor, the lowest node id among ties.
+    A routing strategy has a step(current, targets) method that returns (next_nodes, next_distances) for one hop of
+    every message, next_nodes -1 for a message at a node without out-links, and a choose(current, targets) method
+    that also returns the distance to the target the strategy minimized, which a RandomWalkFallback compares with the
+    current distance.
+    """
+
+    def __init__(self, world):
+        self.world = world
+
+    def step(self, current, targets):
+        return self.choose(current, targets)[:2]
+
+    def choose(self, current, targets):
+        counts, neighbors = self.world.gather_out_links(current)
+        next_nodes = numpy.full(len(current), -1, dtype=numpy.int64)
+        next_distances = numpy.full(len(current), -1, dtype=numpy.int64)
+        has_links = counts > 0
+        if not has_links.any():
+            return next_nodes, next_distances, next_distances
+        counts = counts[has_links]
+        segments = get_segments(counts)
+        distances = self.world.get_distances(neighbors, numpy.repeat(targets[has_links], counts))
+        closest = numpy.minimum.reduceat(distances, segments)
+        candidates = numpy.where(distances == numpy.repeat(closest, counts), neighbors, len(self.world))
+        next_nodes[has_links] = numpy.minimum.reduceat(candidates, segments)
+        next_distances[has_links] = closest
+        return next_nodes, next_distances, next_distances
+
+
+class LookaheadStrategy():
+    """
+    1-hop lookahead (neighbor of neighbor) routing: moves every message to the neighbor that has itself, or one of
+    its own out-links, closest to the target. Ties go to the neighbor closest to the target, then the lowest id.
+    The pairs come from a TwoHopIndex on a CompactWorld and are gathered at every step on other worlds.
+    """
+
+    def __init__(self, world, index=None):
+        """
+        @param world: CompactWorld|LazyWorld|DynamicWorld
+        @param index: TwoHopIndex, built here for a CompactWorld if None
+        """
+        self.world = world
+        if index is None and hasattr(world, "out_offsets"):
+            index = TwoHopIndex(world)
+        self.index = index
+
+    def step(self, current, targets):
+        return self.choose(current, targets)[:2]
+
+    def choose(self, current, targets):
+        if self.index is not None:
+            counts, via, reach = self.index.gather(current)
+        else:
+            counts, via, reach = gather_two_hops(self.world, current)
+        next_nodes = numpy.full(len(current), -1, dtype=numpy.int64)
+        next_distances = numpy.full(len(current), -1, dtype=numpy.int64)
+        has_links = counts > 0
+        next_reach_distances = numpy.full(len(current), -1, dtype=numpy.int64)
+        if not has_links.any():
+            return next_nodes, next_distances, next_reach_distances
+        counts = counts[has_links]
+        pair_targets = numpy.repeat(targets[has_links], counts)
+        reach_distances = self.world.get_distances(reach, pair_targets)
+        # every run of pairs with the same via starts with reach == via, whose distance is the via distance
+        run_starts = numpy.maximum.accumulate(numpy.where(reach == via, numpy.arange(len(via)), 0))
+        via_distances = reach_distances[run_starts]
+        # one int64 key orders the pairs by reach distance, then via distance, then via id
+        num_nodes = len(self.world)
+        base = via_distances.max() + 1
+        keys = (reach_distances * base + via_distances) * num_nodes + via
+        best = numpy.minimum.reduceat(keys, get_segments(counts))
+        next_nodes[has_links] = best % num_nodes
+        next_distances[has_links] = best // num_nodes % base
+        next_reach_distances[has_links] = best // num_nodes // base
+        return next_nodes, next_distances, next_reach_distances
+
+
+class RandomWalkFallback():
+    """
+    Wraps another strategy: a message for which the strategy sees nothing closer to the target than its current node
+    is at a dead end, and moves to one of the out-links of its node drawn uniformly from rng instead.
+    """
+
+    def __init__(self, strategy, rng=numpy.random):
+        """
+        @param strategy: GreedyStrategy|LookaheadStrategy
+        @param rng: numpy.random|RandomSource
+        """
+        self.strategy = strategy
+        self.world = strategy.world
+        self.rng = rng
+
+    def step(self, current, targets):
+        next_nodes, next_distances, scores = self.strategy.choose(current, targets)
+        stuck = (next_nodes >= 0) & (scores >= self.world.get_distances(current, targets))
+        if stuck.any():
+            counts, neighbors = self.world.gather_out_links(current[stuck])
+            picks = get_segments(counts) + (self.rng.random_sample(len(counts)) * counts).astype(numpy.int64)
+            next_nodes[stuck] = neighbors[picks]
+            next_distances[stuck] = self.world.get_distances(neighbors[picks], targets[stuck])
+        return next_nodes, next_distances
+
+
+strategies = {"greedy": GreedyStrategy, "lookahead": LookaheadStrategy}
+
+
+def get_strategy(name, world, random_walk=False, rng=numpy.random):
+    """
+    Return the routing strategy called name over world, wrapped in a RandomWalkFallback drawing from rng if
+    random_walk.
+    @param name: str "greedy" or "lookahead"
+    """
+    if name not in strategies:
+        raise ValueError("unknown routing strategy {0}, expected one of {1}".format(name, sorted(strategies)))
+    strategy = strategies[name](world)
+    return RandomWalkFallback(strategy, rng) if random_walk else strategy
+
+
+class BatchRouter():
+    """
+    Routing of many messages at once over a CompactWorld or a LazyWorld.
+    Every step advances all in-flight messages by one hop: the strategy gathers the out-links of the current nodes
+    from the world, computes their distances to the targets in one vectorized call and picks the next node of each
+    message. The default strategy is greedy: each message moves to its closest neighbor (the lowest node id among
+    ties).
+    """
+
+    def __init__(self, world, max_attempts=500, instrumentation=None, strategy=None, rng=numpy.random):
+        """
+        @param world: CompactWorld|LazyWorld
+        @param max_attempts: int a message that has not arrived after this many hops has failed
+        @param instrumentation: Instrumentation that times the routing phase, silent if None
+        @param strategy: GreedyStrategy|LookaheadStrategy|RandomWalkFallback, a GreedyStrategy if None
+        @param rng: numpy.random|RandomSource the pairs of sample_pairs are drawn from
+        """
+        self.world = world
+        self.max_attempts = max_attempts
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation(NullSink())
+        self.strategy = strategy if strategy is not None else GreedyStrategy(world)
+        self.rng = rng
+
+    def sample_pairs(self, num_messages):
+        """
+        Return (sources, targets), two arrays of distinct occupied node ids.
+        """
+        sources = self.world.sample_occupied_ids(num_messages, self.rng)
+        targets = self.world.sample_occupied_ids(num_messages, self.rng)
+        same = sources == targets
+        while same.any():
+            targets[same] = self.world.sample_occupied_ids(same.sum(), self.rng)
+            same = sources == targets
+        return sources, targets
+
+    def step(self, current, targets):
+        """
+        Return (next_nodes, next_distances) for one hop of every message, from the strategy.
+        Messages at a node without out-links get next_nodes -1.
+        @param current: numpy.ndarray of node ids
+        @param targets: numpy.ndarray of node ids
+        """
+        return self.strategy.step(current, targets)
+
+    def route(self, sources, targets, recorder=None):
+        """
+        Return an array with the path length of every message, -1 for the messages that failed.
+        @param sources: numpy.ndarray of node ids
+        @param targets: numpy.ndarray of node ids
+        @param recorder: TraceRecorder that gets every hop and path length, message i being sources[i], or None
+        """
+        path_lengths = numpy.full(len(sources), -1, dtype=numpy.int64)
+        in_flight = numpy.arange(len(sources))
+        current = numpy.asarray(sources, dtype=numpy.int64)
+        targets = numpy.asarray(targets, dtype=numpy.int64)
+        if recorder is not None:
+            recorder.record_hops(in_flight, 0, current, self.world.get_distances(current, targets))
+        with self.instrumentation.phase("routing", len(sources)) as phase:
+            for i in range(1, self.max_attempts + 1):
+                if not len(in_flight):
+                    break
+                current, distances = self.step(current, targets[in_flight])
+                phase.add("hops", len(in_flight))
+                if recorder is not None:
+                    moved = current >= 0
+                    recorder.record_hops(in_flight[moved], i, current[moved], distances[moved])
+                arrived = distances == 0
+                path_lengths[in_flight[arrived]] = i
+                moving = distances > 0
+                phase.update(int(len(in_flight) - moving.sum()))
+                in_flight = in_flight[moving]
+                current = current[moving]
+            phase.update(len(in_flight))
+            phase.add("failed", int((path_lengths < 0).sum()))
+        if recorder is not None:
+            recorder.record_ends(numpy.arange(len(sources)), path_lengths)
+        return path_lengths
+
+    @staticmethod
+    def summarize(path_lengths):
+        """
+        Return (mean, median, success rate) of the path lengths returned by route.
+        """
+        lengths = path_lengths[path_lengths >= 0]
+        if not len(lengths):
+            return None, None, 0.0
+        return 1.0 * lengths.sum() / len(lengths), float(numpy.median(lengths)), 1.0 * len(lengths) / len(path_lengths)
@@ -0,0 +1,195 @@
+import bisect
+import numpy
+import random
+
+
+class FenwickSampler():
+    """
+    Weighted random selection over items whose weights change, backed by a Fenwick (binary indexed) tree.
+    Both drawing an item with probability weight / total and changing the weight of an item take O(log n).
+    """
+
+    def __init__(self, weights):
+        """
+        Build the tree in O(n).
+        @param weights: list of non-negative numbers
+        """
+        self.weights = list(weights)
+        self.size = len(self.weights)
+        self.tree = [0] + self.weights
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+        self.top_step = 1
+        while self.top_step * 2 <= self.size:
+            self.top_step *= 2
+
+    def total(self):
+        """
+        Return the sum of all weights.
+        """
+        total = 0
+        i = self.size
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def update(self, index, weight):
+        """
+        Set the weight of the item at index.
+        """
+        delta = weight - self.weights[index]
+        self.weights[index] = weight
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def sample(self, rng=random):
+        """
+        Return the index of an item drawn with probability weight / total.
+        Raises ValueError if all weights are 0.
+        @param rng: random|RandomSource
+        """
+        total = self.total()
+        if total <= 0:
+            raise ValueError("cannot sample when all weights are 0")
+        while True:
+            remaining = rng.random() * total
+            position = 0
+            step = self.top_step
+            while step:
+                if position + step <= self.size and self.tree[position + step] <= remaining:
+                    position += step
+                    remaining -= self.tree[position]
+                step //= 2
+            # floating point round-off can walk past the last item or onto an item of weight 0
+            if position < self.size and self.weights[position] > 0:
+                return position
+
+    def sample_excluding(self, is_excluded, rng=random, max_rejections=64):
+        """
+        Return the index of an item drawn with probability weight / total among the items that are not excluded.
+        Draws are rejected while they land on excluded items; after max_rejections the allowed items are scanned and
+        drawn from directly in O(n), so the draw ends even when almost all of the weight is excluded.
+        Raises ValueError if no allowed item has a positive weight.
+        @param is_excluded: function of an index
+        @param rng: random|RandomSource
+        """
+        for i in range(max_rejections):
+            index = self.sample(rng)
+            if not is_excluded(index):
+                return index
+        allowed = [index for index in range(self.size) if self.weights[index] > 0 and not is_excluded(index)]
+        if not allowed:
+            raise ValueError("cannot sample when all weight is excluded")
+        cumulative = numpy.cumsum([self.weights[index] for index in allowed])
+        position = bisect.bisect_right(cumulative.tolist(), rng.random() * cumulative[-1])
+        return allowed[min(position, len(allowed) - 1)]
+
+
+class AliasSampler():
+    """
+    Weighted random selection over items with fixed weights using Walker's alias method.
+    Built in O(n) once, after which every draw takes O(1): pick a column uniformly, then keep it or take its alias.
+    """
+
+    def __init__(self, weights):
+        """
+        @param weights: list|numpy.ndarray of non-negative numbers, not all 0
+        """
+        weights = numpy.asarray(weights, dtype=float)
+        self.size = len(weights)
+        scaled = weights * self.size / weights.sum()
+        self.probabilities = numpy.ones(self.size)
+        self.aliases = numpy.arange(self.size)
+        small = [i for i in range(self.size) if scaled[i] < 1.0]
+        large = [i for i in range(self.size) if scaled[i] >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        # whatever is left is 1 up to round-off and keeps probability 1
+        self.probability_list = self.probabilities.tolist()
+        self.alias_list = self.aliases.tolist()
+
+    def sample(self, rng=random):
+        """
+        Return the index of an item drawn with probability weight / total.
+        @param rng: random|RandomSource
+        """
+        column = int(rng.random() * self.size)
+        return column if rng.random() < self.probability_list[column] else self.alias_list[column]
+
+    def sample_many(self, num_samples, rng=numpy.random):
+        """
+        Return a numpy array of num_samples independent draws.
+        @param rng: numpy.random|RandomSource
+        """
+        columns = rng.randint(self.size, size=num_samples)
+        keep = rng.random_sample(num_samples) < self.probabilities[columns]
+        return numpy.where(keep, columns, self.aliases[columns])
+
+    def lookup(self, uniforms):
+        """
+        Return the draws given by an array of uniform numbers in [0, 1), one number per draw: its integer part
+        scaled by size picks the column and its fraction decides between the column and its alias.
+        """
+        scaled = numpy.asarray(uniforms) * self.size
+        columns = numpy.minimum(scaled.astype(numpy.int64), self.size - 1)
+        return numpy.where(scaled - columns < self.probabilities[columns], columns, self.aliases[columns])
+
+
+class CumulativeSampler():
+    """
+    Weighted random selection by binary search over the cumulative sums of the weights.
+    A draw takes O(log n). Changing a weight rebuilds the sums after it, so it suits weights that change now and then.
+    """
+
+    def __init__(self, weights):
+        """
+        @param weights: list|numpy.ndarray of non-negative numbers, not all 0
+        """
+        self.weights = numpy.array(weights, dtype=float)
+        self.cumulative_weights = numpy.cumsum(self.weights)
+        self.cumulative_list = self.cumulative_weights.tolist()
+
+    def update(self, index, weight):
+        """
+        Set the weight of the item at index.
+        """
+        self.weights[index] = weight
+        self.cumulative_weights[index:] = numpy.cumsum(self.weights[index:]) + (
+            self.cumulative_weights[index - 1] if index else 0.0)
+        self.cumulative_list = self.cumulative_weights.tolist()
+
+    def sample(self, rng=random):
+        """
+        Return the index of an item drawn with probability weight / total.
+        @param rng: random|RandomSource
+        """
+        index = bisect.bisect_right(self.cumulative_list, rng.random() * self.cumulative_list[-1])
+        return min(index, len(self.cumulative_list) - 1)
+
+    def sample_many(self, num_samples, rng=numpy.random):
+        """
+        Return a numpy array of num_samples independent draws.
+        @param rng: numpy.random|RandomSource
+        """
+        return self.lookup(rng.random_sample(num_samples))
+
+    def lookup(self, uniforms):
+        """
+        Return the draws given by an array of uniform numbers in [0, 1).
+        """
+        thresholds = numpy.asarray(uniforms) * self.cumulative_weights[-1]
+        indexes = numpy.searchsorted(self.cumulative_weights, thresholds, side="right")
+        return numpy.minimum(indexes, len(self.cumulative_weights) - 1)
@@ -0,0 +1,126 @@
+from compact_network import CompactWorld
+from instrumentation import Instrumentation, NullSink
+import numpy
+
+
+class ShortestPaths():
+    """
+    Exact hop counts over a CompactWorld by breadth-first search, the optimum that greedy routing is measured against.
+    Up to 64 searches run together, one bit of a uint64 per source: frontier[v] holds the sources that reached node v
+    in the last level and visited[v] those that reached it in any level. A level ORs, for every node, the frontier
+    bits of its in-links, which is one gather and one reduceat over the in-link CSR arrays for all 64 searches.
+    """
+    batch_size = 64
+
+    def __init__(self, world, instrumentation=None):
+        """
+        @param world: CompactWorld
+        @param instrumentation: Instrumentation that times the searches, silent if None
+        """
+        if not isinstance(world, CompactWorld):
+            # the searches follow the in-link arrays, which a LazyWorld or a DynamicWorld does not have
+            raise TypeError("ShortestPaths needs a CompactWorld, not a " + type(world).__name__)
+        self.world = world
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation(NullSink())
+        in_counts = numpy.diff(world.in_offsets)
+        self.has_in_links = in_counts > 0
+        # the in-neighbors followed by a sentinel node id len(world) whose frontier bits are always 0: reduceat needs
+        # every start inside the array, and the segment of the last node then ends on the sentinel instead of being
+        # cut short. The nodes without in-links are cleared afterwards.
+        self.gather_ids = numpy.append(world.in_neighbors, len(world)).astype(numpy.int64)
+        self.in_starts = world.in_offsets[:-1]
+
+    def iterate_levels(self, sources):
+        """
+        Yield (level, frontier) for every level of the search from up to 64 sources, starting with level 0.
+        Bit i of frontier[v] is set if node v is at distance level from sources[i].
+        @param sources: numpy.ndarray of node ids
+        """
+        bits = numpy.left_shift(numpy.uint64(1), numpy.arange(len(sources), dtype=numpy.uint64))
+        frontier = numpy.zeros(len(self.world), dtype=numpy.uint64)
+        numpy.bitwise_or.at(frontier, numpy.asarray(sources, dtype=numpy.int64), bits)
+        visited = frontier.copy()
+        level = 0
+        yield level, frontier
+        padded = numpy.zeros(len(self.world) + 1, dtype=numpy.uint64)
+        while len(self.world.in_neighbors) and frontier.any():
+            padded[:-1] = frontier
+            reached = numpy.bitwise_or.reduceat(padded[self.gather_ids], self.in_starts)
+            reached[~self.has_in_links] = 0
+            frontier = reached & ~visited
+            visited |= frontier
+            level += 1
+            yield level, frontier
+
+    def get_lengths(self, sources, targets):
+        """
+        Return the length of the shortest path from sources[i] to targets[i], -1 if targets[i] cannot be reached.
+        The pairs are searched 64 at a time and a batch stops as soon as all of its targets are reached.
+        @param sources: numpy.ndarray of node ids
+        @param targets: numpy.ndarray of node ids
+        """
+        sources = numpy.asarray(sources, dtype=numpy.int64)
+        targets = numpy.asarray(targets, dtype=numpy.int64)
+        lengths = numpy.full(len(sources), -1, dtype=numpy.int64)
+        with self.instrumentation.phase("shortest paths", len(sources)) as phase:
+            for start in range(0, len(sources), self.batch_size):
+                batch = numpy.arange(start, min(start + self.batch_size, len(sources)))
+                bits = numpy.left_shift(numpy.uint64(1), numpy.arange(len(batch), dtype=numpy.uint64))
+                for level, frontier in self.iterate_levels(sources[batch]):
+                    phase.add("levels")
+                    arrived = (frontier[targets[batch]] & bits) != 0
+                    lengths[batch[arrived]] = level
+                    if (lengths[batch] >= 0).all():
+                        break
+                phase.update(len(batch))
+        return lengths
+
+    def get_eccentricities(self, sources):
+        """
+        Return (eccentricities, farthest): the largest distance from every source to a node it reaches, and one node
+        at that distance.
+        @param sources: numpy.ndarray of up to 64 node ids
+        """
+        bits = numpy.left_shift(numpy.uint64(1), numpy.arange(len(sources), dtype=numpy.uint64))
+        eccentricities = numpy.zeros(len(sources), dtype=numpy.int64)
+        # bit i of farthest_bits[v] is set if v is among the farthest nodes reached so far from sources[i]
+        farthest_bits = numpy.zeros(len(self.world), dtype=numpy.uint64)
+        for level, frontier in self.iterate_levels(sources):
+            reached = numpy.bitwise_or.reduce(frontier)
+            if not reached:
+                continue
+            eccentricities[(reached & bits) != 0] = level
+            farthest_bits = (farthest_bits & ~reached) | frontier
+        farthest = numpy.array([numpy.flatnonzero(farthest_bits & bit)[0] for bit in bits], dtype=numpy.int64)
+        return eccentricities, farthest
+
+    def estimate_diameter(self, num_sources=64, rng=numpy.random):
+        """
+        Return a lower bound of the diameter: the largest eccentricity of num_sources random nodes with a user
+        and of the farthest nodes they reach (a double sweep), which usually finds the diameter.
+        @param rng: numpy.random|RandomSource the sources are drawn from
+        """
+        with self.instrumentation.phase("diameter", 2 * num_sources) as phase:
+            diameter = 0
+            sources = self.world.sample_occupied_ids(num_sources, rng)
+            for sweep in range(2):
+                farthest = []
+                for start in range(0, len(sources), self.batch_size):
+                    eccentricities, batch_farthest = self.get_eccentricities(sources[start:start + self.batch_size])
+                    diameter = max(diameter, int(eccentricities.max()))
+                    farthest.append(batch_farthest)
+                    phase.update(len(batch_farthest))
+                sources = numpy.concatenate(farthest)
+        return diameter
+
+    @staticmethod
+    def get_stretch(path_lengths, optimal_lengths):
+        """
+        Return path_lengths / optimal_lengths for every message, nan where either of them is -1.
+        @param path_lengths: numpy.ndarray returned by BatchRouter.route
+        @param optimal_lengths: numpy.ndarray returned by get_lengths
+        """
+        stretch = numpy.full(len(path_lengths), numpy.nan)
+        found = (path_lengths >= 0) & (optimal_lengths > 0)
+        stretch[found] = 1.0 * path_lengths[found] / optimal_lengths[found]
+        return stretch
@@ -1,53 +1,138 @@
-from network_model import Network, Node, Utils
-import random
+from network_model import Network, Node
+from routing import BatchRouter, get_strategy, strategies
+from shortest_paths import ShortestPaths
+from traces import TraceRecorder
+import numpy
 
 
 class Simulation():
     testDim = (100, 100)
     num_messages = 500
     max_attempts = 500
+    storage = "dict"
+    trace_file = None
+    strategy = "greedy"
+    random_walk = False
+    # seed of the networks and of the routing draws, which come from network.rng.spawn("routing")
+    seed = None
+
+    @staticmethod
+    def formatSummary(summary):
+        """
+        Return the (mean, median, success rate) returned by a summarize as the line the simulations print.
+        """
+        return "Mean {0}, Median {1}, Success rate: {2}".format(*summary)
 
     def runSimulation(self, sim_type=0):
+        """
+        Route num_messages messages greedily one hop at a time over a Node network.
+        Every hop goes to a TraceRecorder, spilled to files starting with trace_file if it is set. Prints the mean
+        and median path length and the success rate, and returns the TraceRecorder.
+        """
         types = ["kleinberg", "yule"]
-        testNetwork = Network(self.testDim, network_type=types[sim_type])
+        testNetwork = Network(self.testDim, network_type=types[sim_type], storage=self.storage, seed=self.seed)
+        rng = testNetwork.rng.spawn("routing")
         testWorld = testNetwork.world
-        nodeIdTuple = tuple([key for key in testNetwork.world.keys() if testNetwork.world[key].has_user])
-        lengths = []
-        all_traces = []
-        num_failed = 0
+        # sorted here and below, as the order of a dict or a set depends on how it was filled
+        nodeIdTuple = tuple(sorted([key for key in testNetwork.world.keys() if testNetwork.world[key].has_user]))
+        recorder = TraceRecorder(spill_prefix=self.trace_file)
         if len(nodeIdTuple) > 2:
-            for j in range(self.num_messages):
-                testNodes = random.sample(nodeIdTuple, 2)
-                testNode = testNodes[0]
-                testNode1 = testNodes[1]
-                distance = -1
-                i = 0
-                trace = [[i, testWorld[testNode].position,
-                          testNetwork.getDistance(testWorld[testNode].position, testWorld[testNode1].position),
-                          testNode]]
-                while distance != 0:
-                    i += 1
-                    testNeighborsHash = list(testWorld[testNode].out_links)
-                    distances = []
-                    for neighbor in testNeighborsHash:
-                        distance = testNetwork.getDistance(testWorld[testNode1].position, testWorld[neighbor].position)
-                        distances.append(distance)
-                    minNeighborIndex = distances.index(min(distances))
-                    minNeighborHash = testNeighborsHash[minNeighborIndex]
-                    trace.append([i, testWorld[minNeighborHash].position, min(distances), minNeighborHash])
-                    if min(distances) == 0:
-                        lengths.append(i)
-                        # print(str(i) + ' Done!')
-                        break
-                    elif i == self.max_attempts:
-                        num_failed += 1
-                        break
-                    else:
-                        testNode = minNeighborHash
-                        distance = min(distances)
-                all_traces.append(trace)
-            print(1.0 * sum(lengths) / len(lengths), Utils.median(lengths), 1 - 1.0 * num_failed / self.num_messages)
-            return all_traces
+            with testNetwork.instrumentation.phase("routing", self.num_messages) as phase:
+                for j in range(self.num_messages):
+                    testNodes = rng.sample(nodeIdTuple, 2)
+                    testNode = testNodes[0]
+                    testNode1 = testNodes[1]
+                    distance = -1
+                    i = 0
+                    recorder.record_hop(j, i, testNode, testNetwork.getDistance(testWorld[testNode].position,
+                                                                                testWorld[testNode1].position))
+                    while distance != 0:
+                        i += 1
+                        testNeighborsHash = sorted(testWorld[testNode].out_links)
+                        distances = []
+                        for neighbor in testNeighborsHash:
+                            distance = testNetwork.getDistance(testWorld[testNode1].position,
+                                                               testWorld[neighbor].position)
+                            distances.append(distance)
+                        minNeighborIndex = distances.index(min(distances))
+                        minNeighborHash = testNeighborsHash[minNeighborIndex]
+                        recorder.record_hop(j, i, minNeighborHash, min(distances))
+                        if min(distances) == 0:
+                            recorder.record_end(j, i)
+                            # print(str(i) + ' Done!')
+                            break
+                        elif i == self.max_attempts:
+                            recorder.record_end(j, -1)
+                            break
+                        else:
+                            testNode = minNeighborHash
+                            distance = min(distances)
+                    phase.update()
+            recorder.flush()
+            print(Simulation.formatSummary(recorder.summarize()))
+            return recorder
+
+    def runBatchSimulation(self, sim_type=0):
+        """
+        Route all num_messages messages together with a BatchRouter over the compact network, or over a lazy one
+        without reciprocal links if storage is "lazy".
+        Returns the path length of every message, -1 for the failed ones.
+        """
+        types = ["kleinberg", "yule"]
+        lazy = self.storage == "lazy"
+        testNetwork = Network(self.testDim, network_type=types[sim_type], storage="lazy" if lazy else "compact",
+                              real_connection=not lazy, seed=self.seed)
+        rng = testNetwork.rng.spawn("routing")
+        router = BatchRouter(testNetwork.world, self.max_attempts, testNetwork.instrumentation,
+                             get_strategy(self.strategy, testNetwork.world, self.random_walk, rng), rng)
+        # counting the users of a lazy network would visit every node
+        if lazy or len(testNetwork.world.get_occupied_ids()) > 2:
+            sources, targets = router.sample_pairs(self.num_messages)
+            lengths = router.route(sources, targets)
+            print(Simulation.formatSummary(router.summarize(lengths)))
+            return lengths
+
+    def runStrategyComparison(self, sim_type=0):
+        """
+        Route the same num_messages messages over the same compact network with every routing strategy, with and
+        without the random-walk fallback.
+        Returns a dict (strategy name, random_walk) -> (mean, median, success rate).
+        """
+        types = ["kleinberg", "yule"]
+        testNetwork = Network(self.testDim, network_type=types[sim_type], storage="compact", seed=self.seed)
+        rng = testNetwork.rng.spawn("routing")
+        if len(testNetwork.world.get_occupied_ids()) > 2:
+            sources, targets = BatchRouter(testNetwork.world, rng=rng).sample_pairs(self.num_messages)
+            results = {}
+            for name in sorted(strategies):
+                for random_walk in [False, True]:
+                    router = BatchRouter(testNetwork.world, self.max_attempts, testNetwork.instrumentation,
+                                         get_strategy(name, testNetwork.world, random_walk, rng.spawn(name)))
+                    results[(name, random_walk)] = router.summarize(router.route(sources, targets))
+                    print("{0}{1}: {2}".format(name, " with random walk" if random_walk else "",
+                                               Simulation.formatSummary(results[(name, random_walk)])))
+            return results
+
+    def runStretchSimulation(self, sim_type=0):
+        """
+        Route num_messages messages greedily and find their shortest paths on the same compact network.
+        Prints the mean stretch (greedy / optimal path length) of the delivered messages and the estimated diameter,
+        and returns the stretch of every message, nan for the failed ones.
+        """
+        types = ["kleinberg", "yule"]
+        testNetwork = Network(self.testDim, network_type=types[sim_type], storage="compact", seed=self.seed)
+        router = BatchRouter(testNetwork.world, self.max_attempts, testNetwork.instrumentation,
+                             rng=testNetwork.rng.spawn("routing"))
+        shortest_paths = ShortestPaths(testNetwork.world, testNetwork.instrumentation)
+        if len(testNetwork.world.get_occupied_ids()) > 2:
+            sources, targets = router.sample_pairs(self.num_messages)
+            stretch = ShortestPaths.get_stretch(router.route(sources, targets),
+                                                shortest_paths.get_lengths(sources, targets))
+            delivered = stretch[~numpy.isnan(stretch)]
+            print("Mean stretch {0}, Estimated diameter {1}".format(
+                delivered.mean() if len(delivered) else None,
+                shortest_paths.estimate_diameter(rng=testNetwork.rng.spawn("diameter"))))
+            return stretch
 
     def main(self):
         self.runSimulation()
@@ -0,0 +1,210 @@
+from instrumentation import Instrumentation, NullSink
+from multiprocessing import Pool
+from network_model import Network
+from routing import BatchRouter
+import csv
+import itertools
+import json
+import os
+import time
+
+
+def run_point(task):
+    """
+    Build the network of one grid point and run every requested routing trial on it.
+    Module level so that multiprocessing can pickle it.
+    @param task: tuple (point dict, list of trial numbers, num_messages, max_attempts, cache_dir, stats)
+    """
+    point, trials, num_messages, max_attempts, cache_dir, stats = task
+    instrumentation = Instrumentation(NullSink())
+    timer = time.time()
+    network = Network(point["dimensions"], density=point["density"], network_type=point["network_type"],
+                      num_out_links=point["num_out_links"], cache_dir=cache_dir, storage="compact",
+                      cluster_exponent=point["cluster_exponent"], seed=point["seed"], instrumentation=instrumentation)
+    build_seconds = time.time() - timer
+    build_summary = instrumentation.summary()
+    network_stats = network.get_stats() if stats else {}
+    rows = []
+    for trial in trials:
+        router = BatchRouter(network.world, max_attempts, Instrumentation(NullSink()),
+                             rng=network.rng.spawn("trial", trial))
+        timer = time.time()
+        sources, targets = router.sample_pairs(num_messages)
+        mean, median, success_rate = router.summarize(router.route(sources, targets))
+        row = Sweep.get_row_key(point, trial)
+        row.update({"num_messages": num_messages, "mean": mean, "median": median, "success_rate": success_rate,
+                    "build_seconds": build_seconds, "route_seconds": time.time() - timer,
+                    "messages_per_second": router.instrumentation.summary()["routing"]["rate"]})
+        for phase_name, column in [("basic network", "nodes_per_second"), ("long-range links", "links_per_second")]:
+            row[column] = build_summary[phase_name]["rate"] if phase_name in build_summary else None
+        for column in Sweep.stats_columns if stats else []:
+            row[column] = network_stats[column]
+        rows.append(row)
+    return rows
+
+
+class Sweep():
+    """
+    Run the routing simulation over a grid of network parameters on a process pool.
+    Each grid point is a dict with dimensions, density, cluster_exponent, network_type, num_out_links and seed.
+    A point builds its network once and reuses it for all of its routing trials. Trial t of a point draws its messages
+    from network.rng.spawn("trial", t), so every row can be reproduced on its own. Rows are appended to results_file
+    (.csv or .jsonl) as soon as a point finishes, and rows already in the file are skipped, so an interrupted sweep
+    resumes where it stopped.
+    """
+    parameters = ["dimensions", "density", "cluster_exponent", "network_type", "num_out_links", "seed"]
+    columns = parameters + ["trial", "num_messages", "mean", "median", "success_rate", "build_seconds",
+                            "route_seconds", "nodes_per_second", "links_per_second", "messages_per_second"]
+    # added with stats=True, from Network.get_stats
+    stats_columns = ["occupancy_fraction", "mean_clustering", "num_components", "largest_component", "mean_link_length"]
+
+    def __init__(self, grid, results_file, num_messages=500, trials=1, max_attempts=500, processes=None,
+                 cache_dir=None, stats=False):
+        """
+        @param grid: list of dict, see get_grid
+        @param results_file: str path ending in .csv or .jsonl
+        @param trials: int number of routing trials per network
+        @param processes: int size of the pool, 1 runs in this process
+        @param stats: bool add the stats_columns of every network, kept in the cache if cache_dir is given
+        """
+        self.grid = grid
+        self.results_file = results_file
+        self.num_messages = num_messages
+        self.trials = trials
+        self.max_attempts = max_attempts
+        self.processes = processes
+        self.cache_dir = cache_dir
+        self.stats = stats
+        self.columns = Sweep.columns + (Sweep.stats_columns if stats else [])
+
+    @staticmethod
+    def get_grid(dimensions=((100, 100), ), density=(0.6, ), cluster_exponent=(1, ), network_type=("kleinberg", ),
+                 num_out_links=(1, ), seed=(1, )):
+        """
+        Return the list of grid points of the cartesian product of the given parameter values.
+        """
+        return [dict(zip(Sweep.parameters, values)) for values in
+                itertools.product(dimensions, density, cluster_exponent, network_type, num_out_links, seed)]
+
+    @staticmethod
+    def get_row_key(point, trial):
+        """
+        Return the identifying columns of a result row, all as strings so that csv and json rows compare equal.
+        """
+        row = dict([(parameter, str(point[parameter])) for parameter in Sweep.parameters])
+        row["dimensions"] = "x".join([str(size) for size in point["dimensions"]])
+        row["trial"] = str(trial)
+        return row
+
+    def is_csv(self):
+        return self.results_file.endswith(".csv")
+
+    def read_finished(self):
+        """
+        Return the set of (parameters..., trial) keys already in the results file.
+        """
+        finished = set()
+        if not os.path.isfile(self.results_file):
+            return finished
+        with open(self.results_file, 'r') as f:
+            rows = csv.DictReader(f) if self.is_csv() else Sweep.read_json_rows(f)
+            for row in rows:
+                if any([row.get(column) is None for column in Sweep.parameters + ["trial"]]):
+                    continue
+                finished.add(tuple([str(row[column]) for column in Sweep.parameters + ["trial"]]))
+        return finished
+
+    @staticmethod
+    def read_json_rows(f):
+        """
+        Yield the rows of a .jsonl file, skipping the lines that do not parse.
+        """
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+    def drop_partial_row(self):
+        """
+        Cut a row left half-written by a crash off the end of the results file, so that resuming appends whole rows.
+        """
+        if not os.path.isfile(self.results_file):
+            return
+        with open(self.results_file, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            if not position:
+                return
+            f.seek(position - 1)
+            if f.read(1) == "\n":
+                return
+            # the end of the last complete line, 0 if there is none
+            while position > 0:
+                block = min(4096, position)
+                f.seek(position - block)
+                index = f.read(block).rfind("\n")
+                if index >= 0:
+                    position += index + 1 - block
+                    break
+                position -= block
+            f.truncate(position)
+
+    def get_tasks(self):
+        """
+        Return the tasks for run_point, leaving out the trials that are already finished.
+        """
+        finished = self.read_finished()
+        tasks = []
+        for point in self.grid:
+            trials = []
+            for trial in range(self.trials):
+                key = self.get_row_key(point, trial)
+                if tuple([key[column] for column in Sweep.parameters + ["trial"]]) not in finished:
+                    trials.append(trial)
+            if trials:
+                tasks.append((point, trials, self.num_messages, self.max_attempts, self.cache_dir, self.stats))
+        return tasks
+
+    def write_rows(self, f, rows):
+        if self.is_csv():
+            writer = csv.DictWriter(f, self.columns)
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        f.flush()
+
+    def run(self):
+        """
+        Run all unfinished tasks and stream their rows to the results file.
+        Returns the number of rows written.
+        """
+        self.drop_partial_row()
+        tasks = self.get_tasks()
+        num_rows = 0
+        needs_header = self.is_csv() and not (os.path.isfile(self.results_file) and os.path.getsize(self.results_file))
+        with open(self.results_file, 'a') as f:
+            if needs_header:
+                csv.DictWriter(f, self.columns).writeheader()
+            if self.processes == 1:
+                for rows in itertools.imap(run_point, tasks):
+                    self.write_rows(f, rows)
+                    num_rows += len(rows)
+                return num_rows
+            pool = Pool(self.processes)
+            try:
+                for rows in pool.imap_unordered(run_point, tasks):
+                    self.write_rows(f, rows)
+                    num_rows += len(rows)
+            finally:
+                pool.close()
+                pool.join()
+        return num_rows
+
+
+if __name__ == "__main__":
+    grid = Sweep.get_grid(density=(1.0, 0.8, 0.6, 0.5), network_type=("kleinberg", "yule"), seed=(1, 2, 3))
+    Sweep(grid, "sweep.csv", num_messages=5000, trials=3).run()
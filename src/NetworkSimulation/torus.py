@@ -0,0 +1,78 @@
+import itertools
+import numpy
+
+metrics = ("l1", "linf")
+
+
+def combine(total, distances, metric):
+    """
+    Fold the distances along one more dimension into total, in place.
+    """
+    if metric == "l1":
+        total += distances
+    elif metric == "linf":
+        numpy.maximum(total, distances, out=total)
+    else:
+        raise ValueError("unknown metric {0}, expected one of {1}".format(metric, metrics))
+
+
+def get_position_distances(dimensions, positions1, positions2, metric="l1"):
+    """
+    Return the torus distances between positions, for any number of dimensions.
+    The positions are arrays whose last axis holds the coordinates and the other axes broadcast: one position against
+    an (n, d) array is a one-to-many query, an (n, 1, d) array against an (m, d) array gives the (n, m) distances.
+    @param dimensions: tuple size of every dimension
+    @param positions1: numpy.ndarray|tuple
+    @param positions2: numpy.ndarray|tuple
+    @param metric: str "l1" or "linf"
+    """
+    positions1 = numpy.asarray(positions1, dtype=numpy.int64)
+    positions2 = numpy.asarray(positions2, dtype=numpy.int64)
+    total = numpy.zeros(numpy.broadcast(positions1[..., 0], positions2[..., 0]).shape, dtype=numpy.int64)
+    for i, size in enumerate(dimensions):
+        diff = numpy.abs(positions1[..., i] - positions2[..., i]) % size
+        combine(total, numpy.minimum(diff, size - diff), metric)
+    return total
+
+
+def get_torus_distances(dimensions, node_ids1, node_ids2, metric="l1"):
+    """
+    Return the torus distances between the row-major node ids node_ids1[i] and node_ids2[i]. The ids broadcast, so
+    a single id against an array is a one-to-many query.
+    @param dimensions: tuple
+    @param node_ids1: numpy.ndarray|int
+    @param node_ids2: numpy.ndarray|int
+    @param metric: str "l1" or "linf"
+    """
+    total = numpy.zeros(numpy.broadcast(node_ids1, node_ids2).shape, dtype=numpy.int64)
+    positions1 = numpy.unravel_index(node_ids1, dimensions)
+    positions2 = numpy.unravel_index(node_ids2, dimensions)
+    for coordinates1, coordinates2, size in zip(positions1, positions2, dimensions):
+        diff = numpy.abs(coordinates1 - coordinates2)
+        combine(total, numpy.minimum(diff, size - diff), metric)
+    return total
+
+
+def get_pairwise_distances(dimensions, node_ids1, node_ids2, metric="l1"):
+    """
+    Return the (len(node_ids1), len(node_ids2)) matrix of the torus distances between every pair of node ids.
+    """
+    return get_torus_distances(dimensions, numpy.asarray(node_ids1)[:, numpy.newaxis],
+                               numpy.asarray(node_ids2)[numpy.newaxis, :], metric)
+
+
+def get_movements(dimensions, distance, metric="l1"):
+    """
+    Return the movements of exactly the given length, as an array of shape (number of movements, len(dimensions)).
+    A movement longer than half of its dimension is left out, as it is the same node as a shorter one the other way.
+    """
+    if metric not in metrics:
+        raise ValueError("unknown metric {0}, expected one of {1}".format(metric, metrics))
+    diameters = [size // 2 for size in dimensions]
+    movements = []
+    for movement in itertools.product(range(-distance, distance + 1), repeat=len(dimensions)):
+        steps = [abs(step) for step in movement]
+        length = sum(steps) if metric == "l1" else max(steps)
+        if length == distance and all([steps[i] <= diameters[i] for i in range(len(steps))]):
+            movements.append(movement)
+    return numpy.array(movements, dtype=numpy.int64).reshape(len(movements), len(dimensions))
@@ -0,0 +1,176 @@
+import numpy
+import os
+
+
+class ColumnBuffer():
+    """
+    A table of typed numpy columns filled row block by row block into preallocated buffers.
+    When the buffers are full they are either doubled or, if spill_prefix is given, appended to one raw file per
+    column (spill_prefix + "." + column name) and reused, so memory stays at capacity rows however long the run.
+    """
+
+    def __init__(self, columns, capacity=2 ** 16, spill_prefix=None):
+        """
+        @param columns: list of (name, dtype)
+        @param capacity: int rows kept in memory
+        @param spill_prefix: str path prefix of the column files, None to keep every row in memory
+        """
+        self.names = [name for name, dtype in columns]
+        self.buffers = dict([(name, numpy.zeros(capacity, dtype=dtype)) for name, dtype in columns])
+        self.size = 0
+        self.spilled = 0
+        self.spill_prefix = spill_prefix
+        if spill_prefix is not None:
+            for name in self.names:
+                open(self.get_file_name(name), 'wb').close()
+
+    def get_file_name(self, name):
+        return self.spill_prefix + "." + name
+
+    def append(self, *values):
+        """
+        Append one row, with a value for every column in order.
+        """
+        if self.size == len(self.buffers[self.names[0]]):
+            self.make_room()
+        for name, value in zip(self.names, values):
+            self.buffers[name][self.size] = value
+        self.size += 1
+
+    def extend(self, *columns):
+        """
+        Append a block of rows, given as one array per column in order.
+        """
+        num_rows = len(columns[0])
+        capacity = len(self.buffers[self.names[0]])
+        if self.size + num_rows > capacity:
+            if self.spill_prefix is not None:
+                self.flush()
+                if num_rows > capacity:
+                    # too big for the buffers, goes straight to the files
+                    self.write(columns)
+                    return
+            else:
+                self.grow(self.size + num_rows)
+        for name, values in zip(self.names, columns):
+            self.buffers[name][self.size:self.size + num_rows] = values
+        self.size += num_rows
+
+    def make_room(self):
+        if self.spill_prefix is not None:
+            self.flush()
+        else:
+            self.grow(self.size + 1)
+
+    def grow(self, num_rows):
+        new_capacity = max(2 * len(self.buffers[self.names[0]]), num_rows)
+        for name in self.names:
+            buffer = numpy.zeros(new_capacity, dtype=self.buffers[name].dtype)
+            buffer[:self.size] = self.buffers[name][:self.size]
+            self.buffers[name] = buffer
+
+    def write(self, columns):
+        for name, values in zip(self.names, columns):
+            with open(self.get_file_name(name), 'ab') as f:
+                numpy.asarray(values, dtype=self.buffers[name].dtype).tofile(f)
+        self.spilled += len(columns[0])
+
+    def flush(self):
+        """
+        Append the rows in memory to the column files. Only with a spill_prefix.
+        """
+        self.write([self.buffers[name][:self.size] for name in self.names])
+        self.size = 0
+
+    def get_column(self, name):
+        """
+        Return every row of a column, the spilled rows memory-mapped from their file followed by those in memory.
+        """
+        in_memory = self.buffers[name][:self.size]
+        if not self.spilled:
+            return in_memory.copy()
+        spilled = numpy.memmap(self.get_file_name(name), dtype=in_memory.dtype, mode='r', shape=(self.spilled, ))
+        return numpy.concatenate([spilled, in_memory])
+
+    def __len__(self):
+        return self.spilled + self.size
+
+    def remove_files(self):
+        if self.spill_prefix is not None:
+            for name in self.names:
+                os.remove(self.get_file_name(name))
+
+
+class TraceRecorder():
+    """
+    Records routing traces as columns instead of nested lists: one row (message, hop, node, distance) per hop, where
+    hop 0 is the source and distance is the distance left to the target, and one row (message, length) per finished
+    message, length -1 if it failed. Every statistic is computed from the columns.
+    """
+    hop_columns = [("message", numpy.int64), ("hop", numpy.int32), ("node", numpy.int64), ("distance", numpy.int32)]
+    end_columns = [("message", numpy.int64), ("length", numpy.int32)]
+
+    def __init__(self, capacity=2 ** 16, spill_prefix=None):
+        """
+        @param capacity: int hop rows kept in memory
+        @param spill_prefix: str path prefix of the files the rows are spilled to, None to keep them in memory
+        """
+        self.hops = ColumnBuffer(self.hop_columns, capacity, spill_prefix + ".hops" if spill_prefix else None)
+        self.ends = ColumnBuffer(self.end_columns, capacity, spill_prefix + ".ends" if spill_prefix else None)
+
+    def record_hop(self, message, hop, node, distance):
+        self.hops.append(message, hop, node, distance)
+
+    def record_hops(self, messages, hop, nodes, distances):
+        """
+        Record the same hop of many messages.
+        """
+        self.hops.extend(messages, numpy.full(len(messages), hop, dtype=numpy.int32), nodes, distances)
+
+    def record_end(self, message, length):
+        self.ends.append(message, length)
+
+    def record_ends(self, messages, lengths):
+        self.ends.extend(messages, lengths)
+
+    def flush(self):
+        if self.hops.spill_prefix is not None:
+            self.hops.flush()
+            self.ends.flush()
+
+    def get_lengths(self):
+        """
+        Return (messages, lengths) of the finished messages.
+        """
+        return self.ends.get_column("message"), self.ends.get_column("length")
+
+    def summarize(self):
+        """
+        Return (mean, median, success rate) of the path lengths, as BatchRouter.summarize.
+        """
+        lengths = self.ends.get_column("length")
+        delivered = lengths[lengths >= 0]
+        if not len(delivered):
+            return None, None, 0.0
+        return 1.0 * delivered.sum() / len(delivered), float(numpy.median(delivered)), \
+            1.0 * len(delivered) / len(lengths)
+
+    def get_decay_curve(self):
+        """
+        Return the mean distance left to the target after every hop, over the messages still in flight at that hop.
+        """
+        hops = self.hops.get_column("hop")
+        counts = numpy.bincount(hops)
+        totals = numpy.bincount(hops, weights=self.hops.get_column("distance"))
+        return totals / numpy.maximum(counts, 1)
+
+    def get_trace(self, message):
+        """
+        Return the (hop, node, distance) rows of one message.
+        """
+        rows = self.hops.get_column("message") == message
+        return zip(*[self.hops.get_column(name)[rows].tolist() for name in ["hop", "node", "distance"]])
+
+    def remove_files(self):
+        self.hops.remove_files()
+        self.ends.remove_files()
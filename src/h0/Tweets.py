@@ -11,6 +11,8 @@ You need a tweet file to run this program.
 """
 from collections import defaultdict
 from joblib import Parallel, delayed
+from operator import itemgetter
+from selection import medianItem, select, topKWithTies
 import re
 import time
 
@@ -61,71 +63,26 @@ class Tweets():
 
     def getMedian(self, unsorted):
         """
-        This function calculates the median of a given sample. The sample
-        should be in the form of dictionary, where key is the useranme
-        and value is the number of tweet associated to the username. It
-        will call a helper function quickSelect()
+        Returns the (userName, count) item with the median count of a dictionary that maps a userName
+        to the number of its tweets, selected in an array of the counts (see selection.medianItem).
         """
-        # find index number of median
-        indexOfMedian = (len(unsorted) - 1) / 2
-        # construct a list comprised of only frequencies using existing
-        # dictionary, then pass the list to quickSelect() function
-        return self.quickSelect(unsorted.items(), indexOfMedian)
+        return medianItem(unsorted)
 
     def getTopItems(self, sample, k):
         """
         This function returns the top k keys from a dictionary (sample).
         The sample should be in the form of dictionary, where key is the
         useranme and value is the number of tweet associated to the
-        username. It will call a helper function quickSelect()
+        username. Items tied with the kth one are kept too.
         """
-        threshold = self.quickSelect(sample, len(sample)-k)
-        result = []
-        for item in sample:
-            if item[1] >= threshold[1]:
-                result.append(item)
-        return result
-
-    # Return the smallest kth item of the list using the quick select algo
+        return topKWithTies(sample, k, key=itemgetter(1))
+
     def quickSelect(self, unsortedList, k):
         """
-        This function returns the smallest kth item of an unsorted list
-        using quick select algorithm. The algorithm is in a recursive
-        fashion. Complexity O(log(u))
-        """
-        # calling helper function lomutoPartition for pivot position
-        s = self.lomutoPartition(unsortedList)
-        # if pivot position == k, return pivot position
-        if s == k:
-            return unsortedList[s]
-        # if pivot position > k, process values before pivot position
-        elif s > k:
-            return self.quickSelect(unsortedList[0:s], k)
-        # if pivot position < k, process values after pivot position
-        else:
-            return self.quickSelect(unsortedList[s+1:len(unsortedList)], k-1-s)
-
-    def lomutoPartition(self, unpartitionedList):
-        """
-        This function returns pivot position that partitions the list of
-        the first list item. Complexity O(n)
+        Return the smallest kth item of the list, compared by count, with the
+        in-place introselect of selection.select. Complexity O(u)
         """
-        # initialize pivot
-        pivot = unpartitionedList[0]
-        # initialize pivot position
-        pivotPosition = 0
-        for i in range(1, len(unpartitionedList)):
-            if unpartitionedList[i][1] < pivot[1]:
-                # update pivot position
-                pivotPosition += 1
-                # swaping the position of unpartitionedList[i] and unpartitionedList[pivotPosition]
-                unpartitionedList[i], unpartitionedList[pivotPosition] = \
-                    unpartitionedList[pivotPosition], unpartitionedList[i]
-        # swaping the position of unpartitionedList[0] and unpartitionedList[pivotPosition]
-        unpartitionedList[0], unpartitionedList[pivotPosition] = \
-            unpartitionedList[pivotPosition], unpartitionedList[0]
-        # return pivot position
-        return pivotPosition
+        return select(unsortedList, k, key=itemgetter(1))
 
     def main(self):
         """
@@ -175,8 +132,8 @@ class Tweets():
         # -----------------------------------------------------------
         print("Mean: " + str(self.getMean(tweetCounter)))
 
-        print("Median: " + str(self.getMedian(tweetCounter)[1]) + " ("
-              + self.getMedian(tweetCounter)[0] + ")")
+        medianUser, medianCount = self.getMedian(tweetCounter)
+        print("Median: " + str(medianCount) + " (" + medianUser + ")")
 
         print("Top " + str(topUserThreshold) + " users: "
               + str(tweets.getTopItems(tweetCounter.items(), topUserThreshold)))
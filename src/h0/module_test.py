@@ -0,0 +1,194 @@
+import collections
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from tackling_twitter import Twitter_Tackler
+from termMatrix import TermMatrix
+from tweetPipeline import TweetPipeline, getDfCounter, splitTerms
+from tweetReader import getRanges, getRecordBoundary, readRange, readRecords
+from tweetStore import TweetStore
+
+
+def writeTweets(fileName, numTweets, seed, trailingNewline=True):
+    """
+    Write a tweet file with backslash-continued tweets, continuation lines that are a lone newline and invalid lines.
+    """
+    rng = random.Random(seed)
+    words = ["alpha", "beta", "gamma", "delta", "tokyo", "bishop", "parish", "honolulu", "d700", "x"]
+    users = ["user%d" % i for i in range(12)]
+    lines = []
+    for i in range(numTweets):
+        parts = [" ".join(rng.choice(words) for j in range(rng.randint(1, 8)))]
+        draw = rng.random()
+        if draw < 0.15:
+            parts += [" ".join(rng.choice(words) for j in range(rng.randint(0, 4))) for j in range(rng.randint(1, 3))]
+        elif draw < 0.2:
+            # the record ends with a lone newline, so the next one starts right after it
+            parts.append("")
+        elif draw < 0.25:
+            lines.append("not a tweet")
+        lines.append("\\\n".join(["%d\t%d\t%s\t%s" % (1250000000 + 60 * i, 1000 + i, rng.choice(users), parts[0])]
+                                 + parts[1:]))
+    with open(fileName, 'wb') as f:
+        f.write("\n".join(lines) + ("\n" if trailingNewline else ""))
+
+
+class TweetFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tweetDir = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.tweetDir, "tweets.txt")
+        writeTweets(self.fileName, 300, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tweetDir)
+
+
+class TestTweetReader(TweetFileTest):
+    def getBoundaries(self, fileName):
+        """
+        Return the record boundaries of the file: the starts of the lines whose previous line does not go on, and the
+        file size.
+        """
+        with open(fileName, 'rb') as f:
+            content = f.read()
+        boundaries = [0]
+        for position, char in enumerate(content):
+            if char == '\n' and (position == 0 or content[position - 1] != '\\'):
+                boundaries.append(position + 1)
+        return sorted(set(boundaries + [len(content)]))
+
+    def assertRangesReadAll(self, fileName):
+        records = list(readRecords(fileName))
+        for numRanges in [1, 2, 3, 7, 16, 1000]:
+            ranges = getRanges(fileName, numRanges)
+            self.assertLessEqual(len(ranges), numRanges)
+            self.assertEqual(ranges[0][1], 0)
+            self.assertEqual(ranges[-1][2], os.path.getsize(fileName))
+            self.assertEqual([start for name, start, stop in ranges[1:]], [stop for name, start, stop in ranges[:-1]])
+            self.assertEqual([record for name, start, stop in ranges for record in readRange(fileName, start, stop)],
+                             records)
+
+    def test_record_boundaries(self):
+        boundaries = self.getBoundaries(self.fileName)
+        with open(self.fileName, 'rb') as f:
+            for position in range(os.path.getsize(self.fileName) + 1):
+                expected = [boundary for boundary in boundaries if boundary >= position][0]
+                self.assertEqual(getRecordBoundary(f, position), expected)
+
+    def test_ranges(self):
+        records = list(readRecords(self.fileName))
+        self.assertEqual(len(records), 300)
+        self.assertTrue(any(" " in record[3] and record[3].endswith(" ") for record in records))
+        self.assertRangesReadAll(self.fileName)
+
+    def test_range_after_lone_newline(self):
+        with open(self.fileName, 'rb') as f:
+            content = f.read()
+        # the start of a record whose previous record ends with a lone newline
+        start = content.index("\\\n\n") + 3
+        self.assertIn(start, self.getBoundaries(self.fileName))
+        with open(self.fileName, 'rb') as f:
+            self.assertEqual(getRecordBoundary(f, start), start)
+        records = list(readRecords(self.fileName))
+        before = list(readRange(self.fileName, 0, start))
+        self.assertEqual(before + list(readRange(self.fileName, start, len(content))), records)
+        self.assertEqual(before[-1][3][-1], " ")
+
+    def test_no_trailing_newline(self):
+        for seed in range(5):
+            writeTweets(self.fileName, 40, seed, trailingNewline=False)
+            self.assertEqual(len(list(readRecords(self.fileName))), 40)
+            self.assertRangesReadAll(self.fileName)
+        with open(self.fileName, 'ab') as f:
+            f.write("\n1\t2\tlast\tends with a backslash\\")
+        self.assertEqual(list(readRecords(self.fileName))[-1], (1, 2, "last", "ends with a backslash"))
+        self.assertRangesReadAll(self.fileName)
+
+
+class TestTweetPipeline(TweetFileTest):
+    def setUp(self):
+        TweetFileTest.setUp(self)
+        self.tweetCounter = collections.defaultdict(int)
+        self.tfCounter = collections.defaultdict(lambda: collections.defaultdict(int))
+        for timeStamp, recordId, userName, tweetText in readRecords(self.fileName):
+            self.tweetCounter[userName] += 1
+            for term in splitTerms(tweetText):
+                self.tfCounter[userName][term] += 1
+
+    def test_pipeline(self):
+        tfCounter = dict([(userName, dict(tf)) for userName, tf in self.tfCounter.iteritems()])
+        for processes in [1, 2]:
+            tweetCounter, pipelineTfCounter, dfCounter = TweetPipeline(self.fileName, processes, 3).run()
+            self.assertEqual(tweetCounter, dict(self.tweetCounter))
+            self.assertEqual(pipelineTfCounter, tfCounter)
+            self.assertEqual(dfCounter, getDfCounter(tfCounter))
+
+    def test_store(self):
+        store = TweetStore.ingest(self.fileName, os.path.join(self.tweetDir, "store"))
+        tweetCounter, tfCounter, dfCounter = TweetPipeline(self.fileName, 1).run()
+        self.assertEqual(len(store), sum(tweetCounter.values()))
+        self.assertEqual(store.getTweetCounter(), tweetCounter)
+        for userName in tfCounter:
+            self.assertEqual(store.getTfCounter(userName), tfCounter[userName])
+        self.assertEqual(store.getTfCounter("nobody"), {})
+        self.assertEqual(dict(zip(store.getTerms(), store.getDfCounts().tolist())), dfCounter)
+
+
+class TestTermMatrix(TweetFileTest):
+    def setUp(self):
+        TweetFileTest.setUp(self)
+        self.allDocs = collections.defaultdict(list)
+        for timeStamp, recordId, userName, tweetText in readRecords(self.fileName):
+            self.allDocs[userName].extend(splitTerms(tweetText))
+        self.tackler = Twitter_Tackler(self.fileName)
+        self.wordDocMaps = self.tackler.wordDocMaps(self.allDocs)
+        self.matrix = self.tackler.termMatrix(self.allDocs)
+
+    def getScores(self, userName, extra, threshold):
+        """
+        Return the tf-idf scores of userName computed with the dictionaries of Twitter_Tackler.
+        """
+        dfMap = self.tackler.dfForAllUsers(self.wordDocMaps)
+        return dict([(word, float(tf + extra) / dfMap[word])
+                     for word, tf in self.tackler.tfForUser(userName, self.allDocs).iteritems()
+                     if dfMap[word] > threshold])
+
+    def test_top_words(self):
+        for userName in sorted(self.allDocs):
+            for k, extra, threshold in [(1, 0, 0), (5, 0.5, 0.2), (20, 0.5, 0.2), (3, 0, 6), (100, 0, 0)]:
+                scores = self.getScores(userName, extra, threshold)
+                expected = sorted(scores.values(), reverse=True)[:k]
+                top = self.matrix.topKWordsForUser(userName, k, extra, threshold)
+                self.assertEqual([score for word, score in top], expected)
+                for word, score in top:
+                    self.assertEqual(scores[word], score)
+                # ties at the kth score are broken by term id, the others are all there
+                self.assertEqual(set([word for word, score in top if score > expected[-1]]),
+                                 set([word for word, score in scores.iteritems() if score > expected[-1]]))
+                self.assertEqual(self.tackler.topKWordsForUser(userName, self.allDocs, self.wordDocMaps, k, extra,
+                                                               threshold), top)
+        self.assertEqual(self.matrix.topKWordsForUser("nobody", 5), [])
+
+    def test_cache(self):
+        self.assertIs(self.tackler.termMatrix(self.allDocs), self.matrix)
+        self.assertIsNot(self.tackler.termMatrix(dict(self.allDocs)), self.matrix)
+
+    def test_all_users(self):
+        allTop = self.matrix.topKWordsForAllUsers(4, 0.5, 0.2)
+        self.assertEqual(sorted(allTop), sorted(self.allDocs))
+        for userName in self.allDocs:
+            self.assertEqual(allTop[userName], self.matrix.topKWordsForUser(userName, 4, 0.5, 0.2))
+
+    def test_from_store(self):
+        store = TweetStore.ingest(self.fileName, os.path.join(self.tweetDir, "store"))
+        stored = TermMatrix.fromStore(store)
+        for userName in self.allDocs:
+            self.assertEqual(sorted(stored.topKWordsForUser(userName, 1000)),
+                             sorted(self.matrix.topKWordsForUser(userName, 1000)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,6 @@ This program analyzes tweets.
 
 Instruction:
 - Edit the baseDir to your tweet file directory.
-- Requires the pp library to run
 
 Result:
 Small tweet:
@@ -18,10 +17,14 @@ Large tweet:
 
 Highlight: we figured out multiprocessing and running time is shortened to 2.05 sec from 2.88 sec for small tweet
 and to 42 sec from 68 sec for big tweet.
+The three pp jobs, each reading the whole file for one counter, are replaced by a single scan split over all cores,
+see tweetPipeline.
 
 """
+from operator import itemgetter
+from selection import medianItem, select, topKWithTies
+from tweetPipeline import TweetPipeline
 import collections
-import pp
 import re
 import time
 
@@ -79,66 +82,26 @@ class Tweets():
 
     def getMedian(self, unsorted):
         """
-        Returns the median of a dictionary that maps a userName
-        to the number of its tweets. It will call a helper function quickSelect()
+        Returns the (userName, count) item with the median count of a dictionary that maps a userName
+        to the number of its tweets, selected in an array of the counts (see selection.medianItem).
         """
-        # find index number of median
-        indexOfMedian = (len(unsorted) - 1) / 2
-        # construct a list comprised of only frequencies using existing
-        # dictionary, then pass the list to quickSelect() function
-        return self.quickSelect(unsorted.items(), indexOfMedian)
+        return medianItem(unsorted)
 
     def getTopItems(self, sample, k):
         """
         This function returns the top k keys from a dictionary (sample).
         The sample should be in the form of dictionary, where key is the
         useranme and value is the number of tweet associated to the
-        username. It will call a helper function quickSelect()
+        username. Items tied with the kth one are kept too.
         """
-        threshold = self.quickSelect(sample, len(sample)-k)
-        result = []
-        for item in sample:
-            if item[1] >= threshold[1]:
-                result.append(item)
-        return result
+        return topKWithTies(sample, k, key=itemgetter(1))
 
     def quickSelect(self, unsortedList, k):
         """
-        Return the smallest kth item of the list using quick select.
-        The algorithm is in a recursive fashion.
-        Complexity O(log(u))
-        """
-        # calling helper function lomutoPartition for pivot position
-        s = self.lomutoPartition(unsortedList)
-        # if pivot position == k, return pivot position
-        if s == k:
-            return unsortedList[s]
-        # if pivot position > k, process values before pivot position
-        elif s > k:
-            return self.quickSelect(unsortedList[0:s], k)
-        # if pivot position < k, process values after pivot position
-        else:
-            return self.quickSelect(unsortedList[s+1:len(unsortedList)], k-1-s)
-
-    def lomutoPartition(self, unpartitionedList):
-        """
-        Returns pivot position that partitions the list of the first list item.
-        Complexity O(n)
-        """
-        # initialize pivot
-        pivot = unpartitionedList[0]
-        # initialize pivot position
-        pivotPosition = 0
-        for i in range(1, len(unpartitionedList)):
-            if unpartitionedList[i][1] < pivot[1]:
-                # update pivot position
-                pivotPosition += 1
-                unpartitionedList[i], unpartitionedList[pivotPosition] = \
-                    unpartitionedList[pivotPosition], unpartitionedList[i]
-        unpartitionedList[0], unpartitionedList[pivotPosition] = \
-            unpartitionedList[pivotPosition], unpartitionedList[0]
-        # return pivot position
-        return pivotPosition
+        Return the smallest kth item of the list, compared by count, with the
+        in-place introselect of selection.select. Complexity O(u)
+        """
+        return select(unsortedList, k, key=itemgetter(1))
 
     def getTweetCounter(self):
         """
@@ -192,23 +155,17 @@ class Tweets():
 
     def main(self):
         """
-        Generate the tweetCounter, tfCounter and dfCounter in parallel.
+        Generate the tweetCounter, tfCounter and dfCounter in a single parallel scan of the file.
         """
-        job_server = pp.Server()
-        if job_server.get_ncpus() > 4:
-            job_server.set_ncpus(4)
-        print "Starting pp with", job_server.get_ncpus(), "workers"
-        p1 = job_server.submit(self.getDfCounter, (), (self.allTweets, ), ('collections', 're', ))
-        p2 = job_server.submit(self.getTfCounter, (), (self.allTweets, ), ('collections', 're', ))
-        p3 = job_server.submit(self.getTweetCounter, (), (self.allTweets, ), ('collections', ))
-        dfCounter = p1()
-        tfCounter = p2()
-        tweetCounter = p3()
+        tweetCounter, tfCounter, userDfCounter = TweetPipeline(self.tweetDir).run()
+        dfCounter = collections.defaultdict(int)
+        for key, value in userDfCounter.iteritems():
+            dfCounter[key] = value + self.dfValueBuffer
 
         print("Mean: " + str(self.getMean(tweetCounter)))
 
-        print("Median: " + str(self.getMedian(tweetCounter)[1]) + " ("
-              + self.getMedian(tweetCounter)[0] + ")")
+        medianUser, medianCount = self.getMedian(tweetCounter)
+        print("Median: " + str(medianCount) + " (" + medianUser + ")")
 
         print("Top " + str(self.topUserThreshold) + " users: "
               + str(tweets.getTopItems(tweetCounter.items(), self.topUserThreshold)))
@@ -226,7 +183,6 @@ class Tweets():
                       str(self.getTopItems(tfIdf.items(), self.topInterestingWords)))
             else:
                 print(userName + " does not exist. ")
-        job_server.print_stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+"""
+Author: Yu Zhao, Yulun Li
+
+Description:
+Selection utilities shared by the tweet analyzers: the kth smallest item of a list, the top k items of a stream and
+the median of counts.
+
+- select is an iterative introselect that partitions the list in place, without copying slices. The pivot is the
+  median of the first, middle and last items, so sorted input (the large file is grouped by user) stays linear, and
+  the partition is three-way, so runs of equal counts are put aside at once. After 2 log2(n) rounds without
+  converging the rest of the range is sorted, which bounds the worst case to O(n log n).
+- topK keeps a heap of k items while reading an iterable once, O(n log k) time and O(k) memory.
+- medianCount and kthSmallestCount select in a numpy array of counts, which stays fast on 10^7 users.
+"""
+from operator import itemgetter
+import heapq
+import itertools
+import numpy
+
+
+def select(items, k, key=None, first=0, last=None):
+    """
+    Return the item that would be at position k if items[first:last + 1] were sorted, and partially sort the list in
+    place around it: the items before k are not greater and the items after k are not smaller.
+    @param items: list
+    @param k: int position between first and last
+    @param key: function of an item to compare, the item itself if None
+    @param last: int, the last position of the list if None
+    """
+    last = len(items) - 1 if last is None else last
+    if not first <= k <= last:
+        raise IndexError("select position out of range")
+    keys = [key(item) for item in items] if key is not None else items
+    paired = keys is not items
+    depth = 2 * (last - first + 1).bit_length()
+    while first < last:
+        if not depth:
+            order = sorted(range(first, last + 1), key=keys.__getitem__)
+            items[first:last + 1] = [items[i] for i in order]
+            if paired:
+                keys[first:last + 1] = [keys[i] for i in order]
+            break
+        depth -= 1
+        a, b, c = keys[first], keys[(first + last) // 2], keys[last]
+        pivot = max(min(a, b), min(max(a, b), c))
+        # three-way partition: [first, lt) < pivot, [lt, gt] == pivot, (gt, last] > pivot
+        lt, i, gt = first, first, last
+        while i <= gt:
+            value = keys[i]
+            if value < pivot:
+                keys[lt], keys[i] = keys[i], keys[lt]
+                if paired:
+                    items[lt], items[i] = items[i], items[lt]
+                lt += 1
+                i += 1
+            elif pivot < value:
+                keys[gt], keys[i] = keys[i], keys[gt]
+                if paired:
+                    items[gt], items[i] = items[i], items[gt]
+                gt -= 1
+            else:
+                i += 1
+        if k < lt:
+            last = lt - 1
+        elif k > gt:
+            first = gt + 1
+        else:
+            break
+    return items[k]
+
+
+def topK(iterable, k, key=None):
+    """
+    Return the k largest items of iterable, largest first and equal items in the order they came, like
+    sorted(iterable, key=key, reverse=True)[:k] without holding or sorting more than k items.
+    """
+    return heapq.nlargest(k, iterable, key=key)
+
+
+def topKWithTies(items, k, key=None):
+    """
+    Return the items that are at least as large as the kth largest one, in their order in items, so items tied with
+    the kth largest are all kept. All items are returned if there are no more than k.
+    @param items: list
+    """
+    if k <= 0:
+        return []
+    keys = [key(item) for item in items] if key is not None else items
+    if k >= len(keys):
+        return list(items)
+    threshold = heapq.nlargest(k, keys)[-1]
+    return [item for item, value in itertools.izip(items, keys) if value >= threshold]
+
+
+def kthSmallestCount(counts, k):
+    """
+    Return the kth smallest of an array of counts, counting from 0, with numpy's introselect.
+    """
+    return numpy.partition(numpy.asarray(counts), k)[k]
+
+
+def medianCount(counts):
+    """
+    Return the median of an array of counts, the lower of the two middle counts if their number is even.
+    """
+    counts = numpy.asarray(counts)
+    if not len(counts):
+        raise ValueError("median of no counts")
+    return kthSmallestCount(counts, (len(counts) - 1) // 2)
+
+
+def medianItem(counter):
+    """
+    Return a (key, count) item of a dictionary whose count is medianCount of all the counts, as the median user of a
+    dictionary from a userName to its number of tweets.
+    """
+    counts = numpy.fromiter(counter.itervalues(), dtype=numpy.int64, count=len(counter))
+    median = medianCount(counts)
+    index = int(numpy.flatnonzero(counts == median)[0])
+    return next(itertools.islice(counter.iterkeys(), index, None)), int(median)
+
+
+def topCountItems(counter, k):
+    """
+    Return the k (key, count) items of a dictionary with the highest counts, highest first.
+    """
+    return topK(counter.iteritems(), k, key=itemgetter(1))
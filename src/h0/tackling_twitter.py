@@ -1,3 +1,5 @@
+from selection import medianCount, select, topCountItems
+from termMatrix import TermMatrix
 import pprint
 import collections
 import operator
@@ -13,6 +15,9 @@ class Twitter_Tackler:
 
     def __init__(self, fname):
         self.fname = fname
+        # TermMatrix of the allDocs it was built from, see termMatrix()
+        self.matrix = None
+        self.matrixDocs = None
 
         #self.userToTweet = collections.defaultdict(set) #set of record_id for each user
         #self.articles = collections.defaultdict(str) #record_id to text
@@ -187,11 +192,11 @@ class Twitter_Tackler:
             Getting mean is a matter of using n divided by m, this takes constant time
             after find the value of n and m. 
 
-            We can call topNActiveUser() m/2 to get the median. Function topNActiveUser()
-            will take O(ulogu) to sort the user by the tweet counts if we have pre-constructed
-            userCountInfo dictionary.
+            The median is selected in an array of the u tweet counts with
+            selection.medianCount, which takes O(u) instead of sorting
+            the users by their tweet counts.
 
-            Therefore, in total, the anaylsis above takes O(n+ulogu) where n is the number of
+            Therefore, in total, the anaylsis above takes O(n+u) where n is the number of
             tweets and u is the number of the users.
 
             Results:
@@ -205,10 +210,8 @@ class Twitter_Tackler:
         mean = n/m
         #print "Analysis 1(a): mean number of tweets per user is %d" % mean
 
-        median = int(self.topNActiveUser(userCountInfo, m/2)[-1][1])
+        median = int(medianCount(userCountInfo.values()))
         #print "Analysis 1(b): median number of tweets per user is %d" % median
-        #m = len(userCountInfo)
-        #median= self.quickSelect(userCountInfo.items(), 0, m-1,m/2 )
 
         return {"mean": mean, "median":median}
 
@@ -219,14 +222,13 @@ class Twitter_Tackler:
             param n: the number of top users need
             Return top n (user_name, count) sorted by count
 
-            The complexity of sorted() is O(ulog(u)) according python's documentation
-            where u is the number of users.
+            The users are read once through a heap of n items (selection.topCountItems),
+            which takes O(ulog(n)) where u is the number of users, instead of sorting
+            all of them in O(ulog(u)).
 
             Reading in the data and construct userCountInfo takes O(n), where n is the number of tweets.
-            The complexity of sorted() is O(ulog(u)) according python's documentation
-            where u is the number of users.
 
-            Therefore, in total, this method has complexity O(n+ulogu).
+            Therefore, in total, this method has complexity O(n+ulogn).
 
             Here are the top 100 users (A list of tuples):
             [('AlphaShooter', 99), ('Alaeddin', 97), ('candyaddict', 96), ('CatholicHawaii', 95), ('jrolstad', 95), ('210cm', 93), 
@@ -250,36 +252,19 @@ class Twitter_Tackler:
             ('onezerosix', 81), ('jbellanca', 80), ('domino1182', 80), ('marthamath', 80), ('djschultz', 80), 
             ('thewebwoman', 80), ('halcollins', 80), ('noexg', 80)]
         """
-        sortedUserCount = sorted(userCountInfo.iteritems(), key=operator.itemgetter(1), reverse=True) #tuple here
         #print "Anaylsis 2: top 100 users "
-        #print sortedUserCount[0:100]
+        #print topCountItems(userCountInfo, 100)
 
-        return sortedUserCount[0:n]
+        return topCountItems(userCountInfo, n)
 
     def quickSelect(self, items, first, last, k):
         """
             Extra Credit 4: using QuickSelect for finding median
-            This is partly working, it's close but the first k 
-            items are not fully sorted
-        """
-        if first < last:
-            pivot = self.partition(items, first, last)
-            if (k < pivot-first):
-                return self.quickSelect(items, first, pivot-1, k)
-            elif (k > pivot):
-                return self.quickSelect(items, pivot+1, last, k-pivot)
-            else:
-                return items[k]
-
-    def partition(self, items, first, last):
-        p = items[first][1]
-        i = first
-        for j in range(first + 1,last + 1):
-            if items[j][1] <= p:
-                i = i + 1
-                items[j], items[i] = items[i], items[j]
-        items[first], items[i] = items[i], items[first]
-        return i
+            Return the (user_name, count) item that would be at
+            position k if items[first:last+1] were sorted by count,
+            with the in-place introselect of selection.select
+        """
+        return select(items, k, key=operator.itemgetter(1), first=first, last=last)
 
     def allDocs(self):
         """
@@ -389,6 +374,8 @@ class Twitter_Tackler:
                             wtdMaps -> wordToDocument Mapping
                             dtwMaps -> documentToword Mapping
                             we can run self.wordDocMaps(allDocs) to get dictionary
+                            It is no longer read: the document frequencies
+                            come from the TermMatrix of allDocs.
 
             param extra: added to iterm frequency to control for rare words
             param threshold: set up for document frequency to control for rare words
@@ -459,54 +446,43 @@ class Twitter_Tackler:
             running this function, the complexity of two input parameters 
             if we want to find topKWords for more than one user.
 
-            Inside this function, we first called dfForAllUsers(), which
-            has complexity O(w). The for loop runs w iterations and the operation
-            inside for loop takes constant time.
-
-            Function tfForUser() has time complexity O(k), where k is the
-            number of words in the user's document. Inside the for
-            loop, which runs k iterations, looking up the key
-            in wordTfMap dictionary and updating it takes constant time.
-
-            The for loop inside the current function runs k iterations, where k is 
-            the number of words in the user's document. All computation inside
-            the for loop takes constant time. So the complexity of the for
-            loop is O(k).
+            Inside this function, we get the TermMatrix of allDocs from
+            termMatrix(). The first call builds it in O(w), with the term
+            counts of every user and the document frequencies of all the
+            words, and caches it on the instance, so the following calls
+            with the same allDocs do not go through the corpus again.
 
-            Because the dictionary tf_idf always has k or less times. Sorting
-            the dictionary using the built-in sorted() function takes 
-            klogk.
+            The scores of the user are then computed from the k distinct
+            words of the user's row in O(k), and the top words are sorted
+            in klogk. Ties are broken by the order in which the words first
+            appear in allDocs, going through the users in sorted order.
 
-            In conclusion, the overall complexity of the tf-idf rating 
-            operation takes O(n+2w+2k+klogk) = O(n+w+k+klogk), where
+            In conclusion, the first call takes O(n+w+k+klogk) including
+            allDocs, and every other call takes O(k+klogk), where
             n is the number of tweets, w is the number of words inside
             all users' documents, and k is the number of words inside 
             the document of the current user.
         """
-        dfMap = self.dfForAllUsers(wordDocMaps)
-        #sortedDf = sorted(dfMap.iteritems(), key=operator.itemgetter(1), reverse=True) #tuple here
-        #print sortedDf[0:20]
-
-
-        tfMap = self.tfForUser(username,allDocs)
-        #sortedTF = sorted(tfMap.iteritems(), key=operator.itemgetter(1), reverse=True) #tuple here
-        #print sortedTF[0:20]
-
-        tf_idf = collections.defaultdict(float)
+        return self.termMatrix(allDocs).topKWordsForUser(username, k, extra, threshold)
 
-        for (w,tf) in tfMap.items():
-            if w in dfMap:
-                df = dfMap[w]
-                #print df
-                #print tf
-                #idf = math.log(float(n)/float(df))
-                if(df > threshold):
-                    tf_idf[w] = float(tf+extra) / float(df)
-
-        sortedTf_idf = sorted(tf_idf.iteritems(), key=operator.itemgetter(1), reverse=True) #tuple here
-
-        return sortedTf_idf[:k]
+    def termMatrix(self, allDocs):
+        """
+            Return the TermMatrix of allDocs, the term counts of all
+            users with the document frequencies computed once.
+            Its topKWordsForUser(username, k, extra, threshold), which
+            topKWordsForUser above calls, scores a user in the number of
+            distinct words of the user instead of going through the
+            whole corpus, and topKWordsForAllUsers scores every user
+            with a single sort.
 
+            The matrix is built once and cached on the instance until
+            another allDocs is passed in, so allDocs should not be
+            changed after this call.
+        """
+        if self.matrixDocs is not allDocs:
+            self.matrix = TermMatrix.fromDocs(allDocs)
+            self.matrixDocs = allDocs
+        return self.matrix
 
     def split(self, s):
         """
@@ -525,13 +501,13 @@ if __name__ == "__main__":
     print tackler.analyze()
 
     allDocs = tackler.allDocs()
-    wdMaps = tackler.wordDocMaps(allDocs)
+    matrix = tackler.termMatrix(allDocs)
     print "number of user %d" % len(allDocs)
 
     usernames = ['rdematos', 'mccook', 'CatholicHawaii']
     for u in usernames:
         print "Running for user %s" % u
-        tf_idf = tackler.topKWordsForUser(u, allDocs, wdMaps, 20, 0.5, 0.2)
+        tf_idf = matrix.topKWordsForUser(u, 20, 0.5, 0.2)
         print tf_idf
         print ""
     t2 = time.time()
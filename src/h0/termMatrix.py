@@ -0,0 +1,120 @@
+"""
+Author: Zixiao Wang
+
+Description:
+The user x term count matrix of a tweet corpus in CSR arrays, with the document frequency of every term computed
+once, for the tf-idf scores of Twitter_Tackler.topKWordsForUser.
+
+Row u holds the terms used by user u: their term ids are indices[indptr[u]:indptr[u + 1]], sorted, and the number
+of times the user used them is data at the same positions. The document frequency of a term is the number of rows
+it appears in. A user's top k words take time in the number of distinct terms of that user, and the top k words of
+every user are found together with one sort of all the scores.
+"""
+import numpy
+
+
+class TermMatrix():
+    """
+    CSR user x term counts with a cached document frequency vector.
+    """
+
+    def __init__(self, users, terms, indptr, indices, data):
+        """
+        @param users: list of user names, indexed by row
+        @param terms: list of terms, indexed by term id
+        @param indptr: numpy.ndarray int64, len(users) + 1 row offsets
+        @param indices: numpy.ndarray term ids, sorted within every row
+        @param data: numpy.ndarray counts
+        """
+        self.users = users
+        self.terms = terms
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.rows = dict([(user, row) for row, user in enumerate(users)])
+        self.df = numpy.bincount(indices, minlength=len(terms))
+
+    @staticmethod
+    def fromCounts(users, terms, rows, termIds, counts):
+        """
+        Return the TermMatrix of the (row, termId, count) triples, which must be distinct pairs sorted by row and
+        then term id.
+        """
+        indptr = numpy.zeros(len(users) + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(rows, minlength=len(users)), out=indptr[1:])
+        return TermMatrix(users, terms, indptr, numpy.asarray(termIds, dtype=numpy.int64),
+                          numpy.asarray(counts, dtype=numpy.int64))
+
+    @staticmethod
+    def fromDocs(allDocs):
+        """
+        Return the TermMatrix of the documents of Twitter_Tackler.allDocs, a dictionary from a user name to the list
+        of all the terms the user tweeted.
+        """
+        users = sorted(allDocs)
+        termIndexes = {}
+        rows = []
+        termIds = []
+        for row, user in enumerate(users):
+            doc = allDocs[user]
+            rows.append(numpy.full(len(doc), row, dtype=numpy.int64))
+            termIds.append(numpy.array([termIndexes.setdefault(term, len(termIndexes)) for term in doc],
+                                       dtype=numpy.int64))
+        terms = sorted(termIndexes, key=termIndexes.get)
+        keys = numpy.concatenate(rows + [numpy.zeros(0, dtype=numpy.int64)]) * max(len(terms), 1) + \
+            numpy.concatenate(termIds + [numpy.zeros(0, dtype=numpy.int64)])
+        keys, counts = numpy.unique(keys, return_counts=True)
+        return TermMatrix.fromCounts(users, terms, keys // max(len(terms), 1), keys % max(len(terms), 1), counts)
+
+    @staticmethod
+    def fromStore(store):
+        """
+        Return the TermMatrix of a tweetStore.TweetStore, without reading the tweet file.
+        """
+        userIds, termIds, counts = store.getUserTermCounts()
+        return TermMatrix.fromCounts(store.getUsers(), store.getTerms(), userIds, termIds, counts)
+
+    def getScores(self, start, stop, extra=0, threshold=0):
+        """
+        Return (termIds, scores) of the entries start to stop: the score of a term is (tf + extra) / df, and terms
+        whose df is not above threshold are left out, as in topKWordsForUser.
+        """
+        termIds = self.indices[start:stop]
+        df = self.df[termIds]
+        kept = df > threshold
+        return termIds[kept], (self.data[start:stop][kept] + extra) / df[kept].astype(float)
+
+    def topKWordsForUser(self, username, k, extra=0, threshold=0):
+        """
+        Return the list of the k (term, score) pairs of username with the highest scores, highest first, [] for an
+        unknown user.
+        """
+        row = self.rows.get(username)
+        if row is None:
+            return []
+        termIds, scores = self.getScores(self.indptr[row], self.indptr[row + 1], extra, threshold)
+        if k <= 0:
+            return []
+        if len(scores) > k:
+            # keep the scores at least as high as the kth highest, ties included, before sorting
+            kept = scores >= -numpy.partition(-scores, k - 1)[k - 1]
+            termIds, scores = termIds[kept], scores[kept]
+        # by score from the highest, then by term id, like topKWordsForAllUsers
+        order = numpy.lexsort((termIds, -scores))[:k]
+        return [(self.terms[termId], score) for termId, score in zip(termIds[order].tolist(), scores[order].tolist())]
+
+    def topKWordsForAllUsers(self, k, extra=0, threshold=0):
+        """
+        Return a dictionary from every user name to topKWordsForUser of that user.
+        """
+        termIds, scores = self.getScores(0, len(self.indices), extra, threshold)
+        rows = numpy.repeat(numpy.arange(len(self.users)), numpy.diff(self.indptr))[self.df[self.indices] > threshold]
+        # by row, then by score from the highest, then by term id
+        order = numpy.lexsort((termIds, -scores, rows))
+        rows, termIds, scores = rows[order], termIds[order], scores[order]
+        starts = numpy.searchsorted(rows, numpy.arange(len(self.users)))
+        kept = numpy.arange(len(rows)) - starts[rows] < k
+        result = dict([(user, []) for user in self.users])
+        for row, termId, score in zip(rows[kept].tolist(), termIds[kept].tolist(), scores[kept].tolist()):
+            result[self.users[row]].append((self.terms[termId], score))
+        return result
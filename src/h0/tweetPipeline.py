@@ -0,0 +1,117 @@
+"""
+Author: Yu Zhao, Yulun Li
+
+Description:
+Computes the tweet counter, the term frequencies and the document frequencies of a tweet file in a single scan.
+
+The file is split into byte ranges that start on record boundaries (see tweetReader). Every worker reads its own
+range once and fills plain dictionaries for all the aggregates together, so nothing goes through a Manager proxy and
+no aggregate re-reads the file. The parent merges every partial result as soon as it arrives, while the workers scan
+the other ranges, so a partial result goes through the pipe once and the merged dictionaries never do.
+The document frequency of a term is the number of users whose term frequencies contain it, so it is counted once
+from the merged term frequencies instead of carrying sets of users through every merge.
+"""
+from multiprocessing import Pool, cpu_count
+from tweetReader import getRanges, readRange
+import re
+
+termPattern = re.compile('\W+')
+
+
+def splitTerms(text):
+    """
+    Split a tweet text into lower case terms, like re.split('\W+', text.lower()).
+    """
+    return termPattern.split(text.lower())
+
+
+def scanChunk(chunk):
+    """
+    Return (tweetCounter, tfCounter) of the tweets in a byte range: tweetCounter maps a userName to its number of
+    tweets and tfCounter maps a userName to a dictionary from a term to its frequency.
+    @param chunk: tuple (fileName, start, stop) from tweetReader.getRanges
+    """
+    fileName, start, stop = chunk
+    tweetCounter = {}
+    tfCounter = {}
+    for timeStamp, recordId, userName, tweetText in readRange(fileName, start, stop):
+        tweetCounter[userName] = tweetCounter.get(userName, 0) + 1
+        tf = tfCounter.get(userName)
+        if tf is None:
+            tf = tfCounter[userName] = {}
+        for term in splitTerms(tweetText):
+            tf[term] = tf.get(term, 0) + 1
+    return tweetCounter, tfCounter
+
+
+def mergePartials(partial, other):
+    """
+    Merge the other (tweetCounter, tfCounter) partial result into the first one and return it.
+    """
+    tweetCounter, tfCounter = partial
+    otherTweetCounter, otherTfCounter = other
+    for userName, count in otherTweetCounter.iteritems():
+        tweetCounter[userName] = tweetCounter.get(userName, 0) + count
+    for userName, otherTf in otherTfCounter.iteritems():
+        tf = tfCounter.get(userName)
+        if tf is None:
+            tfCounter[userName] = otherTf
+            continue
+        for term, count in otherTf.iteritems():
+            tf[term] = tf.get(term, 0) + count
+    return tweetCounter, tfCounter
+
+
+def mergeAll(partials):
+    """
+    Merge the partial results of an iterable into one (tweetCounter, tfCounter), consuming them one at a time.
+    """
+    merged = ({}, {})
+    for partial in partials:
+        merged = mergePartials(merged, partial)
+    return merged
+
+
+def getDfCounter(tfCounter):
+    """
+    Return a dictionary that maps a term to the number of users that have used it.
+    """
+    dfCounter = {}
+    for tf in tfCounter.itervalues():
+        for term in tf:
+            dfCounter[term] = dfCounter.get(term, 0) + 1
+    return dfCounter
+
+
+class TweetPipeline():
+    """
+    Single-scan computation of tweetCounter, tfCounter and dfCounter over the cores.
+    """
+
+    def __init__(self, tweetDir, processes=None, chunksPerProcess=4):
+        """
+        @param tweetDir: str path of the tweet file
+        @param processes: int number of worker processes, all cpus if None, 1 to scan in this process
+        @param chunksPerProcess: int byte ranges per process, more ranges even out the load
+        """
+        self.tweetDir = tweetDir
+        self.processes = processes if processes is not None else cpu_count()
+        self.chunksPerProcess = chunksPerProcess
+
+    def run(self):
+        """
+        Return (tweetCounter, tfCounter, dfCounter) as dictionaries: a userName to its number of tweets, a userName
+        to a dictionary from a term to its frequency, and a term to its number of users.
+        """
+        chunks = getRanges(self.tweetDir, self.processes * self.chunksPerProcess)
+        if self.processes == 1:
+            tweetCounter, tfCounter = mergeAll(scanChunk(chunk) for chunk in chunks)
+        else:
+            pool = Pool(self.processes)
+            try:
+                # the order of the ranges does not change the sums, so merge them in the order they finish
+                tweetCounter, tfCounter = mergeAll(pool.imap_unordered(scanChunk, chunks))
+            finally:
+                pool.close()
+                pool.join()
+        return tweetCounter, tfCounter, getDfCounter(tfCounter)
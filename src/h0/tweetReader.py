@@ -0,0 +1,133 @@
+"""
+Author: Yu Zhao, Yulun Li
+
+Description:
+Reads a tab-separated tweet file (timeStamp, recordId, userName, tweetText) in byte ranges that can be parsed
+independently, one per worker.
+
+A tweet can go on over several lines: every line but its last ends with a backslash, as smartReadTweets in
+tackling_twitter handles them. A range boundary is therefore moved to the next record boundary, the start of a line
+whose previous line does not end with a backslash, so no record is split between two ranges. Reading all ranges in
+order yields the same records as reading the file serially.
+"""
+from multiprocessing import Pool, cpu_count
+import os
+
+
+def isContinued(line):
+    """
+    Return True if the line goes on over the next line.
+    """
+    return line.rstrip('\n').endswith('\\')
+
+
+def getRecordBoundary(f, position):
+    """
+    Return the first record boundary at or after position, the file size if there is none.
+    @param f: file opened in binary mode
+    """
+    if position <= 0:
+        return 0
+    # the rest of the line that holds the byte before position, and whether that line goes on
+    f.seek(position - 1)
+    line = f.readline()
+    if line == '\n' and position >= 2:
+        f.seek(position - 2)
+        continued = f.read(1) == '\\'
+        f.seek(position)
+    else:
+        continued = isContinued(line)
+    while continued:
+        line = f.readline()
+        continued = line != '' and isContinued(line)
+    return f.tell()
+
+
+def getRanges(fileName, numRanges):
+    """
+    Return a list of (fileName, start, stop) byte ranges that cover the file, each starting on a record boundary.
+    There are fewer than numRanges ranges if the file has fewer record boundaries.
+    """
+    size = os.path.getsize(fileName)
+    boundaries = [0]
+    with open(fileName, 'rb') as f:
+        for i in range(1, numRanges):
+            boundary = getRecordBoundary(f, max(size * i / numRanges, boundaries[-1] + 1))
+            if boundary >= size:
+                break
+            boundaries.append(boundary)
+    boundaries.append(size)
+    return [(fileName, boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)]
+
+
+def parseRecord(content):
+    """
+    Return the (timeStamp, recordId, userName, tweetText) tuple of a record, None if it is not four tab-separated
+    fields starting with two ints.
+    """
+    fields = content.split('\t')
+    if len(fields) != 4:
+        return None
+    try:
+        return int(fields[0]), int(fields[1]), fields[2], fields[3]
+    except ValueError:
+        return None
+
+
+def readRange(fileName, start, stop):
+    """
+    Yield the records that start in the byte range [start, stop), which must start on a record boundary.
+    The lines of a record are joined with a space, without their backslashes, as in smartReadTweets.
+    """
+    with open(fileName, 'rb') as f:
+        f.seek(start)
+        position = start
+        parts = []
+        while True:
+            if not parts and position >= stop:
+                break
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            content = line.rstrip('\n')
+            if content.endswith('\\'):
+                parts.append(content.rstrip('\\'))
+                continue
+            parts.append(content)
+            record = parseRecord(' '.join(parts))
+            parts = []
+            if record is not None:
+                yield record
+        if parts:
+            # the file ends in the middle of a record
+            record = parseRecord(' '.join(parts))
+            if record is not None:
+                yield record
+
+
+def readRecords(fileName):
+    """
+    Yield all the records of the file serially.
+    """
+    return readRange(fileName, 0, os.path.getsize(fileName))
+
+
+def mapRanges(function, fileName, numRanges=None, processes=None):
+    """
+    Return the list of function((fileName, start, stop)) over the ranges of the file, computed on a Pool.
+    The function must be defined at module level so it can be sent to the workers, and reads its range with
+    readRange.
+    @param numRanges: int, 4 per process if None
+    @param processes: int number of worker processes, all cpus if None, 1 to run in this process
+    """
+    processes = processes if processes is not None else cpu_count()
+    ranges = getRanges(fileName, numRanges if numRanges is not None else 4 * processes)
+    if processes == 1:
+        return map(function, ranges)
+    pool = Pool(processes)
+    try:
+        return pool.map(function, ranges)
+    finally:
+        pool.close()
+        pool.join()
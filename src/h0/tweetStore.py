@@ -0,0 +1,196 @@
+"""
+Author: Yu Zhao, Yulun Li
+
+Description:
+A columnar on-disk store of a tweet file, written once and then memory-mapped by every analysis instead of parsing
+and tokenizing the text file again.
+
+A store is a directory of raw little-endian column files, one value per tweet or per token:
+- timeStamps (int64), recordIds (int64) and userIds (int32) have one value per tweet;
+- termIds (int32) has the terms of all tweets one after the other, and the terms of tweet i are
+  termIds[termOffsets[i]:termOffsets[i + 1]] (termOffsets, int64, has one more value than there are tweets).
+Users and terms are interned: users.txt and terms.txt list them one per line, the line number being the id.
+meta.json holds the format version and the number of tweets, tokens, users and terms.
+"""
+from tweetPipeline import splitTerms
+from tweetReader import readRecords
+import json
+import numpy
+import os
+
+
+class TweetStore():
+    """
+    A tweet store directory opened for reading. The columns are numpy memmaps, loaded page by page as they are used.
+    """
+    version = 1
+    columns = [("timeStamps", "<i8"), ("recordIds", "<i8"), ("userIds", "<i4"), ("termOffsets", "<i8"),
+               ("termIds", "<i4")]
+    # number of tweets kept in memory while ingesting before they are appended to the column files
+    blockSize = 2 ** 16
+
+    def __init__(self, storeDir):
+        """
+        @param storeDir: str directory written by TweetStore.ingest
+        """
+        self.storeDir = storeDir
+        with open(os.path.join(storeDir, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != self.version:
+            raise ValueError("unsupported tweet store version " + str(self.meta["version"]))
+        for name, dtype in self.columns:
+            setattr(self, name, self.openColumn(name, dtype))
+        self.users = None
+        self.userIndexes = None
+        self.terms = None
+
+    def openColumn(self, name, dtype):
+        fileName = os.path.join(self.storeDir, name)
+        if not os.path.getsize(fileName):
+            # a memmap cannot be empty
+            return numpy.zeros(0, dtype=dtype)
+        return numpy.memmap(fileName, dtype=dtype, mode='r')
+
+    @staticmethod
+    def ingest(tweetDir, storeDir):
+        """
+        Parse and tokenize a tweet file once and write it as a store in storeDir, which is created if needed.
+        The tweets are read with tweetReader, so multi-line tweets are kept whole, and tokenized with
+        tweetPipeline.splitTerms. Returns the TweetStore.
+        """
+        if not os.path.isdir(storeDir):
+            os.makedirs(storeDir)
+        files = dict([(name, open(os.path.join(storeDir, name), 'wb')) for name, dtype in TweetStore.columns])
+        userIndexes = {}
+        termIndexes = {}
+        numTweets = 0
+        numTokens = 0
+        buffers = dict([(name, []) for name, dtype in TweetStore.columns])
+        try:
+            for timeStamp, recordId, userName, tweetText in readRecords(tweetDir):
+                buffers["timeStamps"].append(timeStamp)
+                buffers["recordIds"].append(recordId)
+                userId = userIndexes.get(userName)
+                if userId is None:
+                    userId = userIndexes[userName] = len(userIndexes)
+                buffers["userIds"].append(userId)
+                buffers["termOffsets"].append(numTokens)
+                termIds = buffers["termIds"]
+                for term in splitTerms(tweetText):
+                    termId = termIndexes.get(term)
+                    if termId is None:
+                        termId = termIndexes[term] = len(termIndexes)
+                    termIds.append(termId)
+                    numTokens += 1
+                numTweets += 1
+                if len(buffers["timeStamps"]) == TweetStore.blockSize:
+                    TweetStore.writeBuffers(files, buffers)
+                    buffers = dict([(name, []) for name, dtype in TweetStore.columns])
+            buffers["termOffsets"].append(numTokens)
+            TweetStore.writeBuffers(files, buffers)
+        finally:
+            for f in files.itervalues():
+                f.close()
+        for fileName, indexes in [("users.txt", userIndexes), ("terms.txt", termIndexes)]:
+            with open(os.path.join(storeDir, fileName), 'wb') as f:
+                f.write(''.join([name + '\n' for name in sorted(indexes, key=indexes.get)]))
+        with open(os.path.join(storeDir, "meta.json"), 'w') as f:
+            json.dump({"version": TweetStore.version, "source": os.path.abspath(tweetDir), "numTweets": numTweets,
+                       "numTokens": numTokens, "numUsers": len(userIndexes), "numTerms": len(termIndexes)}, f)
+        return TweetStore(storeDir)
+
+    @staticmethod
+    def writeBuffers(files, buffers):
+        """
+        Append lists of values to the column files.
+        """
+        dtypes = dict(TweetStore.columns)
+        for name, values in buffers.iteritems():
+            numpy.array(values, dtype=dtypes[name]).tofile(files[name])
+
+    def getUsers(self):
+        """
+        Return the list of user names, indexed by user id.
+        """
+        if self.users is None:
+            self.users = self.readNames("users.txt")
+        return self.users
+
+    def getUserId(self, userName):
+        """
+        Return the id of userName, None if it has no tweets.
+        """
+        if self.userIndexes is None:
+            self.userIndexes = dict([(name, i) for i, name in enumerate(self.getUsers())])
+        return self.userIndexes.get(userName)
+
+    def getTerms(self):
+        """
+        Return the list of terms, indexed by term id.
+        """
+        if self.terms is None:
+            self.terms = self.readNames("terms.txt")
+        return self.terms
+
+    def readNames(self, fileName):
+        with open(os.path.join(self.storeDir, fileName), 'rb') as f:
+            return f.read().split('\n')[:-1]
+
+    def __len__(self):
+        return self.meta["numTweets"]
+
+    def getTokenUserIds(self):
+        """
+        Return the user id of every token, aligned with termIds.
+        """
+        return numpy.repeat(self.userIds, numpy.diff(self.termOffsets))
+
+    def getTweetCounts(self):
+        """
+        Return the number of tweets of every user id.
+        """
+        return numpy.bincount(self.userIds, minlength=self.meta["numUsers"])
+
+    def getTweetCounter(self):
+        """
+        Return a dictionary that maps a userName to its number of tweets, like TweetPipeline.run.
+        """
+        return dict(zip(self.getUsers(), self.getTweetCounts().tolist()))
+
+    def getUserTermCounts(self):
+        """
+        Return (userIds, termIds, counts): every distinct (user, term) pair and the number of times the user used the
+        term, sorted by user and then term.
+        """
+        keys = self.getTokenUserIds().astype(numpy.int64) * self.meta["numTerms"] + self.termIds
+        keys, counts = numpy.unique(keys, return_counts=True)
+        return keys // self.meta["numTerms"], keys % self.meta["numTerms"], counts
+
+    def getDfCounts(self):
+        """
+        Return the number of users that have used every term id.
+        """
+        userIds, termIds, counts = self.getUserTermCounts()
+        return numpy.bincount(termIds, minlength=self.meta["numTerms"])
+
+    def getTfCounter(self, userName):
+        """
+        Return a dictionary that maps a term to the number of times userName used it, empty for an unknown user.
+        """
+        termIds, counts = numpy.unique(self.termIds[self.getTokenUserIds() == self.getUserId(userName)],
+                                       return_counts=True)
+        terms = self.getTerms()
+        return dict([(terms[termId], count) for termId, count in zip(termIds.tolist(), counts.tolist())])
+
+    def getDateHistograms(self):
+        """
+        Return a dictionary of the number of tweets per day of year (0 to 365), per day of week (0 is Monday) and per
+        hour of day, with the timestamps taken as seconds since the epoch in UTC.
+        """
+        seconds = numpy.asarray(self.timeStamps)
+        days = seconds // 86400
+        years = seconds.astype("datetime64[s]").astype("datetime64[Y]").astype("datetime64[D]").astype(numpy.int64)
+        return {"dayOfYear": numpy.bincount(days - years, minlength=366),
+                # 1 January 1970 was a Thursday
+                "dayOfWeek": numpy.bincount((days + 3) % 7, minlength=7),
+                "hourOfDay": numpy.bincount(seconds // 3600 % 24, minlength=24)}